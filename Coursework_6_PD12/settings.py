@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -46,11 +47,13 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
     'django_filters',
+    'core',
     'users',
     'advertisements',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -59,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'Coursework_6_PD12.urls'
@@ -93,9 +97,93 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT'),
+        # Keep connections open between requests of a thread and ping them before reuse
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
     }
 }
 
+# In-process connection pool for Postgres, preferred under ASGI where every request runs in a new thread
+# and persistent connections are not reused. Connections return to the pool at the end of a request
+if os.environ.get('DB_POOL_ENABLED', 'False') == 'True' \
+        and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default'].update({
+        'ENGINE': 'core.db.backends.pooled_postgresql',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+            'CHECK_INTERVAL': float(os.environ.get('DB_POOL_CHECK_INTERVAL', 30)),
+        },
+    })
+
+# Read replicas, comma-separated: DB_REPLICA_HOSTS for Postgres replicas of the default database,
+# DB_REPLICA_NAMES for other database names or SQLite files. Tests run them as mirrors of default.
+# Replicas require a shared RESPONSE_CACHE_BACKEND, it keeps the read-your-writes pins
+REPLICA_OVERRIDES = [('HOST', host) for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host] \
+    + [('NAME', name) for name in os.environ.get('DB_REPLICA_NAMES', '').split(',') if name]
+
+for index, (key, value) in enumerate(REPLICA_OVERRIDES, start=1):
+    DATABASES[f'replica_{index}'] = {**DATABASES['default'], key: value, 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+
+# Seconds a user reads from the primary after a write, should exceed the replication lag
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Locmem evicts least recently used entries above MAX_ENTRIES, in production point RESPONSE_CACHE_BACKEND
+# to django.core.cache.backends.redis.RedisCache with a Redis configured as maxmemory-policy allkeys-lru
+
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': RESPONSE_CACHE_BACKEND,
+        'LOCATION': os.environ.get('RESPONSE_CACHE_LOCATION', 'responses'),
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000} if RESPONSE_CACHE_BACKEND.endswith('LocMemCache') else {},
+    },
+}
+
+# Response cache settings. Caching is off by default with locmem: its versions are per process,
+# so other workers would serve stale responses. RESPONSE_CACHE_SHARED overrides the backend detection
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_SHARED = None
+RESPONSE_CACHE_ENABLED = os.environ.get(
+    'RESPONSE_CACHE_ENABLED', str(not RESPONSE_CACHE_BACKEND.endswith('LocMemCache'))) == 'True'
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+RESPONSE_CACHE_MODELS = ['advertisements.Advertisement', 'advertisements.Comment', 'users.User']
+
+# Seconds page counts are cached for, 0 counts on every request. Unfiltered PostgreSQL tables with more
+# estimated rows than the threshold report the planner estimate instead of a COUNT(*)
+PAGINATION_COUNT_CACHE_TIMEOUT = int(os.environ.get('PAGINATION_COUNT_CACHE_TIMEOUT', 30))
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = int(os.environ.get('PAGINATION_COUNT_ESTIMATE_THRESHOLD', 100000))
+
+# Seconds before the watermark an incremental export starts again, catching transactions committed late
+EXPORT_OVERLAP_SECONDS = int(os.environ.get('EXPORT_OVERLAP_SECONDS', 60))
+
+# Serve ad and comment lists and ad details with async views, pays off under an ASGI server
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', 'False') == 'True'
+
+# Bearer token of the Prometheus scraper for /metrics, staff users may read it with a session too
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Profiling settings, the middleware is a no-op unless PROFILING_ENABLED is set
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.01))
+PROFILING_DUPLICATE_THRESHOLD = int(os.environ.get('PROFILING_DUPLICATE_THRESHOLD', 3))
+PROFILING_CPROFILE_ENABLED = os.environ.get('PROFILING_CPROFILE_ENABLED', 'False') == 'True'
+PROFILING_CPROFILE_DIR = os.environ.get('PROFILING_CPROFILE_DIR', os.path.join(tempfile.gettempdir(), 'profiles'))
+# Value of the X-Profile header requesting a cProfile dump, the header is ignored while it is empty
+PROFILING_SECRET = os.environ.get('PROFILING_SECRET', '')
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -135,6 +223,24 @@ STATIC_ROOT = os.path.join(BASE_DIR, "django_static")
 MEDIA_URL = '/django_media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'django_media')
 
+# Image processing settings
+IMAGE_PROCESSING_MODELS = ['advertisements.Advertisement', 'users.User']
+IMAGE_THUMBNAIL_SIZES = (160, 480, 960)
+IMAGE_THUMBNAIL_FORMAT = 'webp'
+
+# Background jobs, run by `manage.py run_jobs` from the core_job table. With JOBS_EAGER they run
+# in the enqueuing thread after the commit, the default with DEBUG, for development without a worker
+JOBS_EAGER = os.environ.get('JOBS_EAGER', str(DEBUG)) == 'True'
+JOBS_CONCURRENCY = int(os.environ.get('JOBS_CONCURRENCY', 2))
+JOBS_POLL_INTERVAL = float(os.environ.get('JOBS_POLL_INTERVAL', 1))
+JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 3))
+JOBS_RETRY_DELAY = float(os.environ.get('JOBS_RETRY_DELAY', 10))
+JOBS_LOCK_TIMEOUT = int(os.environ.get('JOBS_LOCK_TIMEOUT', 600))
+
+# Emails are queued as jobs and sent by workers through JOBS_EMAIL_BACKEND
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+JOBS_EMAIL_BACKEND = os.environ.get('JOBS_EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -147,7 +253,17 @@ AUTH_USER_MODEL = 'users.User'
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
+        'users.authentication.StatelessJWTAuthentication'
+    ],
+    # Encoded and decoded with orjson when it is installed (pip install orjson), DRF's stdlib json otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 
@@ -170,9 +286,14 @@ DJOSER = {
         'set_password': 'users.serializers.UserPasswordChangeSerializer'
     },
     'LOGIN_FIELD': 'email',
+    # Authentication is JWT only, there are no stored tokens to delete on logout
+    'TOKEN_MODEL': None,
 }
 
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
 }
+
+# Seconds a token version and a full user row are cached for claims-based authentication
+JWT_CLAIMS_CACHE_TIMEOUT = int(os.environ.get('JWT_CLAIMS_CACHE_TIMEOUT', 60))
@@ -19,6 +19,8 @@ from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView
 
+from core.views import metrics_view
+
 # ----------------------------------------------------------------------------------------------------------------------
 # Create core urls
 urlpatterns = [
@@ -30,7 +32,9 @@ urlpatterns = [
     path('api/', include('advertisements.urls')),
 
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('api/schema/redoc/', SpectacularRedocView.as_view(url_name='schema'))
+    path('api/schema/redoc/', SpectacularRedocView.as_view(url_name='schema')),
+
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
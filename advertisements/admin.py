@@ -1,8 +1,44 @@
 from django.contrib import admin
+from django.db.models import QuerySet
 
 from advertisements.models import Advertisement, Comment
+from advertisements.search import get_search_engine, get_terms
+from core.admin import ListPerformanceAdmin
+
 
 # ----------------------------------------------------------------------------------------------------------------------
 # Register models
-admin.site.register(Advertisement)
-admin.site.register(Comment)
+@admin.register(Advertisement)
+class AdvertisementAdmin(ListPerformanceAdmin):
+    """
+    Rows are joined with their authors, the search goes through the search engine and its index
+    """
+    list_display: tuple[str, ...] = ('id', 'title', 'price', 'author', 'comments_count', 'created_at')
+    list_select_related: tuple[str, ...] = ('author',)
+    raw_id_fields: tuple[str, ...] = ('author',)
+    search_fields: tuple[str, ...] = ('title',)
+
+    def get_search_results(self, request, queryset: QuerySet, search_term: str) -> tuple[QuerySet, bool]:
+        """
+        Filter advertisements with the search engine of the API instead of LIKE over every row
+
+        :param request: HTTP request object
+        :param queryset: The changelist queryset
+        :param search_term: A raw search string
+        :return: The filtered queryset and False, the search does not produce duplicates
+        """
+        terms: list[str] = get_terms(search_term)
+        if not terms:
+            return queryset, False
+        return get_search_engine(queryset.db).filter(queryset, terms), False
+
+
+@admin.register(Comment)
+class CommentAdmin(ListPerformanceAdmin):
+    """
+    Rows are joined with their authors, advertisements and advertisement authors, all shown in the list
+    """
+    list_display: tuple[str, ...] = ('id', 'text', 'author', 'ad', 'created_at')
+    list_select_related: tuple[str, ...] = ('author', 'ad__author')
+    raw_id_fields: tuple[str, ...] = ('author', 'ad')
+    search_fields: tuple[str, ...] = ('author__email__exact',)
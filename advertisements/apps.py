@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete
 
 
 class AdvertisementsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'advertisements'
+
+    def ready(self) -> None:
+        """
+        Keep comment counters of advertisements in step with deleted comments
+        """
+        from advertisements.counters import unregister_deleted_comment
+        from advertisements.models import Comment
+
+        post_delete.connect(unregister_deleted_comment, sender=Comment,
+                            dispatch_uid='advertisements.unregister_deleted_comment')
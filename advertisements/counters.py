@@ -0,0 +1,125 @@
+from datetime import datetime
+from typing import Optional
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, QuerySet, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from advertisements.models import Advertisement, Comment
+from core.cache import bump_version
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Expressions
+def get_counter_expressions() -> dict:
+    """
+    Returns expressions computing comments_count and last_comment_at of an advertisement from its comments
+
+    Both subqueries are answered by the (ad, -created_at, -id) comment index.
+
+    :return: A dict of field names and expressions usable in update() or annotate()
+    """
+    comments: QuerySet = Comment.objects.filter(ad_id=OuterRef('pk')).order_by()
+    return {
+        'comments_count': Coalesce(Subquery(comments.values('ad_id').annotate(count=Count('pk')).values('count')), 0),
+        'last_comment_at': Subquery(comments.order_by('-created_at').values('created_at')[:1]),
+    }
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Counter updates
+def register_comments(ad_id: int, created_at: datetime, count: int = 1) -> int:
+    """
+    Account new comments of an advertisement in a single UPDATE
+
+    :param ad_id: The advertisement id
+    :param created_at: Creation time of the newest of the comments
+    :param count: Number of the comments
+    :return: Number of updated rows, 0 if the advertisement does not exist
+    """
+    return Advertisement.objects.filter(pk=ad_id).update(
+        comments_count=F('comments_count') + count,
+        last_comment_at=Greatest(Coalesce(F('last_comment_at'), Value(created_at)), Value(created_at)),
+    )
+
+
+def create_comments(comments: list[Comment], keep_timestamps: bool = False) -> list[Comment]:
+    """
+    Insert comments and account them in the counters of their advertisements, in one transaction
+
+    The advertisements are not loaded: a counter UPDATE matching no row means the advertisement is missing
+    and rolls the INSERT back, the foreign key catches one deleted before the commit. A single comment costs
+    an INSERT and an UPDATE. Signals are not sent, the cache version is bumped.
+
+    The INSERT stamps the current time. With `keep_timestamps` the given created_at and updated_at are
+    written back by one more UPDATE, the auto_now flags of the model fields stay untouched.
+
+    :param comments: Unsaved Comment objects with author_id and ad_id set
+    :param keep_timestamps: True to keep the created_at and updated_at set on the objects
+    :return: The comments with primary keys and timestamps
+    :raises: Advertisement.DoesNotExist if an advertisement of the comments does not exist
+    """
+    timestamps: list[tuple[datetime, datetime]] = [
+        (comment.created_at, comment.updated_at) for comment in comments
+    ] if keep_timestamps else []
+    try:
+        with transaction.atomic():
+            Comment.objects.bulk_create(comments)
+            if timestamps:
+                for comment, (created_at, updated_at) in zip(comments, timestamps):
+                    comment.created_at, comment.updated_at = created_at, updated_at
+                Comment.objects.bulk_update(comments, ['created_at', 'updated_at'])
+            newest: dict[int, tuple[datetime, int]] = {}
+            for comment in comments:
+                created_at, count = newest.get(comment.ad_id, (comment.created_at, 0))
+                newest[comment.ad_id] = max(created_at, comment.created_at), count + 1
+            for ad_id, (created_at, count) in newest.items():
+                if not register_comments(ad_id, created_at, count):
+                    raise Advertisement.DoesNotExist(f'Advertisement {ad_id} does not exist')
+    except IntegrityError as exc:
+        raise Advertisement.DoesNotExist(str(exc))
+
+    bump_version(Comment)
+    return comments
+
+
+def unregister_deleted_comment(sender: type[Comment], instance: Comment, origin=None, **kwargs) -> None:
+    """
+    post_delete receiver decrementing the counter of the comment's advertisement, cascades included
+
+    Comments deleted together with their advertisement are skipped, the row is going away anyway.
+    """
+    if isinstance(origin, Advertisement) or (isinstance(origin, QuerySet) and origin.model is Advertisement):
+        return
+
+    Advertisement.objects.filter(pk=instance.ad_id).update(
+        comments_count=Greatest(F('comments_count') - 1, 0),
+        last_comment_at=get_counter_expressions()['last_comment_at'],
+    )
+
+
+def recount_comment_counters(batch_size: int = 1000, ad_ids: Optional[list[int]] = None,
+                             using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    Recompute comments_count and last_comment_at from the comments, one UPDATE per batch of ids
+
+    :param batch_size: Number of advertisements per UPDATE
+    :param ad_ids: Advertisements to repair, all if None
+    :param using: A database alias
+    :return: Number of updated advertisements
+    """
+    queryset: QuerySet = Advertisement.objects.using(using).order_by('pk')
+    if ad_ids is not None:
+        queryset = queryset.filter(pk__in=ad_ids)
+
+    updated: int = 0
+    last_id: int = 0
+    while True:
+        batch: list[int] = list(queryset.filter(pk__gt=last_id).values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        updated += Advertisement.objects.using(using).filter(pk__in=batch).update(**get_counter_expressions())
+        last_id = batch[-1]
+
+    bump_version(Advertisement)
+    return updated
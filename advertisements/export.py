@@ -0,0 +1,167 @@
+import csv
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from rest_framework.utils.encoders import JSONEncoder
+
+from advertisements.models import Advertisement
+from core.pagination import decode_cursor, encode_cursor, keyset_filter
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Export settings
+EXPORT_FIELDS: tuple[str, ...] = ('id', 'title', 'price', 'description', 'author_id', 'image', 'created_at',
+                                  'updated_at')
+EXPORT_ORDERING: tuple[str, ...] = ('updated_at', 'id')
+EXPORT_FORMATS: dict[str, str] = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+DEFAULT_CHUNK_SIZE: int = 2000
+
+
+def get_overlap() -> timedelta:
+    """
+    Returns how far before the watermark an incremental export starts again, EXPORT_OVERLAP_SECONDS
+    """
+    return timedelta(seconds=getattr(settings, 'EXPORT_OVERLAP_SECONDS', 60))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Watermark
+def decode_watermark(token: str) -> tuple:
+    """
+    Decode a watermark returned by a previous export
+
+    :param token: An opaque watermark token
+    :return: Values of the export ordering fields
+    :raises: ValueError if the token is malformed
+    """
+    fields: list = [Advertisement._meta.get_field(field) for field in EXPORT_ORDERING]
+    return decode_cursor(token, fields).values
+
+
+def get_newest_position(queryset: QuerySet) -> Optional[tuple]:
+    """
+    Returns values of the export ordering fields of the newest row, None if the queryset is empty
+
+    :param queryset: An export queryset
+    :return: A tuple of (updated_at, id)
+    """
+    return queryset.order_by(*(f'-{field}' for field in EXPORT_ORDERING)).values_list(*EXPORT_ORDERING).first()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Queryset
+def get_export_queryset(created_after: datetime = None, created_before: datetime = None,
+                        since: tuple = None) -> QuerySet:
+    """
+    Returns advertisements to export in the stable (updated_at, id) order
+
+    An incremental export includes rows changed after the watermark and, again, the rows of the last
+    `get_overlap()` before it: a transaction committing late may have stamped its rows earlier than the
+    watermark of an export that did not see them yet.
+
+    :param created_after: Include rows created at or after this moment
+    :param created_before: Include rows created before this moment
+    :param since: Watermark values of a previous export
+    :return: A queryset of advertisements
+    """
+    queryset: QuerySet = Advertisement.objects.all()
+    if created_after is not None:
+        queryset = queryset.filter(created_at__gte=created_after)
+    if created_before is not None:
+        queryset = queryset.filter(created_at__lt=created_before)
+    if since is not None:
+        updated_at, pk = since
+        queryset = queryset.filter(keyset_filter(EXPORT_ORDERING, (updated_at - get_overlap(), pk)))
+    return queryset.order_by(*EXPORT_ORDERING)
+
+
+def prepare_export(created_after: datetime = None, created_before: datetime = None,
+                   since: str = None) -> tuple[QuerySet, Optional[str]]:
+    """
+    Returns the export queryset frozen at the current newest row and the watermark for the next export
+
+    Rows changed while the export is streamed are left for the next run resumed from the returned watermark.
+    Delivery is at least once: updated rows and rows within the overlap window are exported again, consumers
+    upsert by id. Deletions are not exported, and a transaction committing later than EXPORT_OVERLAP_SECONDS
+    after its rows were stamped is missed.
+
+    :param created_after: Include rows created at or after this moment
+    :param created_before: Include rows created before this moment
+    :param since: A watermark token of a previous export
+    :return: A queryset and a watermark token (the incoming one if there are no new rows)
+    :raises: ValueError if the since token is malformed
+    """
+    queryset: QuerySet = get_export_queryset(created_after, created_before,
+                                             decode_watermark(since) if since else None)
+    newest: Optional[tuple] = get_newest_position(queryset)
+    if newest is None:
+        return queryset.none(), since
+
+    up_to_newest: Q = keyset_filter(EXPORT_ORDERING, newest, reverse=True) | Q(**dict(zip(EXPORT_ORDERING, newest)))
+    return queryset.filter(up_to_newest), encode_cursor(newest)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Renderers
+def iterate_rows(queryset: QuerySet, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Stream rows as dicts through a server-side cursor, keeping memory bounded by the chunk size
+
+    :param queryset: An export queryset
+    :param chunk_size: Number of rows fetched from the database at once
+    :return: An iterator of dicts
+    """
+    return queryset.values(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def render_ndjson(rows: Iterable[dict]) -> Iterator[str]:
+    """
+    Render rows as newline delimited JSON with the same value encoding as the API
+    """
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+class Echo:
+    """
+    File-like object returning written values instead of storing them
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def render_csv(rows: Iterable[dict]) -> Iterator[str]:
+    """
+    Render rows as CSV with a header line
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(
+            value.isoformat() if isinstance(value, datetime) else value for value in map(row.get, EXPORT_FIELDS)
+        )
+
+
+RENDERERS: dict[str, object] = {
+    'ndjson': render_ndjson,
+    'csv': render_csv,
+}
+
+
+def export_advertisements(queryset: QuerySet, export_format: str, chunk_size: int = DEFAULT_CHUNK_SIZE) \
+        -> Iterator[str]:
+    """
+    Returns an iterator of rendered chunks of the export
+
+    :param queryset: An export queryset
+    :param export_format: One of EXPORT_FORMATS
+    :param chunk_size: Number of rows fetched from the database at once
+    :return: An iterator of strings
+    """
+    return RENDERERS[export_format](iterate_rows(queryset, chunk_size))
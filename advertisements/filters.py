@@ -1,13 +1,125 @@
 import django_filters
+from django import forms
+from django.db.models import F, OrderBy, Q, QuerySet
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
 
 from advertisements.models import Advertisement
+from advertisements.search import get_search_engine
 
 
 # ----------------------------------------------------------------------------------------------------------------------
 # Custom filters
-class TitleFilter(django_filters.rest_framework.FilterSet):
+class IntegerFilter(django_filters.NumberFilter):
+    """
+    Number filter for integer ids, values like 1.5 are rejected with 400 instead of matching nothing
+    """
+    field_class: type = forms.IntegerField
+
+
+class AdvertisementFilter(django_filters.rest_framework.FilterSet):
+    """
+    Filters of the advertisement list
+
+    Price filters are served by the (price, id) index, author filters by the (author, -created_at, -id)
+    and (author, price, id) indexes, created_at ranges by the (-created_at, -id) index.
+    """
     title = django_filters.CharFilter(field_name='title', lookup_expr='icontains')
+    price_min = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    price_max = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    author = IntegerFilter(field_name='author_id', lookup_expr='exact', min_value=1)
+    created_after = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lt')
+    has_image = django_filters.BooleanFilter(method='filter_has_image')
 
     class Meta:
         model = Advertisement
-        fields = ('title',)
+        fields = ('title', 'price_min', 'price_max', 'author', 'created_after', 'created_before', 'has_image')
+
+    @staticmethod
+    def filter_has_image(queryset: QuerySet, name: str, value: bool) -> QuerySet:
+        without_image = Q(image__isnull=True) | Q(image='')
+        return queryset.exclude(without_image) if value else queryset.filter(without_image)
+
+
+class AdvertisementSearchFilter(BaseFilterBackend):
+    """
+    Ranked full-text search by the `search` query parameter
+    """
+    search_param: str = 'search'
+
+    def filter_queryset(self, request, queryset: QuerySet, view) -> QuerySet:
+        """
+        Filter and rank the queryset with the configured search engine
+
+        :param request: HTTP request object
+        :param queryset: A queryset of advertisements
+        :param view: The view the filter belongs to
+        :return: A filtered queryset ordered by relevance
+        """
+        query: str = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return get_search_engine(queryset.db).search(queryset, query)
+
+    def get_schema_operation_parameters(self, view) -> list[dict]:
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search by title and description with prefix matching',
+            'schema': {
+                'type': 'string',
+            },
+        }]
+
+
+class AdvertisementOrderingFilter(OrderingFilter):
+    """
+    Ordering by a single field of the `ordering` query parameter with the primary key as a tie-breaker
+
+    Every ordering field has a (field, id) index, so the tie-breaker follows the field direction.
+    Other fields or several fields at once would sort without an index and are rejected with 400.
+    Advertisements without a value of a nullable field, e.g. never commented ones, come last in
+    descending order and first in ascending order on every database.
+    """
+    ordering_fields: tuple[str, ...] = ('created_at', 'price', 'comments_count', 'last_comment_at')
+    nullable_fields: tuple[str, ...] = ('last_comment_at',)
+
+    def remove_invalid_fields(self, queryset: QuerySet, fields: list[str], view, request) -> list[str]:
+        """
+        Validate the requested ordering instead of silently dropping unknown fields
+
+        :raises: ValidationError if the ordering is not supported
+        """
+        allowed: list[str] = [*self.ordering_fields, *(f'-{field}' for field in self.ordering_fields)]
+        if len(fields) > 1 or any(field not in allowed for field in fields):
+            raise ValidationError({self.ordering_param: [
+                f'Неподдерживаемая сортировка, допустимые значения: {", ".join(allowed)}']})
+        return fields
+
+    def get_ordering(self, request, queryset: QuerySet, view) -> list[str] | None:
+        ordering: list[str] | None = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        return [*ordering, '-id' if ordering[-1].startswith('-') else 'id']
+
+    def get_order_expression(self, term: str) -> str | OrderBy:
+        """
+        Returns an ordering term with the NULL placement of a nullable field spelled out
+
+        PostgreSQL sorts NULLs as the largest values and SQLite as the smallest ones.
+
+        :param term: A field name, prefixed with '-' for descending order
+        :return: The term itself or an OrderBy expression
+        """
+        name: str = term.lstrip('-')
+        if name not in self.nullable_fields:
+            return term
+        return F(name).desc(nulls_last=True) if term.startswith('-') else F(name).asc(nulls_first=True)
+
+    def filter_queryset(self, request, queryset: QuerySet, view) -> QuerySet:
+        ordering: list[str] | None = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+        return queryset.order_by(*map(self.get_order_expression, ordering))
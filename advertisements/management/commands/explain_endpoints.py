@@ -0,0 +1,114 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connections
+from django.db.models import QuerySet
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from advertisements.models import Advertisement
+from advertisements.views import AdvertisementsViewSet, AdvertisementUserListView, CommentViewSet
+from core.pagination import keyset_filter
+from users.models import User
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Plan patterns that mean a full table scan or a sort without an index
+SEQUENTIAL_SCAN_PATTERNS: dict[str, re.Pattern] = {
+    'postgresql': re.compile(r'Seq Scan on|Sort Key'),
+    'sqlite': re.compile(r'\bSCAN (?!.*\bUSING\b)|USE TEMP B-TREE FOR ORDER BY'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN for the queryset of every advertisement endpoint and flag sequential scans'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--database', default='default', help='Database alias to explain against')
+        parser.add_argument('--analyze', action='store_true', help='Use EXPLAIN ANALYZE on PostgreSQL')
+        parser.add_argument('--page', type=int, default=50, help='Page number used for the OFFSET shapes')
+
+    def handle(self, *args, **options) -> None:
+        database: str = options['database']
+        vendor: str = connections[database].vendor
+        pattern: re.Pattern = SEQUENTIAL_SCAN_PATTERNS.get(vendor)
+        if pattern is None:
+            raise CommandError(f'Plans of {vendor} databases are not supported')
+
+        sample: dict = Advertisement.objects.using(database).values('id', 'author_id', 'created_at', 'price').first()
+        if sample is None:
+            raise CommandError('The database is empty, seed it first to get meaningful plans')
+
+        explain_options: dict = {'analyze': True} if options['analyze'] and vendor == 'postgresql' else {}
+        flagged: list[str] = []
+
+        for label, queryset in self.get_querysets(sample, options['page']):
+            plan: str = queryset.using(database).explain(**explain_options)
+            is_flagged: bool = bool(pattern.search(plan))
+            if is_flagged:
+                flagged.append(label)
+
+            style = self.style.ERROR if is_flagged else self.style.SUCCESS
+            self.stdout.write(style(f'{"SEQ SCAN" if is_flagged else "OK":<8} {label}'))
+            if is_flagged or options['verbosity'] > 1:
+                self.stdout.write(f'{plan}\n')
+
+        if flagged:
+            raise CommandError(f'Sequential scans or unindexed sorts in: {", ".join(flagged)}')
+
+    @staticmethod
+    def get_view_queryset(view_class: type, action: str, user: User = None, query: dict = None,
+                          **kwargs) -> QuerySet:
+        """
+        Build the filtered queryset of a view exactly like it is built for a GET request
+
+        :param view_class: A view class
+        :param action: A viewset action
+        :param user: The user performing the request
+        :param query: Query parameters of the request
+        :param kwargs: Url keyword arguments
+        :return: A queryset
+        """
+        request = Request(APIRequestFactory().get('/', query))
+        request.user = user
+        view = view_class(action=action, request=request, kwargs=kwargs, args=(), format_kwarg=None)
+        return view.filter_queryset(view.get_queryset())
+
+    def get_querysets(self, sample: dict, page: int) -> list[tuple[str, QuerySet]]:
+        """
+        Returns the queryset shapes executed by the endpoints
+
+        :param sample: Values of an existing advertisement
+        :param page: Page number used for the OFFSET shapes
+        :return: A list of labels and querysets
+        """
+        author: User = User(pk=sample['author_id'])
+        position: tuple = (sample['created_at'], sample['id'])
+
+        ad_list: QuerySet = self.get_view_queryset(AdvertisementsViewSet, 'list')
+        user_ads: QuerySet = self.get_view_queryset(AdvertisementUserListView, 'list', user=author)
+        comments: QuerySet = self.get_view_queryset(CommentViewSet, 'list', user=author, ad_id=sample['id'])
+        ad_ordering: tuple = ('-created_at', '-id')
+        price_range: dict = {'price_min': sample['price'] // 2, 'price_max': sample['price'] * 2}
+        by_price: QuerySet = self.get_view_queryset(AdvertisementsViewSet, 'list', query={
+            **price_range, 'ordering': 'price'})
+        author_by_price: QuerySet = self.get_view_queryset(AdvertisementsViewSet, 'list', query={
+            'author': sample['author_id'], 'ordering': '-price'})
+        created_range: QuerySet = self.get_view_queryset(AdvertisementsViewSet, 'list', query={
+            'created_before': sample['created_at'].isoformat()})
+
+        return [
+            ('ad-list page', ad_list[(page - 1) * 4:page * 4]),
+            ('ad-list cursor', ad_list.filter(keyset_filter(ad_ordering, position))[:5]),
+            ('ad-detail', self.get_view_queryset(AdvertisementsViewSet, 'retrieve', user=author).filter(
+                pk=sample['id'])),
+            ('user-ads page', user_ads[:4]),
+            ('user-ads cursor', user_ads.filter(keyset_filter(ad_ordering, position))[:5]),
+            ('comment-list page', comments[:100]),
+            ('ad-list price range by price', by_price[:4]),
+            ('ad-list price range by price cursor', by_price.filter(
+                keyset_filter(('price', 'id'), (sample['price'], sample['id'])))[:5]),
+            ('ad-list author by price', author_by_price[:4]),
+            ('ad-list created range', created_range[:4]),
+            ('ad-list by comments', self.get_view_queryset(AdvertisementsViewSet, 'list', query={
+                'ordering': '-comments_count'})[:4]),
+        ]
@@ -0,0 +1,53 @@
+from datetime import datetime
+from typing import Optional
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware
+
+from advertisements.export import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, export_advertisements, prepare_export
+
+
+def parse_moment(value: str) -> datetime:
+    """
+    Parse an ISO 8601 datetime argument, naive values are taken in the current time zone
+    """
+    moment: Optional[datetime] = parse_datetime(value)
+    if moment is None:
+        raise CommandError(f'Invalid datetime: {value}')
+    return make_aware(moment) if is_naive(moment) else moment
+
+
+class Command(BaseCommand):
+    help = 'Stream advertisements as NDJSON or CSV, the watermark for the next incremental run goes to stderr'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='ndjson', help='Output format')
+        parser.add_argument('--output', default='-', help='Output file, "-" for stdout')
+        parser.add_argument('--created-after', type=parse_moment, help='Include ads created at or after')
+        parser.add_argument('--created-before', type=parse_moment, help='Include ads created before')
+        parser.add_argument('--since', default='', help='Watermark of a previous export')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Rows fetched from the database at once')
+
+    def handle(self, *args, **options) -> None:
+        try:
+            queryset, watermark = prepare_export(options['created_after'], options['created_before'],
+                                                 options['since'])
+        except ValueError:
+            raise CommandError('Invalid watermark')
+
+        to_stdout: bool = options['output'] == '-'
+        stream = self.stdout if to_stdout else open(options['output'], 'w', encoding='utf-8', newline='')
+        try:
+            rows: int = 0
+            for chunk in export_advertisements(queryset, options['format'], options['chunk_size']):
+                stream.write(chunk)
+                rows += 1
+        finally:
+            if not to_stdout:
+                stream.close()
+
+        if options['format'] == 'csv':
+            rows -= 1
+        self.stderr.write(f'Exported {rows} advertisements, watermark: {watermark or ""}')
@@ -0,0 +1,35 @@
+import sys
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from rest_framework.exceptions import ParseError
+
+from advertisements.services import import_comments
+from core.parsers import NDJSONParser
+
+
+class Command(BaseCommand):
+    help = 'Import comments from NDJSON lines with ad_id, author_id, text and an optional created_at'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('input', help='Input file, "-" for stdin')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Comments per INSERT and transaction')
+
+    def handle(self, *args, **options) -> None:
+        from_stdin: bool = options['input'] == '-'
+        stream = sys.stdin.buffer if from_stdin else open(options['input'], 'rb')
+        try:
+            items: list = NDJSONParser().parse(stream)
+        except ParseError as exc:
+            raise CommandError(str(exc.detail))
+        finally:
+            if not from_stdin:
+                stream.close()
+
+        results: list[dict] = import_comments(items, options['chunk_size'])
+        for result in results:
+            if result['status'] == 'error':
+                self.stderr.write(f'Line {result["index"] + 1}: {result["errors"]}')
+
+        statuses: Counter = Counter(result['status'] for result in results)
+        self.stdout.write(self.style.SUCCESS(f'Imported {statuses["created"]} comments, {statuses["error"]} failed'))
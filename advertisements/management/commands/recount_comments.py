@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import DEFAULT_DB_ALIAS
+
+from advertisements.counters import recount_comment_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute comments_count and last_comment_at of advertisements from their comments'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('ad_ids', nargs='*', type=int, help='Advertisements to repair, all by default')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Advertisements per UPDATE')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias')
+
+    def handle(self, *args, **options) -> None:
+        updated: int = recount_comment_counters(options['batch_size'], options['ad_ids'] or None,
+                                                options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Recounted {updated} advertisements'))
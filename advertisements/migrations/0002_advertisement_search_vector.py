@@ -0,0 +1,57 @@
+from django.db import migrations
+
+SEARCH_CONFIG = 'russian'
+
+FORWARD_SQL = [
+    'ALTER TABLE advertisements_advertisement ADD COLUMN search_vector tsvector',
+    f'''
+    CREATE FUNCTION advertisements_advertisement_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE TRIGGER advertisements_advertisement_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON advertisements_advertisement
+    FOR EACH ROW EXECUTE FUNCTION advertisements_advertisement_search_vector_update()
+    ''',
+    'UPDATE advertisements_advertisement SET title = title',
+    'CREATE INDEX advertisements_ad_search_gin ON advertisements_advertisement USING gin (search_vector)',
+]
+
+REVERSE_SQL = [
+    'DROP INDEX IF EXISTS advertisements_ad_search_gin',
+    'DROP TRIGGER IF EXISTS advertisements_advertisement_search_vector_trigger ON advertisements_advertisement',
+    'DROP FUNCTION IF EXISTS advertisements_advertisement_search_vector_update()',
+    'ALTER TABLE advertisements_advertisement DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def run_postgres_sql(statements):
+    """
+    Build a migration function executing statements on PostgreSQL only,
+    other databases use the portable search engine without a stored vector
+    """
+
+    def migrate(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return migrate
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advertisements', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_postgres_sql(FORWARD_SQL), run_postgres_sql(REVERSE_SQL)),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.1.13 on 2026-10-17 19:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('advertisements', '0002_advertisement_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['-created_at', '-id'], name='ad_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='ad_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['ad', '-created_at', '-id'], name='comment_ad_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='advertisement',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='ad',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='advertisements.advertisement'),
+        ),
+    ]
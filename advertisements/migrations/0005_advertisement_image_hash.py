@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-17 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advertisements', '0004_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advertisement',
+            name='image_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
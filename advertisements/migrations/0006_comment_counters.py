@@ -0,0 +1,48 @@
+# Generated by Django 4.1.13 on 2026-10-17 19:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_comment_counters(apps, schema_editor):
+    """
+    Compute the counters of existing advertisements in one UPDATE
+    """
+    Advertisement = apps.get_model('advertisements', 'Advertisement')
+    Comment = apps.get_model('advertisements', 'Comment')
+    comments = Comment.objects.using(schema_editor.connection.alias).filter(ad_id=OuterRef('pk')).order_by()
+
+    Advertisement.objects.using(schema_editor.connection.alias).update(
+        comments_count=Coalesce(Subquery(comments.values('ad_id').annotate(count=Count('pk')).values('count')), 0),
+        last_comment_at=Subquery(comments.order_by('-created_at').values('created_at')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advertisements', '0005_advertisement_image_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advertisement',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='advertisement',
+            name='last_comment_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['-comments_count', '-id'], name='ad_comments_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['-last_comment_at', '-id'], name='ad_last_comment_idx'),
+        ),
+        migrations.RunPython(fill_comment_counters, migrations.RunPython.noop),
+    ]
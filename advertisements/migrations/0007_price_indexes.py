@@ -0,0 +1,21 @@
+# Generated by Django 4.1.13 on 2026-10-17 19:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advertisements', '0006_comment_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['price', 'id'], name='ad_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['author', 'price', 'id'], name='ad_author_price_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.13 on 2026-10-17 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advertisements', '0007_price_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['updated_at', 'id'], name='ad_updated_idx'),
+        ),
+    ]
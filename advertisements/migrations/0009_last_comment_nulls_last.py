@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# SQLite sorts NULLs as the smallest values, so DESC already puts them last there
+CREATE_SQL = {
+    'postgresql': 'CREATE INDEX ad_last_comment_idx ON advertisements_advertisement '
+                  '(last_comment_at DESC NULLS LAST, id DESC)',
+    'default': 'CREATE INDEX ad_last_comment_idx ON advertisements_advertisement (last_comment_at DESC, id DESC)',
+}
+DROP_SQL = 'DROP INDEX IF EXISTS ad_last_comment_idx'
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    schema_editor.execute(CREATE_SQL.get(vendor, CREATE_SQL['default']))
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advertisements', '0008_export_updated_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='advertisement',
+            name='ad_last_comment_idx',
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,17 +1,56 @@
 from django.db import models
+from django.db.models import F, QuerySet
 
 from users.models import User
 
 
+# ----------------------------------------------------------------------------------------------------------------------
+# Create custom querysets
+class AuthorQuerySet(QuerySet):
+    """
+    QuerySet for models with an author, able to join author data in the same query
+    """
+
+    def with_author(self) -> QuerySet:
+        """
+        Annotate rows with flat author fields used by the serializers
+
+        :return: A queryset annotated with author_first_name, author_last_name, author_phone, author_image,
+                 author_image_hash and author_updated_at
+        """
+        return self.annotate(
+            author_first_name=F('author__first_name'),
+            author_last_name=F('author__last_name'),
+            author_phone=F('author__phone'),
+            author_image=F('author__image'),
+            author_image_hash=F('author__image_hash'),
+            author_updated_at=F('author__updated_at'),
+        )
+
+
 # ----------------------------------------------------------------------------------------------------------------------
 # Create advertisement model
 class Advertisement(models.Model):
-    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    """
+    On PostgreSQL the table also has a trigger-maintained `search_vector` column,
+    see migration 0002 and advertisements.search
+
+    `comments_count` and `last_comment_at` are denormalized from comments, see advertisements.counters.
+    The (last_comment_at DESC NULLS LAST, id DESC) index is created by migration 0009, SQLite cannot
+    declare NULLS LAST in an index
+    """
+    author = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     description = models.CharField(max_length=1000, null=True)
     image = models.ImageField(upload_to='advertisements/', null=True)
+    image_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    last_comment_at = models.DateTimeField(null=True, editable=False)
     price = models.PositiveIntegerField()
     title = models.CharField(max_length=200)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = AuthorQuerySet.as_manager()
 
     class Meta:
         """
@@ -19,6 +58,14 @@ class Advertisement(models.Model):
         """
         verbose_name: str = 'Объявление'
         verbose_name_plural: str = 'Объявления'
+        indexes: list[models.Index] = [
+            models.Index(fields=['-created_at', '-id'], name='ad_created_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='ad_author_created_idx'),
+            models.Index(fields=['price', 'id'], name='ad_price_idx'),
+            models.Index(fields=['author', 'price', 'id'], name='ad_author_price_idx'),
+            models.Index(fields=['-comments_count', '-id'], name='ad_comments_count_idx'),
+            models.Index(fields=['updated_at', 'id'], name='ad_updated_idx'),
+        ]
 
     def __str__(self):
         return f'Объявление "{self.title}" создано {self.created_at} пользователем {self.author.first_name}'
@@ -29,8 +76,11 @@ class Advertisement(models.Model):
 class Comment(models.Model):
     text = models.CharField(max_length=1000)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
-    ad = models.ForeignKey(Advertisement, on_delete=models.CASCADE)
+    ad = models.ForeignKey(Advertisement, on_delete=models.CASCADE, db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = AuthorQuerySet.as_manager()
 
     class Meta:
         """
@@ -38,6 +88,27 @@ class Comment(models.Model):
         """
         verbose_name: str = 'Комментарий'
         verbose_name_plural: str = 'Комментарии'
+        indexes: list[models.Index] = [
+            models.Index(fields=['ad', '-created_at', '-id'], name='comment_ad_created_idx'),
+        ]
 
     def __str__(self):
         return f'Пользователь {self.author.first_name} оставил комментарий к объявлению "{self.ad.title}"'
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Helpers
+def set_author_fields(instance: Advertisement | Comment, author: User) -> None:
+    """
+    Copy author fields onto an instance the same way AuthorQuerySet.with_author annotates them
+
+    :param instance: An Advertisement or Comment object
+    :param author: The author of the instance
+    :return: None
+    """
+    instance.author_first_name = author.first_name
+    instance.author_last_name = author.last_name
+    instance.author_phone = author.phone
+    instance.author_image = author.image.name or None
+    instance.author_image_hash = author.image_hash
+    instance.author_updated_at = author.updated_at
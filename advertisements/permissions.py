@@ -1,12 +1,21 @@
-from rest_framework.permissions import BasePermission
+from django.db.models import QuerySet
 
+from core.permissions import QuerysetPermission
 from users.models import User
 
 
 # ----------------------------------------------------------------------------------------------------------------------
 # Create custom permissions
-class IsOwnerOrAdmin(BasePermission):
+class IsOwnerOrAdmin(QuerysetPermission):
+    """
+    Allows the author of an object and administrators, compares the author id without loading the author
+    """
     message: str = 'You are not the owner or administrator'
 
     def has_object_permission(self, request, view, obj) -> bool:
-        return request.user.id == obj.author.id or request.user.role == User.Roles.ADMIN
+        return obj.author_id == request.user.id or request.user.role == User.Roles.ADMIN
+
+    def filter_queryset(self, request, queryset: QuerySet, view) -> QuerySet:
+        if request.user.role == User.Roles.ADMIN:
+            return queryset
+        return queryset.filter(author_id=request.user.id)
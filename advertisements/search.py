@@ -0,0 +1,132 @@
+import re
+from functools import reduce
+from operator import and_
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, F, Func, IntegerField, Q, QuerySet, TextField, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Search settings
+# The text search configuration of the search_vector trigger, see migration 0002. Queries must use the same
+# one, so changing it takes a new migration replacing the trigger and rebuilding the stored vectors
+SEARCH_CONFIG: str = 'russian'
+MAX_SEARCH_TERMS: int = 8
+
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def get_terms(query: str) -> list[str]:
+    """
+    Split a user query into normalized search terms
+
+    :param query: A raw search string
+    :return: A list of lowercase terms without punctuation
+    """
+    return TERM_PATTERN.findall(query.casefold())[:MAX_SEARCH_TERMS]
+
+
+def casefold(value: str | None) -> str | None:
+    return value.casefold() if value is not None else None
+
+
+class Casefold(Func):
+    """
+    Unicode-aware lowercase: SQLite LOWER() and LIKE only fold ASCII, so Python does it there
+    """
+    function: str = 'LOWER'
+    output_field = TextField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        connection.ensure_connection()
+        connection.connection.create_function('PY_CASEFOLD', 1, casefold, deterministic=True)
+        return super().as_sql(compiler, connection, function='PY_CASEFOLD', **extra_context)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Search engines
+class BaseSearchEngine:
+    """
+    Search engine interface: filters a queryset by a query and orders it by relevance
+    """
+    rank_field: str = 'search_rank'
+
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        """
+        Filter and rank a queryset of advertisements
+
+        :param queryset: A queryset of advertisements
+        :param query: A raw search string
+        :return: A queryset annotated with search_rank and ordered by it
+        """
+        terms: list[str] = get_terms(query)
+        if not terms:
+            return queryset
+
+        queryset = self.filter(queryset, terms)
+        return queryset.order_by(f'-{self.rank_field}', '-created_at', '-id')
+
+    def filter(self, queryset: QuerySet, terms: list[str]) -> QuerySet:
+        raise NotImplementedError('`filter()` must be implemented.')
+
+
+class PostgresSearchEngine(BaseSearchEngine):
+    """
+    Full-text search over the trigger-maintained `search_vector` column with a GIN index
+
+    Every term is matched as a prefix so results update while the user is typing.
+    """
+
+    def filter(self, queryset: QuerySet, terms: list[str]) -> QuerySet:
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+
+        raw_query: str = ' & '.join(f"'{term}':*" for term in terms)
+        search_query = SearchQuery(raw_query, search_type='raw', config=SEARCH_CONFIG)
+        vector = RawSQL(f'{queryset.model._meta.db_table}.search_vector', (), output_field=SearchVectorField())
+
+        return queryset.alias(search_vector=vector).filter(search_vector=search_query).annotate(
+            **{self.rank_field: SearchRank(F('search_vector'), search_query)})
+
+
+class SimpleSearchEngine(BaseSearchEngine):
+    """
+    Portable fallback engine for SQLite and tests
+
+    Every term must occur in the title or the description, title matches rank higher.
+    """
+    title_weight: int = 2
+    description_weight: int = 1
+
+    def filter(self, queryset: QuerySet, terms: list[str]) -> QuerySet:
+        queryset = queryset.alias(search_title=Casefold('title'), search_description=Casefold('description'))
+        condition: Q = reduce(and_, (
+            Q(search_title__contains=term) | Q(search_description__contains=term) for term in terms))
+        rank = reduce(lambda left, right: left + right, (
+            Case(When(search_title__contains=term, then=Value(self.title_weight)), default=Value(0),
+                 output_field=IntegerField()) +
+            Case(When(search_description__contains=term, then=Value(self.description_weight)), default=Value(0),
+                 output_field=IntegerField())
+            for term in terms
+        ))
+
+        return queryset.filter(condition).annotate(**{self.rank_field: rank})
+
+
+ENGINES: dict[str, type[BaseSearchEngine]] = {
+    'postgresql': PostgresSearchEngine,
+}
+
+
+def get_search_engine(using: str = 'default') -> BaseSearchEngine:
+    """
+    Returns the search engine configured in settings or the best one for the database
+
+    :param using: A database alias
+    :return: A search engine instance
+    """
+    engine_path: str = getattr(settings, 'ADVERTISEMENT_SEARCH_ENGINE', '')
+    if engine_path:
+        return import_string(engine_path)()
+    return ENGINES.get(connections[using].vendor, SimpleSearchEngine)()
@@ -1,9 +1,19 @@
+from typing import Optional
+
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from advertisements.models import Advertisement, Comment
+from advertisements.counters import create_comments
+from advertisements.export import EXPORT_FORMATS, decode_watermark
+from advertisements.models import Advertisement, Comment, set_author_fields
+from core.images import build_thumbnail_url
+from core.serializers import ValuesSerializer
 from users.models import User
-from users.serializers import UserSerializer
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Thumbnail sizes
+LIST_IMAGE_SIZE: int = 480
+AVATAR_IMAGE_SIZE: int = 160
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -12,10 +22,40 @@ class AdvertisementListSerializer(serializers.ModelSerializer):
     """
     List serializer for ViewSet
     """
+    image = serializers.SerializerMethodField()
 
     class Meta:
         model: Advertisement = Advertisement
-        fields: list[str] = ['pk', 'image', 'title', 'price', 'description']
+        fields: list[str] = ['pk', 'image', 'title', 'price', 'description', 'comments_count', 'last_comment_at']
+
+    def get_image(self, obj) -> str:
+        """
+        Returns the thumbnail of the image, or the original until it is processed
+
+        :param obj: An Advertisement object
+        :return: A string formatted image url
+        """
+        return build_thumbnail_url(obj.image.name, obj.image_hash, LIST_IMAGE_SIZE,
+                                   self.context.get('request'), obj.image.storage)
+
+
+class AdvertisementListValuesSerializer(ValuesSerializer):
+    """
+    Read-only variant of AdvertisementListSerializer for list pages, built from `.values()` rows
+    """
+    serializer_class: type = AdvertisementListSerializer
+    # The image thumbnail and the default keyset ordering
+    extra_columns: tuple[str, ...] = ('image', 'image_hash', 'created_at', 'id')
+
+    def get_image(self, row: dict) -> Optional[str]:
+        """
+        Returns the thumbnail of the image, or the original until it is processed
+
+        :param row: An Advertisement row
+        :return: A string formatted image url
+        """
+        return build_thumbnail_url(row['image'], row['image_hash'], LIST_IMAGE_SIZE,
+                                   self.context.get('request'), Advertisement._meta.get_field('image').storage)
 
 
 class AdvertisementDetailSerializer(serializers.ModelSerializer):
@@ -35,55 +75,82 @@ class AdvertisementDetailSerializer(serializers.ModelSerializer):
         """
         Returns the phone number associated with the author
 
-        :param obj: An Advertisement object
+        :param obj: An Advertisement object annotated with author fields
         :return: A string formatted phone number
         """
-        return str(obj.author.phone)
+        return str(obj.author_phone)
 
     def get_author_first_name(self, obj) -> str:
         """
         Returns the first name associated with the author
 
-        :param obj: An Advertisement object
+        :param obj: An Advertisement object annotated with author fields
         :return: A string formatted first name
         """
-        return obj.author.first_name
+        return obj.author_first_name
 
     def get_author_last_name(self, obj) -> str:
         """
         Returns the last name associated with the author
 
-        :param obj: An Advertisement object
+        :param obj: An Advertisement object annotated with author fields
         :return: A string formatted last name
         """
-        return obj.author.last_name
+        return obj.author_last_name
 
 
 class AdvertisementCreateSerializer(AdvertisementDetailSerializer):
     """
-    Create serializer for ViewSet
+    Create serializer for ViewSet, the author is set by the view from the authenticated user
     """
-    author = serializers.SlugRelatedField(
-        write_only=True,
-        slug_field='id',
-        queryset=User.objects.all())
     image = serializers.ImageField(required=False)
     description = serializers.CharField(required=False)
 
     class Meta:
         model: Advertisement = Advertisement
         fields: list[str] = ['pk', 'image', 'title', 'price', 'phone', 'description',
-                             'author_first_name', 'author_last_name', 'author_id', 'author']
+                             'author_first_name', 'author_last_name', 'author_id']
 
-    def is_valid(self, raise_exception=False) -> bool:
+    def create(self, validated_data) -> Advertisement:
         """
-        Validate data
-
-        :return: True if valid else False
+        Create a new advertisement and attach author fields for the response
         """
-        self.initial_data['author'] = self.context['request'].user.id
+        advertisement: Advertisement = super().create(validated_data)
+        set_author_fields(advertisement, self.context['request'].user)
+
+        return advertisement
 
-        return super().is_valid(raise_exception=raise_exception)
+
+class AdvertisementBulkItemSerializer(serializers.ModelSerializer):
+    """
+    Serializer validating a single item of a bulk request
+    """
+    description = serializers.CharField(required=False, allow_null=True)
+
+    class Meta:
+        model: Advertisement = Advertisement
+        fields: list[str] = ['title', 'price', 'description']
+
+
+class AdvertisementExportQuerySerializer(serializers.Serializer):
+    """
+    Validates query parameters of the export endpoint
+    """
+    fmt = serializers.ChoiceField(choices=list(EXPORT_FORMATS), default='ndjson')
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    since = serializers.CharField(required=False, allow_blank=True)
+
+    def validate_since(self, value: str) -> str:
+        """
+        Check that the watermark was produced by a previous export
+        """
+        if value:
+            try:
+                decode_watermark(value)
+            except ValueError:
+                raise ValidationError('Неверная отметка экспорта')
+        return value
 
 
 class AdvertisementUpdateSerializer(AdvertisementListSerializer):
@@ -116,30 +183,55 @@ class CommentSerializer(serializers.ModelSerializer):
         """
         Returns the image associated with the author
 
-        :param obj: A Comment object
+        :param obj: A Comment object annotated with author fields
         :return: A string formatted image path
         """
-        request = self.context.get('request')
-        serializer = UserSerializer(instance=obj.author, context={'request': request})
-        return serializer.data.get('image')
+        return build_thumbnail_url(obj.author_image, obj.author_image_hash, AVATAR_IMAGE_SIZE,
+                                   self.context.get('request'), User._meta.get_field('image').storage)
 
     def get_author_first_name(self, obj) -> str:
         """
         Returns the first name associated with the author
 
-        :param obj: A Comment object
+        :param obj: A Comment object annotated with author fields
         :return: A string formatted first name
         """
-        return obj.author.first_name
+        return obj.author_first_name
 
     def get_author_last_name(self, obj) -> str:
         """
         Returns the last name associated with the author
 
-        :param obj: A Comment object
+        :param obj: A Comment object annotated with author fields
         :return: A string formatted last name
         """
-        return obj.author.last_name
+        return obj.author_last_name
+
+
+class CommentValuesSerializer(ValuesSerializer):
+    """
+    Read-only variant of CommentSerializer for list pages, built from `.values()` rows annotated with author fields
+    """
+    serializer_class: type = CommentSerializer
+    # The author avatar thumbnail and the keyset tie-breaker
+    extra_columns: tuple[str, ...] = ('author_image', 'author_image_hash', 'author_first_name', 'author_last_name',
+                                      'id')
+
+    def get_author_image(self, row: dict) -> Optional[str]:
+        """
+        Returns the image associated with the author
+
+        :param row: A Comment row annotated with author fields
+        :return: A string formatted image path
+        """
+        return build_thumbnail_url(row['author_image'], row['author_image_hash'], AVATAR_IMAGE_SIZE,
+                                   self.context.get('request'), User._meta.get_field('image').storage)
+
+    def get_author_first_name(self, row: dict) -> str:
+        return row['author_first_name']
+
+    def get_author_last_name(self, row: dict) -> str:
+        return row['author_last_name']
 
 
 class CommentCreateSerializer(CommentSerializer):
@@ -155,19 +247,29 @@ class CommentCreateSerializer(CommentSerializer):
 
     def create(self, validated_data):
         """
-        Create a new comment
+        Create a new comment and account it in the counters of the advertisement
+
+        The advertisement is checked by the counter update, the author fields of the response
+        come from the authenticated user.
         """
         ad_id = self.context['request'].parser_context['kwargs']['ad_id']
         author = self.context['request'].user
 
+        comment = Comment(author_id=author.id, ad_id=ad_id, **validated_data)
         try:
-            _ = Advertisement.objects.get(id=ad_id)
+            create_comments([comment])
         except Advertisement.DoesNotExist:
             raise ValidationError({'detail': 'Неизвестное объявление'})
+        set_author_fields(comment, author)
 
-        validated_data['author'] = author
-        validated_data['ad_id'] = ad_id
+        return comment
 
-        comment = super().create(validated_data)
 
-        return comment
+class CommentImportItemSerializer(serializers.Serializer):
+    """
+    Serializer validating a single comment of an import
+    """
+    ad_id = serializers.IntegerField(min_value=1)
+    author_id = serializers.IntegerField(min_value=1)
+    text = serializers.CharField(max_length=1000)
+    created_at = serializers.DateTimeField(required=False)
@@ -0,0 +1,268 @@
+import logging
+from typing import Iterator
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from advertisements.counters import create_comments
+from advertisements.models import Advertisement, Comment
+from advertisements.serializers import AdvertisementBulkItemSerializer, CommentImportItemSerializer
+from core.cache import bump_version
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+# Reported for items of a chunk the database refused, the cause goes to the log only
+CHUNK_ERROR: str = 'Не удалось сохранить объявления, повторите запрос'
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Helpers
+def chunked(items: list, size: int) -> Iterator[list]:
+    """
+    Split a list into consecutive chunks
+
+    :param items: A list to split
+    :param size: The maximum chunk length
+    :return: An iterator of lists
+    """
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def get_editable_advertisements(user: User) -> QuerySet:
+    """
+    Returns advertisements the user may change: all for administrators, own ones otherwise
+
+    :param user: The authenticated user
+    :return: A queryset of advertisements
+    """
+    queryset: QuerySet = Advertisement.objects.all()
+    if user.role == User.Roles.ADMIN:
+        return queryset
+    return queryset.filter(author_id=user.id)
+
+
+def error_result(index: int, errors) -> dict:
+    return {'index': index, 'status': 'error', 'errors': errors}
+
+
+# Relations the raw delete below cascades by hand, as (model label, field name)
+RAW_DELETE_RELATIONS: set[tuple[str, str]] = {('advertisements.Comment', 'ad')}
+
+
+def check_raw_delete_relations() -> None:
+    """
+    Make sure the comments are the only rows referencing advertisements and nothing references comments
+
+    `delete_advertisements` deletes both tables without the collector, a new relation would be left dangling
+    or fail on its foreign key instead of cascading.
+
+    :raises: ImproperlyConfigured if a model gained a relation to advertisements or comments
+    """
+    relations: set[tuple[str, str]] = {
+        (relation.related_model._meta.label, relation.field.name)
+        for model in (Advertisement, Comment) for relation in model._meta.related_objects
+    }
+    if relations != RAW_DELETE_RELATIONS:
+        raise ImproperlyConfigured(f'delete_advertisements cascades {sorted(RAW_DELETE_RELATIONS)} only, '
+                                   f'the models have {sorted(relations)}')
+
+
+def delete_advertisements(queryset: QuerySet) -> int:
+    """
+    Delete advertisements and their comments with one DELETE per table, in one transaction
+
+    The comments are neither loaded nor sent signals, which the cascade of `delete()` does row by row:
+    their counters go away with the advertisements and cache versions are bumped once. Delete receivers
+    of both models are skipped, the bumps stand in for the only ones connected, the response cache ones.
+
+    :param queryset: A queryset of advertisements
+    :return: Number of deleted advertisements
+    :raises: ImproperlyConfigured if other relations than the comments would need cascading
+    """
+    check_raw_delete_relations()
+    using: str = queryset.db
+    with transaction.atomic(using=using, savepoint=False):
+        Comment.objects.filter(ad__in=queryset.values('pk'))._raw_delete(using)
+        deleted: int = queryset._raw_delete(using)
+
+    bump_version(Comment)
+    bump_version(Advertisement)
+    return deleted
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Bulk operations
+def bulk_create_advertisements(user: User, items: list, chunk_size: int) -> list[dict]:
+    """
+    Validate items in one pass and insert the valid ones with bulk_create, one transaction per chunk
+
+    :param user: The author of the advertisements, resolved once for the whole request
+    :param items: A list of dicts with title, price and description
+    :param chunk_size: Number of rows per INSERT and transaction
+    :return: A result dict per item in the input order
+    """
+    results: list[dict] = [{} for _ in items]
+    pending: list[tuple[int, Advertisement]] = []
+
+    for index, item in enumerate(items):
+        serializer = AdvertisementBulkItemSerializer(data=item)
+        if serializer.is_valid():
+            pending.append((index, Advertisement(author_id=user.id, **serializer.validated_data)))
+        else:
+            results[index] = error_result(index, serializer.errors)
+
+    for chunk in chunked(pending, chunk_size):
+        try:
+            with transaction.atomic():
+                Advertisement.objects.bulk_create([advertisement for _, advertisement in chunk])
+        except DatabaseError:
+            logger.exception('Bulk create of %s advertisements failed', len(chunk))
+            for index, _ in chunk:
+                results[index] = error_result(index, {'detail': CHUNK_ERROR})
+            continue
+
+        for index, advertisement in chunk:
+            results[index] = {'index': index, 'status': 'created', 'pk': advertisement.pk}
+
+    if pending:
+        bump_version(Advertisement)
+    return results
+
+
+def bulk_update_advertisements(user: User, items: list, chunk_size: int) -> list[dict]:
+    """
+    Apply partial updates loaded with a single query and written with bulk_update, one transaction per chunk
+
+    Items are grouped by the set of fields they change and every group is written with its own fields only,
+    so a column an item did not send is never rewritten from the read above and concurrent edits survive.
+
+    :param user: The authenticated user
+    :param items: A list of dicts with pk and the fields to change
+    :param chunk_size: Number of rows per UPDATE and transaction
+    :return: A result dict per item in the input order
+    """
+    results: list[dict] = [{} for _ in items]
+    ids: set = {item.get('pk') for item in items if isinstance(item, dict) and isinstance(item.get('pk'), int)}
+    advertisements: dict[int, Advertisement] = get_editable_advertisements(user).in_bulk(ids)
+    groups: dict[tuple[str, ...], list[tuple[int, Advertisement]]] = {}
+    now = timezone.now()
+
+    for index, item in enumerate(items):
+        advertisement: Advertisement = advertisements.get(item.get('pk')) if isinstance(item, dict) else None
+        if advertisement is None:
+            results[index] = error_result(index, {'pk': 'Объявление не найдено'})
+            continue
+
+        serializer = AdvertisementBulkItemSerializer(advertisement, data=item, partial=True)
+        if not serializer.is_valid():
+            results[index] = error_result(index, serializer.errors)
+            continue
+
+        for field, value in serializer.validated_data.items():
+            setattr(advertisement, field, value)
+        advertisement.updated_at = now
+        groups.setdefault(tuple(sorted({'updated_at', *serializer.validated_data})), []).append((index, advertisement))
+
+    for fields, pending in groups.items():
+        for chunk in chunked(pending, chunk_size):
+            try:
+                with transaction.atomic():
+                    Advertisement.objects.bulk_update([advertisement for _, advertisement in chunk], fields)
+            except DatabaseError:
+                logger.exception('Bulk update of %s advertisements failed', len(chunk))
+                for index, _ in chunk:
+                    results[index] = error_result(index, {'detail': CHUNK_ERROR})
+                continue
+
+            for index, advertisement in chunk:
+                results[index] = {'index': index, 'status': 'updated', 'pk': advertisement.pk}
+
+    if groups:
+        bump_version(Advertisement)
+    return results
+
+
+def bulk_delete_advertisements(user: User, items: list, chunk_size: int) -> list[dict]:
+    """
+    Delete advertisements by primary keys, one transaction per chunk
+
+    :param user: The authenticated user
+    :param items: A list of primary keys or dicts with pk
+    :param chunk_size: Number of rows per DELETE and transaction
+    :return: A result dict per item in the input order
+    """
+    ids: list = [item.get('pk') if isinstance(item, dict) else item for item in items]
+    valid_ids: list[int] = list({pk for pk in ids if isinstance(pk, int)})
+    deleted: set[int] = set()
+
+    for chunk in chunked(valid_ids, chunk_size):
+        with transaction.atomic():
+            queryset: QuerySet = get_editable_advertisements(user).filter(pk__in=chunk)
+            existing: set[int] = set(queryset.values_list('pk', flat=True))
+            delete_advertisements(queryset)
+        deleted |= existing
+
+    return [
+        {'index': index, 'status': 'deleted', 'pk': pk} if pk in deleted
+        else error_result(index, {'pk': 'Объявление не найдено'})
+        for index, pk in enumerate(ids)
+    ]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Comment import
+def import_comments(items: list, chunk_size: int) -> list[dict]:
+    """
+    Validate comments, check their advertisements and authors with one query each and insert them
+    the way the comment endpoint does, one transaction per chunk
+
+    Given creation times are kept, they are written back after the INSERT of each chunk.
+    Comments without a time get the current one.
+
+    :param items: A list of dicts with ad_id, author_id, text and an optional created_at
+    :param chunk_size: Number of rows per INSERT and transaction
+    :return: A result dict per item in the input order
+    """
+    results: list[dict] = [{} for _ in items]
+    valid: list[tuple[int, dict]] = []
+
+    for index, item in enumerate(items):
+        serializer = CommentImportItemSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            results[index] = error_result(index, serializer.errors)
+
+    ad_ids: set[int] = set(Advertisement.objects.filter(
+        pk__in={data['ad_id'] for _, data in valid}).values_list('pk', flat=True))
+    author_ids: set[int] = set(User.objects.filter(
+        pk__in={data['author_id'] for _, data in valid}).values_list('pk', flat=True))
+    pending: list[tuple[int, Comment]] = []
+    now = timezone.now()
+
+    for index, data in valid:
+        if data['ad_id'] not in ad_ids:
+            results[index] = error_result(index, {'ad_id': 'Неизвестное объявление'})
+        elif data['author_id'] not in author_ids:
+            results[index] = error_result(index, {'author_id': 'Неизвестный пользователь'})
+        else:
+            created_at = data.get('created_at', now)
+            pending.append((index, Comment(ad_id=data['ad_id'], author_id=data['author_id'], text=data['text'],
+                                           created_at=created_at, updated_at=created_at)))
+
+    for chunk in chunked(pending, chunk_size):
+        try:
+            create_comments([comment for _, comment in chunk], keep_timestamps=True)
+        except (Advertisement.DoesNotExist, DatabaseError) as exc:
+            for index, _ in chunk:
+                results[index] = error_result(index, {'detail': str(exc)})
+            continue
+
+        for index, comment in chunk:
+            results[index] = {'index': index, 'status': 'created', 'pk': comment.pk}
+
+    return results
@@ -1,3 +1,790 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import QuerySet
+from django.db.models.signals import post_save
+from django.test import AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from advertisements.models import Advertisement, Comment
+from advertisements.serializers import AdvertisementCreateSerializer, AdvertisementListSerializer, \
+    AdvertisementListValuesSerializer, CommentSerializer, CommentValuesSerializer
+from advertisements.services import CHUNK_ERROR, delete_advertisements
+from advertisements.views import AdvertisementPaginator, AdvertisementsViewSet, AdvertisementUserListView, \
+    CommentPaginator, CommentViewSet
+from core.async_views import as_async_view
+from core.cache import bump_version
+from core.pagination import CachedCountPaginator
+from core.seeding import get_writer, load_fixtures
+from users.authentication import ClaimsTokenObtainPairSerializer
+from users.models import User
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Helpers
+@override_settings(RESPONSE_CACHE_ENABLED=False, PAGINATION_COUNT_CACHE_TIMEOUT=0)
+class QueryCountTestCase(APITestCase):
+    """
+    Base test case with data helpers and query count assertions, measured without the response and count caches
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='owner@skypro.ru', first_name='Иван', last_name='Иванов', phone='+79217777777', password='pass')
+        cls.other_user = User.objects.create_user(
+            email='other@skypro.ru', first_name='Петр', last_name='Петров', phone='+79218888888', password='pass')
+
+    @classmethod
+    def create_ads(cls, count: int, author: User = None) -> list[Advertisement]:
+        """
+        Create advertisements with comments from different authors
+
+        :param count: Number of advertisements to create
+        :param author: The author of the advertisements
+        :return: A list of created advertisements
+        """
+        ads: list[Advertisement] = Advertisement.objects.bulk_create(
+            Advertisement(author=author or cls.user, title=f'Объявление {index}', price=100 + index,
+                          description='Описание')
+            for index in range(count)
+        )
+        Comment.objects.bulk_create(
+            Comment(author=(cls.user, cls.other_user)[index % 2], ad=ads[0], text=f'Комментарий {index}')
+            for index in range(count)
+        )
+        return ads
+
+    def count_queries(self, url: str) -> int:
+        """
+        Perform a GET request and return the number of executed queries
+
+        :param url: An url to request
+        :return: Number of queries
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(context)
+
+    def assertConstantQueries(self, url: str, page_sizes: tuple[int, ...] = (1, 5, 20)) -> None:
+        """
+        Assert that the number of queries for an url does not depend on the page size
+
+        :param url: An url to request
+        :param page_sizes: Page sizes to compare
+        """
+        counts: dict[int, int] = {}
+        for page_size in page_sizes:
+            with mock.patch.object(AdvertisementPaginator, 'page_size', page_size), \
+                    mock.patch.object(CommentPaginator, 'page_size', page_size):
+                counts[page_size] = self.count_queries(url)
+
+        self.assertEqual(len(set(counts.values())), 1, f'{url}: queries per page size {counts}')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Query count tests
+class EndpointQueryCountTest(QueryCountTestCase):
+    """
+    Every read endpoint runs a fixed number of queries regardless of the page size
+    """
+
+    def setUp(self):
+        self.ads = self.create_ads(20)
+        self.client.force_authenticate(self.user)
+
+    def test_ad_list(self):
+        self.assertConstantQueries('/api/ads/')
+        self.assertConstantQueries('/api/ads/?cursor=')
+
+    def test_ad_detail(self):
+        self.assertEqual(self.count_queries(f'/api/ads/{self.ads[0].pk}/'), 1)
+
+    def test_user_ad_list(self):
+        self.assertConstantQueries('/api/ads/me/')
+
+    def test_comment_list(self):
+        self.assertConstantQueries(f'/api/ads/{self.ads[0].pk}/comments/')
+        self.assertConstantQueries(f'/api/ads/{self.ads[0].pk}/comments/?cursor=')
+
+    def test_comment_detail(self):
+        comment: Comment = Comment.objects.filter(ad=self.ads[0], author=self.user).first()
+        self.assertEqual(self.count_queries(f'/api/ads/{self.ads[0].pk}/comments/{comment.pk}/'), 1)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Keyset pagination tests
+class KeysetPaginationTest(QueryCountTestCase):
+    """
+    Cursor links walk the list in both directions without gaps or repeats, bad cursors are answered with 404
+    """
+
+    def setUp(self):
+        self.ads: list[Advertisement] = self.create_ads(10)
+        Advertisement.objects.update(created_at='2024-01-01T00:00:00Z')
+        self.expected: list[int] = list(Advertisement.objects.order_by('-created_at', '-id')
+                                        .values_list('pk', flat=True))
+
+    def get_page(self, url: str) -> dict:
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_walk_forward_and_backward(self):
+        pages: list[list[int]] = []
+        data: dict = self.get_page('/api/ads/?cursor=')
+        self.assertIsNone(data['previous'])
+        self.assertNotIn('count', data)
+        while True:
+            pages.append([row['pk'] for row in data['results']])
+            if not data['next']:
+                break
+            data = self.get_page(data['next'])
+
+        self.assertEqual([len(page) for page in pages], [4, 4, 2])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        backward: list[list[int]] = [[row['pk'] for row in data['results']]]
+        while data['previous']:
+            data = self.get_page(data['previous'])
+            backward.insert(0, [row['pk'] for row in data['results']])
+            self.assertIsNotNone(data['next'])
+
+        self.assertEqual(backward, pages)
+
+    def test_ties_broken_by_id(self):
+        first: dict = self.get_page('/api/ads/?cursor=')
+        Advertisement.objects.filter(pk__in=self.expected[:4]).delete()
+
+        second: dict = self.get_page(first['next'])
+        self.assertEqual([row['pk'] for row in second['results']], self.expected[4:8])
+
+    def test_invalid_cursor(self):
+        token: str = parse_qs(urlsplit(self.get_page('/api/ads/?cursor=')['next']).query)['cursor'][0]
+        payload: dict = json.loads(urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+
+        tampered: list[dict] = [
+            {**payload, 'v': ['not a date', payload['v'][1]]},
+            {**payload, 'v': payload['v'][:1]},
+            {**payload, 'o': ['-price', '-id']},
+        ]
+        tokens: list[str] = ['garbage', token[:-3], urlsafe_b64encode(b'[1, 2]').decode('ascii')] + [
+            urlsafe_b64encode(json.dumps(value).encode('utf-8')).decode('ascii').rstrip('=') for value in tampered
+        ]
+        for value in tokens:
+            self.assertEqual(self.client.get(f'/api/ads/?cursor={value}').status_code, 404, value)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Mutation query count tests
+class MutationQueryCountTest(QueryCountTestCase):
+    """
+    Writes check ownership by author id, owners update in a single statement, 404 and 403 stay distinct
+    """
+
+    def setUp(self):
+        self.ads: list[Advertisement] = self.create_ads(3)
+        self.comment: Comment = Comment.objects.filter(ad=self.ads[0], author=self.user).first()
+        self.foreign_comment: Comment = Comment.objects.filter(ad=self.ads[0], author=self.other_user).first()
+        self.client.force_authenticate(self.user)
+
+    def count_request(self, method: str, url: str, data: dict = None) -> tuple[int, int]:
+        """
+        Perform a request and return its status code and the number of executed queries
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, format='json')
+        return response.status_code, len(context)
+
+    def test_advertisement_mutations(self):
+        url: str = f'/api/ads/{self.ads[1].pk}/'
+        self.assertEqual(self.count_request('post', '/api/ads/', {'title': 'Стол', 'price': 1}), (201, 1))
+        self.assertEqual(self.count_request('patch', url, {'price': 5}), (200, 2))
+        self.assertEqual(Advertisement.objects.get(pk=self.ads[1].pk).price, 5)
+        self.assertEqual(self.count_request('delete', f'/api/ads/{self.ads[2].pk}/'), (204, 3))
+
+        self.client.force_authenticate(self.other_user)
+        self.assertEqual(self.count_request('patch', url, {'price': 7}), (403, 2))
+        self.assertEqual(self.count_request('patch', url, {'price': 'дорого'}), (403, 1))
+        self.assertEqual(self.count_request('patch', '/api/ads/0/', {'price': 7}), (404, 2))
+        self.assertEqual(self.count_request('delete', url), (403, 1))
+        self.assertEqual(Advertisement.objects.get(pk=self.ads[1].pk).price, 5)
+
+        self.other_user.role = User.Roles.ADMIN
+        self.assertEqual(self.count_request('patch', url, {'price': 7}), (200, 2))
+        self.assertEqual(self.client.get(url).data['price'], 7)
+
+    def test_comment_mutations(self):
+        url: str = f'/api/ads/{self.ads[0].pk}/comments/'
+        self.assertEqual(self.count_request('post', url, {'text': 'Новый'}), (201, 4))
+        self.assertEqual(self.count_request('post', '/api/ads/0/comments/', {'text': 'Новый'}), (400, 5))
+        self.assertFalse(Comment.objects.filter(ad_id=0).exists())
+        self.assertEqual(self.count_request('patch', f'{url}{self.comment.pk}/', {'text': 'Изменен'}), (200, 2))
+        self.assertEqual(Comment.objects.get(pk=self.comment.pk).text, 'Изменен')
+        self.assertEqual(self.count_request('delete', f'{url}{self.comment.pk}/'), (204, 3))
+
+        self.assertEqual(self.count_request('get', f'{url}{self.foreign_comment.pk}/'), (403, 1))
+        self.assertEqual(self.count_request('patch', f'{url}{self.foreign_comment.pk}/', {'text': 'Чужой'}), (403, 2))
+        self.assertEqual(self.count_request('delete', f'{url}{self.foreign_comment.pk}/'), (403, 1))
+        self.assertEqual(self.count_request('patch', f'/api/ads/{self.ads[1].pk}/comments/{self.foreign_comment.pk}/',
+                                            {'text': 'Чужой'}), (404, 2))
+        self.assertTrue(Comment.objects.filter(pk=self.foreign_comment.pk, text__startswith='Комментарий').exists())
+
+    def test_update_signals_and_instance_validation(self):
+        url: str = f'/api/ads/{self.ads[1].pk}/'
+        receiver = mock.Mock()
+        post_save.connect(receiver, sender=Advertisement, dispatch_uid='test-update-signal')
+        self.addCleanup(post_save.disconnect, sender=Advertisement, dispatch_uid='test-update-signal')
+
+        self.assertEqual(self.count_request('patch', url, {'price': 5}), (200, 2))
+        kwargs: dict = receiver.call_args.kwargs
+        self.assertEqual((kwargs['instance'].pk, kwargs['instance'].price), (self.ads[1].pk, 5))
+        self.assertEqual((kwargs['created'], kwargs['update_fields']), (False, {'price', 'updated_at'}))
+
+        def validate_price(serializer, value: int) -> int:
+            if value < serializer.instance.price:
+                raise ValidationError('Цену нельзя снижать')
+            return value
+
+        with mock.patch.object(AdvertisementCreateSerializer, 'validate_price', validate_price, create=True):
+            self.assertEqual(self.client.patch(url, {'price': 1}, format='json').status_code, 400)
+            self.assertEqual(self.client.patch(url, {'price': 6}, format='json').status_code, 200)
+        self.assertEqual(Advertisement.objects.get(pk=self.ads[1].pk).price, 6)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Search tests
+class AdvertisementSearchTest(QueryCountTestCase):
+    """
+    The search filter matches prefixes case-insensitively and ranks title matches first
+    """
+
+    def setUp(self):
+        Advertisement.objects.bulk_create([
+            Advertisement(author=self.user, title='Стол', price=100, description='Подойдет к компьютеру'),
+            Advertisement(author=self.user, title='Компьютер недорого', price=100, description='Почти новый'),
+            Advertisement(author=self.user, title='Шкаф', price=100, description=None),
+        ])
+
+    def search(self, query: str) -> list[str]:
+        response = self.client.get('/api/ads/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [ad['title'] for ad in response.data['results']]
+
+    def test_prefix_match_ranked_by_title(self):
+        self.assertEqual(self.search('КОМП'), ['Компьютер недорого', 'Стол'])
+
+    def test_all_terms_required(self):
+        self.assertEqual(self.search('компьютер новый'), ['Компьютер недорого'])
+        self.assertEqual(self.search('шкаф новый'), [])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Response cache tests
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTest(QueryCountTestCase):
+    """
+    Cached ad responses are served without queries and go stale on writes
+    """
+
+    def setUp(self):
+        self.ad = self.create_ads(1)[0]
+        self.client.force_authenticate(self.user)
+
+    def test_list_cached_until_write(self):
+        self.assertEqual(self.client.get('/api/ads/')['X-Cache'], 'MISS')
+        self.assertEqual(self.count_queries('/api/ads/'), 0)
+
+        self.ad.title = 'Новое название'
+        self.ad.save()
+
+        response = self.client.get('/api/ads/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['title'], 'Новое название')
+
+    def test_detail_stale_after_author_change(self):
+        self.client.get(f'/api/ads/{self.ad.pk}/')
+
+        self.user.first_name = 'Семен'
+        self.user.save()
+
+        self.assertEqual(self.client.get(f'/api/ads/{self.ad.pk}/').data['author_first_name'], 'Семен')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Conditional GET tests
+@override_settings(RESPONSE_CACHE_SHARED=True)
+class ConditionalGetTest(QueryCountTestCase):
+    """
+    Matching validators are answered with 304 before serialization
+    """
+
+    def setUp(self):
+        self.ad = self.create_ads(1)[0]
+        self.client.force_authenticate(self.user)
+
+    def test_list_not_modified_without_queries(self):
+        etag: str = self.client.get('/api/ads/')['ETag']
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/ads/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(context), 0)
+
+    @override_settings(RESPONSE_CACHE_SHARED=False)
+    def test_no_list_validators_without_shared_cache(self):
+        self.assertNotIn('ETag', self.client.get('/api/ads/'))
+        self.assertIn('ETag', self.client.get(f'/api/ads/{self.ad.pk}/'))
+
+    def test_detail_etag_changes_on_update(self):
+        url: str = f'/api/ads/{self.ad.pk}/'
+        etag: str = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.patch(url, {'price': 1}, format='json')
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Bulk endpoint tests
+class AdvertisementBulkTest(QueryCountTestCase):
+    """
+    Bulk requests report per-item results and run a fixed number of queries
+    """
+    url: str = '/api/ads/bulk/'
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_create_reports_invalid_items(self):
+        items: list[dict] = [{'title': f'Объявление {index}', 'price': index} for index in range(10)]
+        items.insert(3, {'title': 'Без цены'})
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(self.url, items, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (10, 1))
+        self.assertEqual(response.data['results'][3]['status'], 'error')
+        self.assertEqual(Advertisement.objects.filter(author=self.user).count(), 10)
+        self.assertLessEqual(len(context), 5)
+
+    def test_create_from_ndjson(self):
+        body: bytes = '{"title": "Стол", "price": 1}\n\n{"title": "Шкаф", "price": 2}\n'.encode('utf-8')
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['succeeded'], 2)
+
+    def test_update_and_delete_only_own(self):
+        own, foreign = self.create_ads(1)[0], self.create_ads(1, author=self.other_user)[0]
+
+        response = self.client.patch(self.url, [{'pk': own.pk, 'price': 1}, {'pk': foreign.pk, 'price': 1}],
+                                     format='json')
+        self.assertEqual([result['status'] for result in response.data['results']], ['updated', 'error'])
+        self.assertEqual(Advertisement.objects.get(pk=foreign.pk).price, foreign.price)
+
+        response = self.client.delete(self.url, [own.pk, foreign.pk], format='json')
+        self.assertEqual([result['status'] for result in response.data['results']], ['deleted', 'error'])
+        self.assertTrue(Advertisement.objects.filter(pk=foreign.pk).exists())
+        self.assertFalse(Comment.objects.filter(ad_id=own.pk).exists())
+
+    def test_update_writes_sent_fields_only(self):
+        ads: list[Advertisement] = self.create_ads(3)
+        items: list[dict] = [{'pk': ads[0].pk, 'price': 1}, {'pk': ads[1].pk, 'title': 'Шкаф'},
+                             {'pk': ads[2].pk, 'price': 2}]
+        with mock.patch.object(QuerySet, 'bulk_update', autospec=True, side_effect=QuerySet.bulk_update) as update:
+            self.assertEqual(self.client.patch(self.url, items, format='json').data['succeeded'], 3)
+        self.assertEqual(sorted(tuple(call.args[2]) for call in update.call_args_list),
+                         [('price', 'updated_at'), ('title', 'updated_at')])
+
+        with mock.patch.object(QuerySet, 'bulk_update', side_effect=DatabaseError('UPDATE "secret"')), \
+                self.assertLogs('advertisements.services', 'ERROR'):
+            response = self.client.patch(self.url, items[:1], format='json')
+        self.assertEqual(response.data['results'][0]['errors'], {'detail': CHUNK_ERROR})
+
+    def test_delete_checks_relations(self):
+        with mock.patch('advertisements.services.RAW_DELETE_RELATIONS', set()), \
+                self.assertRaises(ImproperlyConfigured):
+            delete_advertisements(Advertisement.objects.none())
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Export tests
+@override_settings(EXPORT_OVERLAP_SECONDS=0)
+class AdvertisementExportTest(QueryCountTestCase):
+    """
+    The export streams every row once and resumes from the watermark with created and updated rows
+    """
+    url: str = '/api/ads/export/'
+
+    def setUp(self):
+        self.create_ads(5)
+        self.user.role = User.Roles.ADMIN
+        self.user.save()
+        self.client.force_authenticate(self.user)
+
+    def export(self, **params) -> tuple[list[dict], str]:
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        rows: list[dict] = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        return rows, response.get('X-Export-Watermark')
+
+    def test_incremental_export(self):
+        rows, watermark = self.export()
+        self.assertEqual(len(rows), 5)
+
+        self.create_ads(2)
+        rows, next_watermark = self.export(since=watermark)
+        self.assertEqual([row['title'] for row in rows], ['Объявление 0', 'Объявление 1'])
+
+        rows, _ = self.export(since=next_watermark)
+        self.assertEqual(rows, [])
+
+    def test_updated_and_late_rows(self):
+        Advertisement.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        _, watermark = self.export()
+        ad: Advertisement = Advertisement.objects.order_by('id').first()
+        ad.price = 1
+        ad.save()
+
+        rows, watermark = self.export(since=watermark)
+        self.assertEqual([(row['id'], row['price']) for row in rows], [(ad.pk, 1)])
+
+        late: Advertisement = self.create_ads(1)[0]
+        Advertisement.objects.filter(pk=late.pk).update(updated_at=ad.updated_at - timedelta(seconds=5))
+        self.assertEqual(self.export(since=watermark)[0], [])
+        with self.settings(EXPORT_OVERLAP_SECONDS=10):
+            self.assertEqual([row['id'] for row in self.export(since=watermark)[0]], [late.pk, ad.pk])
+
+    def test_csv_and_invalid_watermark(self):
+        response = self.client.get(self.url, {'fmt': 'csv'})
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 6)
+        self.assertEqual(self.client.get(self.url, {'since': 'broken'}).status_code, 400)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Async view tests
+class AsyncReadViewTest(QueryCountTestCase):
+    """
+    Async list and retrieve views answer exactly like the sync views
+    """
+
+    def setUp(self):
+        self.ads: list[Advertisement] = self.create_ads(6)
+        self.token: str = str(ClaimsTokenObtainPairSerializer.get_token(self.user).access_token)
+
+    def assertSameResponse(self, viewset: type, actions: dict[str, str], url: str, authenticated: bool = True,
+                           **kwargs) -> None:
+        """
+        Assert that the async view returns the same status, headers and body as the sync view
+
+        :param viewset: A ViewSet class
+        :param actions: A mapping of HTTP methods to actions
+        :param url: An url to request
+        :param authenticated: True to send the access token
+        :param kwargs: URL keyword arguments of the view
+        """
+        headers: dict = {'authorization': f'Bearer {self.token}'} if authenticated else {}
+        expected = self.client.get(url, **{f'HTTP_{key.upper()}': value for key, value in headers.items()})
+        request = AsyncRequestFactory().get(url, **headers)
+        response = async_to_sync(as_async_view(viewset, actions))(request, **kwargs)
+
+        self.assertEqual((response.status_code, response.render().content), (expected.status_code, expected.content))
+        self.assertEqual(response.get('ETag'), expected.get('ETag'))
+        self.assertEqual(response.get('Allow'), expected.get('Allow'))
+
+    def test_ad_list(self):
+        list_actions: dict[str, str] = {'get': 'list', 'post': 'create'}
+        self.assertSameResponse(AdvertisementsViewSet, list_actions, '/api/ads/?page=2')
+        self.assertSameResponse(AdvertisementsViewSet, list_actions, '/api/ads/?title=5', authenticated=False)
+        self.assertSameResponse(AdvertisementsViewSet, list_actions, '/api/ads/?page=9')
+
+        cursor: str = self.client.get('/api/ads/?cursor=').data['next'].split('cursor=')[1]
+        self.assertSameResponse(AdvertisementsViewSet, list_actions, f'/api/ads/?cursor={cursor}')
+
+    def test_ad_detail(self):
+        detail_actions: dict[str, str] = {'get': 'retrieve', 'patch': 'partial_update', 'delete': 'destroy'}
+        ad_id: int = self.ads[0].pk
+        self.assertSameResponse(AdvertisementsViewSet, detail_actions, f'/api/ads/{ad_id}/', pk=ad_id)
+        self.assertSameResponse(AdvertisementsViewSet, detail_actions, f'/api/ads/{ad_id}/', authenticated=False,
+                                pk=ad_id)
+        self.assertSameResponse(AdvertisementsViewSet, detail_actions, '/api/ads/0/', pk=0)
+
+    def test_comment_list(self):
+        ad_id: int = self.ads[0].pk
+        self.assertSameResponse(CommentViewSet, {'get': 'list', 'post': 'create'}, f'/api/ads/{ad_id}/comments/',
+                                ad_id=ad_id)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Comment counter tests
+class CommentCounterTest(QueryCountTestCase):
+    """
+    Comment counters follow created and deleted comments, cascades included, and can be repaired
+    """
+
+    def setUp(self):
+        self.ads: list[Advertisement] = self.create_ads(3)
+        call_command('recount_comments', stdout=io.StringIO())
+        self.client.force_authenticate(self.user)
+
+    def assertCounters(self, ad: Advertisement) -> None:
+        """
+        Assert that the stored counters of an advertisement match its comments
+        """
+        ad.refresh_from_db()
+        comments = Comment.objects.filter(ad=ad).order_by('-created_at')
+        self.assertEqual((ad.comments_count, ad.last_comment_at),
+                         (comments.count(), comments.values_list('created_at', flat=True).first()))
+
+    def test_create_and_delete(self):
+        ad: Advertisement = self.ads[1]
+        response = self.client.post(f'/api/ads/{ad.pk}/comments/', {'text': 'Первый'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.client.post(f'/api/ads/{ad.pk}/comments/', {'text': 'Второй'}, format='json')
+        self.assertCounters(ad)
+        self.assertEqual(ad.comments_count, 2)
+
+        latest: Comment = Comment.objects.filter(ad=ad).latest('created_at')
+        self.assertEqual(self.client.delete(f'/api/ads/{ad.pk}/comments/{latest.pk}/').status_code, 204)
+        self.assertCounters(ad)
+        self.assertEqual(ad.comments_count, 1)
+
+    def test_cascade_and_repair(self):
+        ad: Advertisement = self.ads[0]
+        self.assertEqual(Advertisement.objects.get(pk=ad.pk).comments_count, 3)
+
+        self.other_user.delete()
+        self.assertCounters(ad)
+        self.assertEqual(ad.comments_count, 2)
+
+        Advertisement.objects.update(comments_count=10, last_comment_at=None)
+        call_command('recount_comments', ad.pk, stdout=io.StringIO())
+        self.assertCounters(ad)
+        self.assertEqual(Advertisement.objects.get(pk=self.ads[1].pk).comments_count, 10)
+
+    def test_list_ordering(self):
+        response = self.client.get('/api/ads/?ordering=-comments_count')
+        self.assertEqual([(row['pk'], row['comments_count']) for row in response.data['results']][:2],
+                         [(self.ads[0].pk, 3), (self.ads[2].pk, 0)])
+        self.assertIsNotNone(response.data['results'][0]['last_comment_at'])
+
+    def test_import(self):
+        ad: Advertisement = self.ads[2]
+        lines: list[dict] = [
+            {'ad_id': ad.pk, 'author_id': self.user.pk, 'text': 'Старый', 'created_at': '2020-01-01T10:00:00Z'},
+            {'ad_id': ad.pk, 'author_id': self.other_user.pk, 'text': 'Новый', 'created_at': '2020-02-01T10:00:00Z'},
+            {'ad_id': 0, 'author_id': self.user.pk, 'text': 'Потерянный'},
+            {'ad_id': ad.pk, 'author_id': self.user.pk},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', encoding='utf-8') as file:
+            file.write('\n'.join(json.dumps(line, ensure_ascii=False) for line in lines))
+            file.flush()
+            stdout, stderr = io.StringIO(), io.StringIO()
+            with self.assertNumQueries(7):
+                call_command('import_comments', file.name, stdout=stdout, stderr=stderr)
+
+        self.assertIn('Imported 2 comments, 2 failed', stdout.getvalue())
+        self.assertIn('Line 3:', stderr.getvalue())
+        self.assertCounters(ad)
+        self.assertEqual((ad.comments_count, ad.last_comment_at.year, ad.last_comment_at.month), (2, 2020, 2))
+        self.assertEqual([(comment.created_at.month, comment.updated_at.month)
+                          for comment in Comment.objects.filter(ad=ad).order_by('created_at')], [(1, 1), (2, 2)])
+        self.assertTrue(Comment._meta.get_field('created_at').auto_now_add)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Page count tests
+@override_settings(PAGINATION_COUNT_CACHE_TIMEOUT=30)
+class PageCountTest(QueryCountTestCase):
+    """
+    Page counts are cached per query until a write, large unfiltered tables report the estimate
+    """
+
+    def setUp(self):
+        self.ads: list[Advertisement] = self.create_ads(6)
+        bump_version(Advertisement)
+        self.client.force_authenticate(self.user)
+
+    def test_count_cached_until_write(self):
+        queries: int = self.count_queries('/api/ads/')
+        self.assertEqual(self.count_queries('/api/ads/'), queries - 1)
+        self.assertEqual(self.client.get('/api/ads/?price_max=102').data['count'], 3)
+
+        self.client.post('/api/ads/', {'title': 'Стол', 'price': 1}, format='json')
+        self.assertEqual(self.count_queries('/api/ads/'), queries)
+        self.assertEqual(self.client.get('/api/ads/').data['count'], 7)
+        self.assertEqual(self.client.get('/api/ads/?price_max=102').data['count'], 4)
+
+    def test_empty_in_filter(self):
+        paginator = CachedCountPaginator(Advertisement.objects.filter(pk__in=[]).order_by('id'), 4)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.count, 0)
+        self.assertEqual(list(paginator.page(1)), [])
+
+    def test_estimate(self):
+        with mock.patch.object(CachedCountPaginator, 'get_estimate', return_value=100000):
+            response = self.client.get('/api/ads/')
+        self.assertEqual(response.data['count'], 100000)
+        self.assertIsNotNone(response.data['next'])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Admin tests
+class AdminChangelistTest(QueryCountTestCase):
+    """
+    Changelist pages run a fixed number of queries: session, user, count and rows
+    """
+
+    def setUp(self):
+        self.ads: list[Advertisement] = self.create_ads(30)
+        self.user.role = User.Roles.ADMIN
+        self.user.save()
+        self.client.force_login(self.user)
+
+    def test_changelists(self):
+        self.assertEqual(self.count_queries('/admin/advertisements/advertisement/'), 4)
+        self.assertEqual(self.count_queries('/admin/advertisements/comment/'), 4)
+        self.assertEqual(self.count_queries('/admin/advertisements/comment/?q=other@skypro.ru'), 4)
+
+    def test_search(self):
+        response = self.client.get('/admin/advertisements/advertisement/?q=объявление 17')
+        self.assertEqual([ad.pk for ad in response.context['cl'].result_list], [self.ads[17].pk])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Filter and ordering tests
+class AdvertisementFilterTest(QueryCountTestCase):
+    """
+    List filters combine, orderings are validated and cursors follow the requested ordering
+    """
+
+    def setUp(self):
+        self.ads: list[Advertisement] = self.create_ads(6) + self.create_ads(2, author=self.other_user)
+        Advertisement.objects.filter(pk=self.ads[1].pk).update(image='advertisements/photo.jpg')
+
+    def get_ids(self, query: str) -> list[int]:
+        response = self.client.get(f'/api/ads/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['pk'] for row in response.data['results']]
+
+    def test_filters(self):
+        ads: list[Advertisement] = self.ads
+        self.assertEqual(self.get_ids('price_min=101&price_max=102&ordering=price'),
+                         [ads[1].pk, ads[7].pk, ads[2].pk])
+        self.assertEqual(self.get_ids(f'author={self.other_user.pk}&ordering=-price'), [ads[7].pk, ads[6].pk])
+        self.assertEqual(self.get_ids('has_image=true'), [ads[1].pk])
+        self.assertEqual(len(self.client.get('/api/ads/?has_image=false').data['results']), 4)
+
+        Advertisement.objects.filter(pk=ads[0].pk).update(created_at='2020-01-01T00:00:00Z')
+        self.assertEqual(self.get_ids('created_before=2021-01-01T00:00:00Z'), [ads[0].pk])
+        self.assertNotIn(ads[0].pk, self.get_ids('created_after=2021-01-01T00:00:00Z'))
+
+    def test_last_comment_ordering_puts_uncommented_last(self):
+        ads: list[Advertisement] = self.ads
+        Advertisement.objects.update(last_comment_at=None)
+        Advertisement.objects.filter(pk=ads[3].pk).update(last_comment_at='2024-01-02T00:00:00Z')
+        Advertisement.objects.filter(pk=ads[5].pk).update(last_comment_at='2024-01-01T00:00:00Z')
+        uncommented: list[int] = sorted((ad.pk for ad in ads if ad.pk not in (ads[3].pk, ads[5].pk)), reverse=True)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.get_ids('ordering=-last_comment_at'), [ads[3].pk, ads[5].pk, *uncommented[:2]])
+        self.assertIn('NULLS LAST', context.captured_queries[-1]['sql'])
+        self.assertEqual(self.get_ids('ordering=last_comment_at'), sorted(uncommented)[:4])
+
+    def test_invalid_ordering(self):
+        for ordering in ('title', 'price,created_at', 'author'):
+            self.assertEqual(self.client.get(f'/api/ads/?ordering={ordering}').status_code, 400, ordering)
+
+    def test_invalid_author(self):
+        for author in ('1.5', 'abc', '0'):
+            response = self.client.get(f'/api/ads/?author={author}')
+            self.assertEqual(response.status_code, 400, author)
+            self.assertIn('author', response.data)
+
+    def test_cursor_follows_ordering(self):
+        pages: list[int] = []
+        response = self.client.get('/api/ads/?ordering=-price&cursor=')
+        while True:
+            pages += [row['pk'] for row in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        expected: list[int] = list(Advertisement.objects.order_by('-price', '-id').values_list('pk', flat=True))
+        self.assertEqual(pages, expected)
+
+        next_link: str = self.client.get('/api/ads/?ordering=price&cursor=').data['next']
+        cursor: str = parse_qs(urlsplit(next_link).query)['cursor'][0]
+        self.assertEqual(self.client.get(f'/api/ads/?cursor={cursor}').status_code, 404)
+
+    def test_cursor_rejects_unsupported_ordering(self):
+        for query in ('ordering=last_comment_at', 'ordering=-last_comment_at', 'search=объявление'):
+            response = self.client.get(f'/api/ads/?{query}&cursor=')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn('cursor', response.data)
+            self.assertEqual(self.client.get(f'/api/ads/?{query}').status_code, 200, query)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Values serializer tests
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class ValuesSerializerTest(APITestCase):
+    """
+    List pages rendered from `.values()` rows are byte-identical to the ModelSerializer output
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        load_fixtures([settings.BASE_DIR / 'fixtures' / name for name in ('users.json', 'ad.json', 'comments.json')],
+                      get_writer())
+        Advertisement.objects.filter(pk=1).update(image='advertisements/photo.jpg', image_hash='a' * 64)
+        Advertisement.objects.filter(pk=2).update(image='advertisements/new.jpg')
+        User.objects.filter(pk=1).update(image='avatars/me.png', image_hash='b' * 64)
+
+    def render_both(self, view: type, url: str) -> tuple[bytes, bytes]:
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        with mock.patch.object(view, 'values_serializers', {}):
+            expected = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.content, expected.content
+
+    def test_serializers(self):
+        request = Request(APIRequestFactory().get('/api/ads/', HTTP_ACCEPT='image/avif,image/webp,*/*'))
+        context: dict = {'request': request}
+
+        for serializer, values_serializer, queryset in (
+            (AdvertisementListSerializer, AdvertisementListValuesSerializer,
+             Advertisement.objects.order_by('-created_at', '-id')),
+            (CommentSerializer, CommentValuesSerializer, Comment.objects.order_by('-created_at', '-id').with_author()),
+        ):
+            rows: list[dict] = list(values_serializer.prepare(queryset))
+            self.assertEqual(JSONRenderer().render(values_serializer(rows, context=context).data),
+                             JSONRenderer().render(serializer(list(queryset), many=True, context=context).data))
+
+    def test_list_pages(self):
+        self.client.force_authenticate(User.objects.get(pk=1))
+        for query in ('', '?page=2', '?cursor=', '?ordering=-price', '?ordering=last_comment_at', '?search=шкаф'):
+            self.assertEqual(*self.render_both(AdvertisementsViewSet, f'/api/ads/{query}'))
+        self.assertEqual(*self.render_both(AdvertisementUserListView, '/api/ads/me/'))
+
+        for ad_id in Comment.objects.values_list('ad_id', flat=True).distinct():
+            self.assertEqual(*self.render_both(CommentViewSet, f'/api/ads/{ad_id}/comments/'))
@@ -1,16 +1,19 @@
 from django.urls import path
 
 from advertisements import views
+from core.async_views import read_view
 
 # ----------------------------------------------------------------------------------------------------------------------
-# Create advertisement and comment urls
+# Create advertisement and comment urls, read views are async with ASYNC_READ_VIEWS
 urlpatterns = [
-    path('ads/', views.AdvertisementsViewSet.as_view({'get': 'list', 'post': 'create'}), name='ad-list'),
-    path('ads/<int:pk>/', views.AdvertisementsViewSet.as_view(
+    path('ads/', read_view(views.AdvertisementsViewSet, {'get': 'list', 'post': 'create'}), name='ad-list'),
+    path('ads/<int:pk>/', read_view(views.AdvertisementsViewSet,
         {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='ad-detail'),
-    path('ads/<int:ad_id>/comments/', views.CommentViewSet.as_view({'get': 'list', 'post': 'create'}),
+    path('ads/<int:ad_id>/comments/', read_view(views.CommentViewSet, {'get': 'list', 'post': 'create'}),
          name='comment-list'),
     path('ads/<int:ad_id>/comments/<int:pk>/', views.CommentViewSet.as_view(
         {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='comment-detail'),
     path('ads/me/', views.AdvertisementUserListView.as_view(), name='user-ads'),
+    path('ads/bulk/', views.AdvertisementBulkView.as_view(), name='ad-bulk'),
+    path('ads/export/', views.AdvertisementExportView.as_view(), name='ad-export'),
 ]
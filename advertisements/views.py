@@ -1,30 +1,45 @@
 from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema_view, extend_schema
-from rest_framework.generics import ListAPIView, get_object_or_404
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import ListAPIView
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
-from advertisements.filters import TitleFilter
+from advertisements.export import EXPORT_FORMATS, DEFAULT_CHUNK_SIZE, prepare_export, export_advertisements
+from advertisements.filters import AdvertisementFilter, AdvertisementOrderingFilter, AdvertisementSearchFilter
 from advertisements.models import Advertisement, Comment
 from advertisements.permissions import IsOwnerOrAdmin
 from advertisements.serializers import AdvertisementListSerializer, AdvertisementDetailSerializer, \
-    AdvertisementCreateSerializer, CommentSerializer, CommentCreateSerializer
+    AdvertisementCreateSerializer, CommentSerializer, CommentCreateSerializer, AdvertisementExportQuerySerializer, \
+    AdvertisementListValuesSerializer, CommentValuesSerializer
+from advertisements.services import bulk_create_advertisements, bulk_update_advertisements, \
+    bulk_delete_advertisements, delete_advertisements
+from core.async_views import AsyncReadMixin
+from core.cache import CachedResponseMixin
+from core.db_routers import ReplicaReadsMixin
+from core.conditional import ConditionalGetMixin
+from core.pagination import KeysetPageNumberPagination
+from core.permissions import ScopedUpdateMixin
+from core.parsers import FastJSONParser, NDJSONParser
+from core.serializers import ValuesSerializerMixin
 
 
 # ----------------------------------------------------------------------------------------------------------------------
 # Custom paginator
-class AdvertisementPaginator(PageNumberPagination):
+class AdvertisementPaginator(KeysetPageNumberPagination):
     """
-    Custom paginator to override default page size
+    Custom paginator to override default page size, supports ?cursor= keyset mode
     """
     page_size: int = 4
 
 
-class CommentPaginator(PageNumberPagination):
+class CommentPaginator(KeysetPageNumberPagination):
     """
-    Custom paginator to override default page size
+    Custom paginator to override default page size, supports ?cursor= keyset mode
     """
     page_size: int = 100
 
@@ -39,18 +54,22 @@ class CommentPaginator(PageNumberPagination):
     partial_update=extend_schema(summary='Отредактировать объявление'),
     destroy=extend_schema(summary='Удалить объявление')
 )
-class AdvertisementsViewSet(ModelViewSet):
+class AdvertisementsViewSet(ReplicaReadsMixin, ConditionalGetMixin, CachedResponseMixin, AsyncReadMixin,
+                            ValuesSerializerMixin, ScopedUpdateMixin, ModelViewSet):
     """
     A ViewSet that provides CRUD operations for the Advertisement model
     """
-    queryset: QuerySet = Advertisement.objects.all().order_by('-created_at')
+    queryset: QuerySet = Advertisement.objects.all().order_by('-created_at', '-id')
     default_serializer = AdvertisementListSerializer
     default_permission: list[type] = [AllowAny]
     pagination_class = AdvertisementPaginator
-    filter_backends: tuple[type] = (DjangoFilterBackend,)
-    filterset_class = TitleFilter
+    filter_backends: tuple[type] = (DjangoFilterBackend, AdvertisementSearchFilter, AdvertisementOrderingFilter)
+    filterset_class = AdvertisementFilter
     http_method_names: list[str] = ['get', 'post', 'patch', 'delete']
+    cache_dependencies: tuple[str, ...] = ('advertisements.Advertisement', 'advertisements.Comment', 'users.User')
+    etag_object_fields: tuple[str, ...] = ('updated_at', 'author_updated_at')
 
+    values_serializers: dict[str, type] = {'list': AdvertisementListValuesSerializer}
     serializers: dict[str, type] = {
         'retrieve': AdvertisementDetailSerializer,
         'create': AdvertisementCreateSerializer,
@@ -78,14 +97,38 @@ class AdvertisementsViewSet(ModelViewSet):
         """
         return self.serializers.get(self.action, self.default_serializer)
 
+    def get_queryset(self) -> QuerySet:
+        """
+        Return queryset, joined with author data for actions that render it
+        """
+        if self.action == 'list':
+            return self.queryset.all()
+        return self.queryset.with_author()
+
+    def get_update_queryset(self) -> QuerySet:
+        return self.queryset.all()
+
+    def perform_create(self, serializer) -> None:
+        """
+        Save a new advertisement on behalf of the authenticated user
+        """
+        serializer.save(author_id=self.request.user.id)
+
+    def perform_destroy(self, instance: Advertisement) -> None:
+        """
+        Delete the advertisement and its comments without loading the comments
+        """
+        delete_advertisements(Advertisement.objects.filter(pk=instance.pk))
+
 
 @extend_schema(summary='Список объявлений пользователя', tags=['Объявления'])
-class AdvertisementUserListView(ListAPIView):
+class AdvertisementUserListView(ValuesSerializerMixin, ListAPIView):
     """
     GET list of advertisements created by current user
     """
-    queryset = Advertisement.objects.all().order_by('-created_at')
+    queryset = Advertisement.objects.all().order_by('-created_at', '-id')
     serializer_class = AdvertisementListSerializer
+    values_serializers: dict[str, type] = {'list': AdvertisementListValuesSerializer}
     permission_classes: list[type] = [IsAuthenticated]
     pagination_class = AdvertisementPaginator
 
@@ -93,7 +136,103 @@ class AdvertisementUserListView(ListAPIView):
         """
         Method to get queryset of advertisements created by current user
         """
-        return self.queryset.filter(author=self.request.user)
+        return self.queryset.filter(author_id=self.request.user.id)
+
+
+@extend_schema(tags=['Объявления'])
+@extend_schema_view(
+    post=extend_schema(summary='Массово создать объявления'),
+    patch=extend_schema(summary='Массово отредактировать объявления'),
+    delete=extend_schema(summary='Массово удалить объявления')
+)
+class AdvertisementBulkView(APIView):
+    """
+    Bulk create, update and delete of advertisements
+
+    The body is a JSON array or newline delimited JSON. Items are validated in one pass,
+    valid ones are written with bulk queries in chunks, each chunk in its own transaction,
+    and the response reports the result of every item in the input order.
+    """
+    permission_classes: list[type] = [IsAuthenticated]
+    parser_classes: list[type] = [FastJSONParser, NDJSONParser]
+    max_items: int = 5000
+    chunk_size: int = 500
+
+    handlers: dict[str, object] = {
+        'POST': bulk_create_advertisements,
+        'PATCH': bulk_update_advertisements,
+        'DELETE': bulk_delete_advertisements,
+    }
+
+    def get_items(self, request) -> list:
+        """
+        Returns the list of items from the request body
+
+        :param request: HTTP request object
+        :return: A list of items
+        :raises: ValidationError if the body is not a list or is too long
+        """
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'non_field_errors': ['Ожидается список объектов']})
+        if len(items) > self.max_items:
+            raise ValidationError({'non_field_errors': [f'Не более {self.max_items} объектов за запрос']})
+        return items
+
+    def handle_bulk(self, request) -> Response:
+        """
+        Run the bulk operation of the request method and summarize per-item results
+
+        :param request: HTTP request object
+        :return: Response object
+        """
+        handler = self.handlers[request.method]
+        results: list[dict] = handler(request.user, self.get_items(request), self.chunk_size)
+        failed: int = sum(result['status'] == 'error' for result in results)
+
+        return Response({
+            'total': len(results),
+            'succeeded': len(results) - failed,
+            'failed': failed,
+            'results': results,
+        })
+
+    def post(self, request, *args, **kwargs) -> Response:
+        return self.handle_bulk(request)
+
+    def patch(self, request, *args, **kwargs) -> Response:
+        return self.handle_bulk(request)
+
+    def delete(self, request, *args, **kwargs) -> Response:
+        return self.handle_bulk(request)
+
+
+@extend_schema(summary='Экспорт объявлений', tags=['Объявления'], parameters=[AdvertisementExportQuerySerializer])
+class AdvertisementExportView(APIView):
+    """
+    GET a streamed NDJSON or CSV dump of advertisements
+
+    Rows are read through a server-side cursor, so memory does not grow with the table.
+    The X-Export-Watermark header holds the position of the last exported row;
+    pass it back as ?since= to receive advertisements created or changed since, see prepare_export.
+    """
+    permission_classes: list[type] = [IsAdminUser]
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+
+    def get(self, request, *args, **kwargs) -> StreamingHttpResponse:
+        query = AdvertisementExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params: dict = query.validated_data
+
+        queryset, watermark = prepare_export(params.get('created_after'), params.get('created_before'),
+                                             params.get('since'))
+        export_format: str = params['fmt']
+        response = StreamingHttpResponse(export_advertisements(queryset, export_format, self.chunk_size),
+                                         content_type=EXPORT_FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="ads.{export_format}"'
+        if watermark:
+            response['X-Export-Watermark'] = watermark
+        return response
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -106,16 +245,20 @@ class AdvertisementUserListView(ListAPIView):
     partial_update=extend_schema(summary='Отредактировать комментарий'),
     destroy=extend_schema(summary='Удалить комментарий')
 )
-class CommentViewSet(ModelViewSet):
+class CommentViewSet(ReplicaReadsMixin, ConditionalGetMixin, AsyncReadMixin, ValuesSerializerMixin, ScopedUpdateMixin,
+                     ModelViewSet):
     """
     A ViewSet that provides CRUD operations for the Comment model
     """
-    queryset: QuerySet = Comment.objects.all().order_by('-created_at')
+    queryset: QuerySet = Comment.objects.all().order_by('-created_at', '-id')
     default_serializer = CommentSerializer
     default_permission: list[type] = [IsAuthenticated]
     pagination_class = CommentPaginator
     http_method_names: list[str] = ['get', 'post', 'patch', 'delete']
+    etag_dependencies: tuple[str, ...] = ('advertisements.Comment', 'users.User')
+    etag_object_fields: tuple[str, ...] = ('updated_at', 'author_updated_at')
 
+    values_serializers: dict[str, type] = {'list': CommentValuesSerializer}
     serializers: dict[str, type] = {
         'create': CommentCreateSerializer,
         'update': CommentCreateSerializer,
@@ -144,14 +287,9 @@ class CommentViewSet(ModelViewSet):
 
     def get_queryset(self) -> QuerySet:
         """
-        Return queryset for list action.
+        Return comments of the advertisement joined with author data
         """
-        return self.queryset.filter(ad_id=self.kwargs['ad_id'])
+        return self.get_update_queryset().with_author()
 
-    def get_object(self) -> Comment:
-        """
-        Return single object based on primary key.
-        """
-        queryset: QuerySet = self.get_queryset()
-        obj = get_object_or_404(queryset, pk=self.kwargs['pk'])
-        return obj
+    def get_update_queryset(self) -> QuerySet:
+        return self.queryset.filter(ad_id=self.kwargs['ad_id'])
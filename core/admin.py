@@ -0,0 +1,34 @@
+from django.contrib import admin
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from core.models import Job
+from core.pagination import CachedCountPaginator
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Model admins
+class ListPerformanceAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin for large tables: the changelist count is cached, estimated for unfiltered PostgreSQL tables
+    above the threshold, and the unfiltered total is not counted a second time when a filter is applied
+    """
+    paginator = CachedCountPaginator
+    show_full_result_count: bool = False
+    list_per_page: int = 50
+
+
+@admin.register(Job)
+class JobAdmin(ListPerformanceAdmin):
+    """
+    Queued and failed background jobs, failed ones can be queued again
+    """
+    list_display: tuple[str, ...] = ('id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at')
+    list_filter: tuple[str, ...] = ('status',)
+    readonly_fields: tuple[str, ...] = ('locked_at', 'locked_by', 'last_error', 'created_at')
+    actions: list[str] = ['retry']
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry(self, request, queryset: QuerySet) -> None:
+        queryset.filter(status=Job.Statuses.FAILED).update(
+            status=Job.Statuses.QUEUED, attempts=0, run_at=timezone.now(), last_error='')
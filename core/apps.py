@@ -0,0 +1,31 @@
+from django.apps import AppConfig, apps
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils.module_loading import autodiscover_modules
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self) -> None:
+        """
+        Connect model signals bumping response cache versions and processing uploaded images,
+        import the `jobs` modules of the apps so workers know their jobs and validate replica settings
+        """
+        from core.cache import bump_version_receiver
+        from core.db_routers import check_replica_settings
+        from core.images import mark_new_image, process_new_image
+
+        for label in getattr(settings, 'RESPONSE_CACHE_MODELS', ()):
+            model = apps.get_model(label)
+            post_save.connect(bump_version_receiver, sender=model, dispatch_uid=f'response-cache-save-{label}')
+            post_delete.connect(bump_version_receiver, sender=model, dispatch_uid=f'response-cache-delete-{label}')
+
+        for label in getattr(settings, 'IMAGE_PROCESSING_MODELS', ()):
+            model = apps.get_model(label)
+            pre_save.connect(mark_new_image, sender=model, dispatch_uid=f'image-mark-{label}')
+            post_save.connect(process_new_image, sender=model, dispatch_uid=f'image-process-{label}')
+
+        autodiscover_modules('jobs')
+        check_replica_settings()
@@ -0,0 +1,126 @@
+from typing import Callable, Optional
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db.models import Model, QuerySet
+from django.http import Http404, HttpRequest
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.response import Response
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Async read actions
+class AsyncReadMixin:
+    """
+    ViewSet mixin with async variants of list and retrieve served by `as_async_view`
+
+    Rows are fetched with the async ORM, authentication, permissions and throttling still run
+    in `initial` through sync_to_async. Responses are identical to the sync actions.
+    """
+
+    async def aget_object(self) -> Model:
+        """
+        Async variant of `get_object`
+
+        :return: A permission-checked object
+        :raises: Http404 if the object does not exist
+        """
+        queryset: QuerySet = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg: str = self.lookup_url_kwarg or self.lookup_field
+
+        try:
+            obj: Model = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError):
+            raise Http404
+
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def alist(self, request, *args, **kwargs) -> Response:
+        queryset: QuerySet = self.filter_queryset(self.get_queryset())
+
+        page: Optional[list] = await self.paginator.apaginate_queryset(queryset, request, view=self) \
+            if self.paginator is not None else None
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+        return Response(self.get_serializer([row async for row in queryset], many=True).data)
+
+    async def aretrieve(self, request, *args, **kwargs) -> Response:
+        instance: Model = await self.aget_object()
+        return Response(self.get_serializer(instance).data)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Async view
+def as_async_view(viewset: type, actions: dict[str, str]) -> Callable:
+    """
+    Build an async view of a ViewSet, the async counterpart of `viewset.as_view(actions)`
+
+    GET and HEAD go to the `a<action>` method of an `AsyncReadMixin` ViewSet when it exists,
+    any other method is served by the sync view in a thread. The view keeps `cls` and `actions` like a DRF view.
+
+    :param viewset: A ViewSet class
+    :param actions: A mapping of HTTP methods to actions
+    :return: An async view function
+    """
+    if 'get' in actions and 'head' not in actions:
+        actions = {**actions, 'head': actions['get']}
+
+    sync_view: Callable = sync_to_async(viewset.as_view(actions))
+    async_actions: dict[str, str] = {
+        method: action for method, action in actions.items()
+        if method in ('get', 'head') and issubclass(viewset, AsyncReadMixin) and hasattr(viewset, f'a{action}')
+    }
+
+    async def view(request: HttpRequest, *args, **kwargs):
+        action: Optional[str] = async_actions.get(request.method.lower())
+        if action is None:
+            return await sync_view(request, *args, **kwargs)
+        return await dispatch(viewset(), actions, action, request, *args, **kwargs)
+
+    markcoroutinefunction(view)
+    view.cls = viewset
+    view.actions = actions
+    view.initkwargs = {}
+    view.__name__ = viewset.__name__
+    view.__doc__ = viewset.__doc__
+    return csrf_exempt(view)
+
+
+async def dispatch(self, actions: dict[str, str], action: str, request: HttpRequest, *args, **kwargs) -> Response:
+    """
+    Async counterpart of `APIView.dispatch` for a single async action
+
+    :param self: A new ViewSet instance
+    :param actions: A mapping of HTTP methods to actions
+    :param action: The action to run
+    :param request: HTTP request object
+    :return: Response object
+    """
+    self.action_map = actions
+    for method, name in actions.items():
+        setattr(self, method, getattr(self, name))
+    self.args, self.kwargs = args, kwargs
+
+    request = self.initialize_request(request, *args, **kwargs)
+    self.request = request
+    self.headers = self.default_response_headers
+
+    try:
+        await sync_to_async(self.initial)(request, *args, **kwargs)
+        response: Response = await getattr(self, f'a{action}')(request, *args, **kwargs)
+    except Exception as exc:
+        response = self.handle_exception(exc)
+
+    self.response = self.finalize_response(request, response, *args, **kwargs)
+    return self.response
+
+
+def read_view(viewset: type, actions: dict[str, str]) -> Callable:
+    """
+    Returns the async view of a ViewSet when ASYNC_READ_VIEWS is on, the sync view otherwise
+    """
+    if getattr(settings, 'ASYNC_READ_VIEWS', False):
+        return as_async_view(viewset, actions)
+    return viewset.as_view(actions)
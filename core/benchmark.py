@@ -0,0 +1,583 @@
+import asyncio
+import importlib
+import io
+import statistics
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Iterator, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings, setup_databases, setup_test_environment, \
+    teardown_databases, teardown_test_environment
+from django.urls import clear_url_caches
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from advertisements.models import Advertisement
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer, orjson
+from core.seeding import DEFAULT_PASSWORD, get_writer, synthesize
+from users.models import User
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Scenarios
+class Scenario(NamedTuple):
+    """
+    A single benchmarked request, the url and the payload are built from the benchmark context
+    """
+    name: str
+    method: str
+    url: Callable[[dict], str]
+    authenticated: bool = True
+    payload: Optional[Callable[[dict], dict]] = None
+
+
+SCENARIOS: tuple[Scenario, ...] = (
+    Scenario('ad-list', 'get', lambda context: '/api/ads/', authenticated=False),
+    Scenario('ad-list-deep-page', 'get', lambda context: f'/api/ads/?page={context["deep_page"]}', authenticated=False),
+    Scenario('ad-list-cursor', 'get', lambda context: '/api/ads/?cursor=', authenticated=False),
+    Scenario('ad-search', 'get', lambda context: '/api/ads/?search=компьютер', authenticated=False),
+    Scenario('ad-detail', 'get', lambda context: f'/api/ads/{context["ad_id"]}/'),
+    Scenario('comment-list', 'get', lambda context: f'/api/ads/{context["ad_id"]}/comments/'),
+    Scenario('user-ads', 'get', lambda context: '/api/ads/me/'),
+    Scenario('token-obtain', 'post', lambda context: '/api/token/', authenticated=False,
+             payload=lambda context: {'email': context['email'], 'password': DEFAULT_PASSWORD}),
+    Scenario('token-refresh', 'post', lambda context: '/api/refresh/', authenticated=False,
+             payload=lambda context: {'refresh': context['refresh']}),
+    Scenario('users-me', 'get', lambda context: '/api/users/me/'),
+)
+
+
+# Scenarios served by async views with ASYNC_READ_VIEWS
+ASYNC_SCENARIOS: tuple[Scenario, ...] = tuple(
+    scenario for scenario in SCENARIOS if scenario.name in ('ad-list', 'ad-detail', 'comment-list'))
+
+
+@contextmanager
+def benchmark_database(users: int, ads: int, comments: int, seed: int, keepdb: bool = False,
+                       verbosity: int = 0) -> Iterator[None]:
+    """
+    Create a throwaway test database and seed it, the database is destroyed on exit unless kept
+
+    :param users: Number of users to synthesize
+    :param ads: Number of advertisements to synthesize
+    :param comments: Number of comments to synthesize
+    :param seed: Random seed of the dataset
+    :param keepdb: Reuse the test database and its data
+    :param verbosity: Verbosity of database creation
+    """
+    setup_test_environment()
+    old_config = setup_databases(verbosity=verbosity, interactive=False, keepdb=keepdb)
+    try:
+        if not keepdb or not Advertisement.objects.exists():
+            synthesize(get_writer(), users, ads, comments, seed)
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def build_context(client: APIClient) -> dict:
+    """
+    Pick the most active author and the most commented ad and obtain tokens for the author
+
+    :param client: An API client
+    :return: A dict with ids, credentials and tokens used by scenarios
+    :raises: RuntimeError if the database has no advertisements or the login fails
+    """
+    ad: Optional[Advertisement] = Advertisement.objects.annotate(comment_count=Count('comment')) \
+        .order_by('-comment_count', 'pk').first()
+    if ad is None:
+        raise RuntimeError('The database has no advertisements, seed it first')
+
+    author: User = User.objects.annotate(ad_count=Count('advertisement')).order_by('-ad_count', 'pk').first()
+    response = client.post('/api/token/', {'email': author.email, 'password': DEFAULT_PASSWORD}, format='json')
+    if response.status_code != 200:
+        raise RuntimeError(f'Cannot obtain a token for {author.email}: {response.status_code}')
+
+    return {
+        'ad_id': ad.pk,
+        'email': author.email,
+        'access': response.data['access'],
+        'refresh': response.data['refresh'],
+        'deep_page': max(1, Advertisement.objects.count() // 4 // 2),
+    }
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Measurements
+def percentile(values: list[float], percent: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+def perform(client: APIClient, scenario: Scenario, context: dict):
+    headers: dict = {'HTTP_AUTHORIZATION': f'Bearer {context["access"]}'} if scenario.authenticated else {}
+    payload: Optional[dict] = scenario.payload(context) if scenario.payload else None
+    request = getattr(client, scenario.method)
+    if payload is None:
+        return request(scenario.url(context), **headers)
+    return request(scenario.url(context), payload, format='json', **headers)
+
+
+def measure(client: APIClient, scenario: Scenario, context: dict, iterations: int, warmup: int = 3,
+            allocation_samples: int = 5, using: str = DEFAULT_DB_ALIAS) -> dict:
+    """
+    Run a scenario and summarize its latency, queries and allocations
+
+    Latency and queries are measured without tracemalloc, which slows Python code several times;
+    allocations are sampled in a separate pass.
+
+    :param client: An API client
+    :param scenario: A scenario to run
+    :param context: The benchmark context
+    :param iterations: Number of timed requests
+    :param warmup: Number of untimed requests made first
+    :param allocation_samples: Number of requests traced for allocations
+    :param using: A database alias queries are counted on
+    :return: A dict of metrics, times in milliseconds and allocations in KiB
+    :raises: RuntimeError if a request fails
+    """
+    for _ in range(warmup):
+        perform(client, scenario, context)
+
+    timings: list[float] = []
+    queries: list[int] = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connections[using]) as captured:
+            started: float = time.perf_counter()
+            response = perform(client, scenario, context)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{scenario.name}: {response.status_code} {getattr(response, "data", "")}')
+        queries.append(len(captured))
+
+    peaks: list[int] = []
+    for _ in range(allocation_samples):
+        tracemalloc.start()
+        try:
+            perform(client, scenario, context)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': max(queries),
+        'peak_alloc_kib': round(statistics.median(peaks) / 1024, 1) if peaks else None,
+    }
+
+
+def run_benchmark(iterations: int, scenarios: tuple[Scenario, ...] = SCENARIOS, warmup: int = 3,
+                  allocation_samples: int = 5, using: str = DEFAULT_DB_ALIAS) -> dict[str, dict]:
+    """
+    Run every scenario against the current database
+
+    :param iterations: Number of timed requests per scenario
+    :param scenarios: Scenarios to run
+    :param warmup: Number of untimed requests per scenario
+    :param allocation_samples: Number of requests traced for allocations per scenario
+    :param using: A database alias queries are counted on
+    :return: A dict of scenario names and metrics
+    """
+    client = APIClient()
+    context: dict = build_context(client)
+    return {
+        scenario.name: measure(client, scenario, context, iterations, warmup, allocation_samples, using)
+        for scenario in scenarios
+    }
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Concurrency
+def reload_urlconf() -> None:
+    """
+    Re-import the url modules, so ASYNC_READ_VIEWS is applied to them again
+    """
+    importlib.reload(importlib.import_module('advertisements.urls'))
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+@contextmanager
+def read_views(use_async: bool) -> Iterator[None]:
+    """
+    Serve read endpoints with async or sync views inside the block
+
+    :param use_async: True for async views
+    """
+    try:
+        with override_settings(ASYNC_READ_VIEWS=use_async):
+            reload_urlconf()
+            yield
+    finally:
+        reload_urlconf()
+
+
+async def call_asgi(application: Callable, scenario: Scenario, context: dict) -> tuple[int, float]:
+    """
+    Perform a GET scenario against an ASGI application in process
+
+    :param application: An ASGI application
+    :param scenario: A scenario to run
+    :param context: The benchmark context
+    :return: The response status and the latency in milliseconds
+    """
+    url = urlsplit(scenario.url(context))
+    headers: list[tuple[bytes, bytes]] = [(b'host', b'testserver')]
+    if scenario.authenticated:
+        headers.append((b'authorization', f'Bearer {context["access"]}'.encode()))
+
+    scope: dict = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': scenario.method.upper(),
+        'scheme': 'http',
+        'path': url.path,
+        'raw_path': url.path.encode(),
+        'query_string': url.query.encode(),
+        'root_path': '',
+        'headers': headers,
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+    status: int = 0
+
+    async def receive() -> dict:
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message: dict) -> None:
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    started: float = time.perf_counter()
+    await application(scope, receive, send)
+    return status, (time.perf_counter() - started) * 1000
+
+
+async def measure_concurrency(application: Callable, scenario: Scenario, context: dict, requests: int,
+                              concurrency: int) -> dict:
+    """
+    Send requests with at most `concurrency` of them in flight and summarize throughput and latency
+
+    :param application: An ASGI application
+    :param scenario: A scenario to run
+    :param context: The benchmark context
+    :param requests: Number of requests
+    :param concurrency: Number of concurrent requests
+    :return: A dict of metrics, times in milliseconds
+    """
+    started: float = time.perf_counter()
+    responses: list[tuple[int, float]] = await gather_asgi(application, scenario, context, requests, concurrency)
+    return summarize(responses, concurrency, time.perf_counter() - started)
+
+
+async def gather_asgi(application: Callable, scenario: Scenario, context: dict, requests: int,
+                      concurrency: int) -> list[tuple[int, float]]:
+    """
+    Send requests to an ASGI application with at most `concurrency` of them in flight
+
+    :return: Response statuses and latencies in milliseconds
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited() -> tuple[int, float]:
+        async with semaphore:
+            return await call_asgi(application, scenario, context)
+
+    return await asyncio.gather(*(limited() for _ in range(requests)))
+
+
+def summarize(responses: list[tuple[int, float]], concurrency: int, elapsed: float) -> dict:
+    """
+    Summarize throughput and latency of concurrent requests
+
+    :param responses: Response statuses and latencies in milliseconds
+    :param concurrency: Number of concurrent requests
+    :param elapsed: Wall time of all the requests in seconds
+    :return: A dict of metrics, times in milliseconds
+    """
+    timings: list[float] = [timing for _, timing in responses]
+    return {
+        'requests': len(responses),
+        'concurrency': concurrency,
+        'rps': round(len(responses) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'errors': sum(status >= 400 for status, _ in responses),
+    }
+
+
+def run_concurrency_benchmark(requests: int, concurrency_levels: tuple[int, ...],
+                              scenarios: tuple[Scenario, ...] = ASYNC_SCENARIOS) -> list[dict]:
+    """
+    Compare sync and async read views under concurrent load through the ASGI handler
+
+    :param requests: Number of requests per scenario, mode and concurrency level
+    :param concurrency_levels: Numbers of concurrent requests to try
+    :param scenarios: GET scenarios to run
+    :return: A list of metrics with the scenario name and the mode
+    """
+    context: dict = build_context(APIClient())
+    application = ASGIHandler()
+    results: list[dict] = []
+
+    for mode in ('sync', 'async'):
+        with read_views(mode == 'async'):
+            for scenario in scenarios:
+                for concurrency in concurrency_levels:
+                    metrics: dict = asyncio.run(
+                        measure_concurrency(application, scenario, context, requests, concurrency))
+                    results.append({'scenario': scenario.name, 'mode': mode, **metrics})
+    return results
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Connections
+CONNECTION_MODES: dict[str, dict] = {
+    'close': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+    'persistent': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True},
+    'pool': {'ENGINE': 'core.db.backends.pooled_postgresql', 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+}
+
+
+@contextmanager
+def connection_mode(mode: str, using: str = DEFAULT_DB_ALIAS) -> Iterator[None]:
+    """
+    Open new connections of the database with the settings of a CONNECTION_MODES mode inside the block
+
+    Connections that already exist keep their settings, the block is meant for new threads.
+
+    :param mode: A CONNECTION_MODES key
+    :param using: A database alias
+    """
+    settings_dict: dict = connections.settings[using]
+    saved: dict = dict(settings_dict)
+    settings_dict.update(CONNECTION_MODES[mode])
+    try:
+        yield
+    finally:
+        settings_dict.clear()
+        settings_dict.update(saved)
+
+
+def call_wsgi(application: Callable, scenario: Scenario, context: dict) -> tuple[int, float]:
+    """
+    Perform a GET scenario against a WSGI application in process, closing the response like a server does
+
+    :param application: A WSGI application
+    :param scenario: A scenario to run
+    :param context: The benchmark context
+    :return: The response status and the latency in milliseconds
+    """
+    url = urlsplit(scenario.url(context))
+    environ: dict = {
+        'REQUEST_METHOD': scenario.method.upper(),
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.url_scheme': 'http',
+    }
+    if scenario.authenticated:
+        environ['HTTP_AUTHORIZATION'] = f'Bearer {context["access"]}'
+    status: int = 0
+
+    def start_response(status_line: str, headers: list, exc_info=None) -> None:
+        nonlocal status
+        status = int(status_line.split()[0])
+
+    started: float = time.perf_counter()
+    response = application(environ, start_response)
+    try:
+        b''.join(response)
+    finally:
+        response.close()
+    return status, (time.perf_counter() - started) * 1000
+
+
+def measure_wsgi_threads(application: Callable, scenario: Scenario, context: dict, requests: int,
+                         concurrency: int) -> list[tuple[int, float]]:
+    """
+    Send requests from `concurrency` long-lived threads, like a threaded WSGI server
+
+    :return: Response statuses and latencies in milliseconds
+    """
+    responses: list[tuple[int, float]] = []
+    lock = threading.Lock()
+
+    def worker(count: int) -> None:
+        try:
+            for _ in range(count):
+                response: tuple[int, float] = call_wsgi(application, scenario, context)
+                with lock:
+                    responses.append(response)
+        finally:
+            connections.close_all()
+
+    threads: list[threading.Thread] = [
+        threading.Thread(target=worker, args=(requests // concurrency + (index < requests % concurrency),))
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+def measure_connections(server: str, scenario: Scenario, context: dict, requests: int, concurrency: int) -> dict:
+    """
+    Send requests through a WSGI or ASGI handler and summarize throughput, latency and opened connections
+
+    :param server: 'wsgi' or 'asgi'
+    :param scenario: A scenario to run
+    :param context: The benchmark context
+    :param requests: Number of requests
+    :param concurrency: Number of concurrent requests
+    :return: A dict of metrics, times in milliseconds
+    """
+    opened: list[str] = []
+
+    def count_connection(sender, connection, **kwargs) -> None:
+        opened.append(connection.alias)
+
+    connection_created.connect(count_connection, weak=False)
+    try:
+        started: float = time.perf_counter()
+        if server == 'wsgi':
+            responses = measure_wsgi_threads(WSGIHandler(), scenario, context, requests, concurrency)
+        else:
+            responses = asyncio.run(gather_asgi(ASGIHandler(), scenario, context, requests, concurrency))
+        elapsed: float = time.perf_counter() - started
+    finally:
+        connection_created.disconnect(count_connection)
+
+    return {**summarize(responses, concurrency, elapsed), 'connects': len(opened)}
+
+
+def run_connection_benchmark(requests: int, concurrency: int, modes: tuple[str, ...],
+                             servers: tuple[str, ...] = ('wsgi', 'asgi'),
+                             scenario: Scenario = SCENARIOS[0], using: str = DEFAULT_DB_ALIAS) -> list[dict]:
+    """
+    Compare connection handling modes under concurrent load through the WSGI and ASGI handlers
+
+    :param requests: Number of requests per server and mode
+    :param concurrency: Number of concurrent requests
+    :param modes: CONNECTION_MODES keys, 'pool' needs PostgreSQL
+    :param servers: Handlers to run, 'wsgi' and/or 'asgi'
+    :param scenario: A scenario to run
+    :param using: A database alias
+    :return: A list of metrics with the server and the mode
+    :raises: RuntimeError if the pool is requested on another database
+    """
+    if 'pool' in modes and connections[using].vendor != 'postgresql':
+        raise RuntimeError('The pool mode needs PostgreSQL')
+
+    context: dict = build_context(APIClient())
+    results: list[dict] = []
+    for server in servers:
+        for mode in modes:
+            with connection_mode(mode, using):
+                metrics: dict = measure_connections(server, scenario, context, requests, concurrency)
+            results.append({'server': server, 'mode': mode, **metrics})
+    return results
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# JSON encoding
+JSON_PAYLOADS: tuple[Scenario, ...] = tuple(
+    scenario for scenario in SCENARIOS if scenario.name in ('ad-list', 'comment-list'))
+
+
+def time_calls(function: Callable, iterations: int) -> float:
+    """
+    Returns the median duration of a call in milliseconds
+    """
+    timings: list[float] = []
+    for _ in range(iterations):
+        started: float = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def run_json_benchmark(iterations: int, payloads: tuple[Scenario, ...] = JSON_PAYLOADS) -> dict[str, dict]:
+    """
+    Compare DRF's stdlib JSON renderer and parser with the orjson-backed ones on API payloads
+
+    :param iterations: Number of timed encodes and decodes per payload and implementation
+    :param payloads: Scenarios whose response data is encoded
+    :return: A dict of payload names and metrics, times in milliseconds
+    :raises: RuntimeError if a request fails
+    """
+    client = APIClient()
+    context: dict = build_context(client)
+    results: dict[str, dict] = {}
+
+    for scenario in payloads:
+        response = perform(client, scenario, context)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{scenario.name}: {response.status_code}')
+
+        stdlib: bytes = JSONRenderer().render(response.data)
+        fast: bytes = FastJSONRenderer().render(response.data)
+        results[scenario.name] = {
+            'bytes': len(fast),
+            'identical': stdlib == fast,
+            'orjson': orjson is not None,
+            'encode_stdlib_ms': round(time_calls(lambda: JSONRenderer().render(response.data), iterations), 4),
+            'encode_fast_ms': round(time_calls(lambda: FastJSONRenderer().render(response.data), iterations), 4),
+            'decode_stdlib_ms': round(time_calls(lambda: JSONParser().parse(io.BytesIO(stdlib)), iterations), 4),
+            'decode_fast_ms': round(time_calls(lambda: FastJSONParser().parse(io.BytesIO(stdlib)), iterations), 4),
+        }
+    return results
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Baseline comparison
+def compare_results(results: dict[str, dict], baseline: dict[str, dict], threshold: float,
+                    metric: str = 'p95_ms') -> list[str]:
+    """
+    Returns regressions of results against a baseline
+
+    A scenario regresses when the latency metric grows by more than the threshold
+    or when it runs more queries than in the baseline.
+
+    :param results: Current results
+    :param baseline: Stored results
+    :param threshold: Allowed relative latency growth, e.g. 0.2 for 20%
+    :param metric: The latency metric to compare
+    :return: A list of human-readable regressions
+    """
+    regressions: list[str] = []
+    for name, current in results.items():
+        previous: Optional[dict] = baseline.get(name)
+        if previous is None:
+            continue
+        if previous.get(metric) and current[metric] > previous[metric] * (1 + threshold):
+            regressions.append(f'{name}: {metric} {previous[metric]} -> {current[metric]}')
+        if current['queries'] > previous.get('queries', current['queries']):
+            regressions.append(f'{name}: queries {previous["queries"]} -> {current["queries"]}')
+    return regressions
@@ -0,0 +1,230 @@
+import hashlib
+import time
+from typing import Iterable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Model
+from rest_framework.response import Response
+
+from core.metrics import counter
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Metrics
+cache_requests = counter('response_cache_requests_total', 'Response cache lookups by view and result',
+                         labelnames=('view', 'result'))
+cache_invalidations = counter('response_cache_invalidations_total', 'Model version bumps by model',
+                              labelnames=('model',))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Model versions
+def get_cache() -> BaseCache:
+    """
+    Returns the cache backend used for responses and model versions
+    """
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def is_shared_cache() -> bool:
+    """
+    Returns True if the responses cache is seen by every process serving the site
+
+    Locmem and dummy backends live in one process, so versions, pins and cached responses stored there
+    are invisible to other workers. RESPONSE_CACHE_SHARED overrides the detection when it is not None.
+    """
+    shared = getattr(settings, 'RESPONSE_CACHE_SHARED', None)
+    if shared is not None:
+        return shared
+    return not isinstance(get_cache(), (LocMemCache, DummyCache))
+
+
+def get_model_label(model: type[Model] | str) -> str:
+    return (model if isinstance(model, str) else model._meta.label).lower()
+
+
+def get_version_key(label: str) -> str:
+    return f'model-version:{label}'
+
+
+def get_modified_key(label: str) -> str:
+    return f'model-modified:{label}'
+
+
+def get_initial_version() -> int:
+    """
+    Versions start from the current time, so a version evicted from the cache never reuses an old value
+    """
+    return time.time_ns() // 1000
+
+
+def get_versions(models: Iterable[type[Model] | str]) -> dict[str, int]:
+    """
+    Returns current version counters of the models, initializing missing ones
+
+    :param models: Models or model labels like 'advertisements.advertisement'
+    :return: A dict of model labels and versions
+    """
+    cache: BaseCache = get_cache()
+    labels: list[str] = [get_model_label(model) for model in models]
+    keys: dict[str, str] = {get_version_key(label): label for label in labels}
+    versions: dict[str, int] = cache.get_many(keys)
+
+    for key in keys.keys() - versions.keys():
+        cache.add(key, get_initial_version(), timeout=None)
+        versions[key] = cache.get(key)
+
+    return {label: versions[key] for key, label in keys.items()}
+
+
+def bump_version(model: type[Model] | str) -> None:
+    """
+    Increment the version counter of a model, making every cached response depending on it stale
+
+    Called from model signals; bulk operations that bypass signals must call it explicitly.
+
+    :param model: A model or a model label
+    """
+    cache: BaseCache = get_cache()
+    label: str = get_model_label(model)
+    key: str = get_version_key(label)
+
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, get_initial_version(), timeout=None)
+    cache.set(get_modified_key(label), time.time(), timeout=None)
+    cache_invalidations.inc(model=label)
+
+
+def get_last_modified(models: Iterable[type[Model] | str]) -> float:
+    """
+    Returns the time of the latest write to any of the models
+
+    A timestamp lost from the cache is reset to the current time, which is never earlier than the real one.
+
+    :param models: Models or model labels
+    :return: A POSIX timestamp
+    """
+    cache: BaseCache = get_cache()
+    keys: list[str] = [get_modified_key(get_model_label(model)) for model in models]
+    timestamps: dict[str, float] = cache.get_many(keys)
+
+    for key in set(keys) - timestamps.keys():
+        cache.add(key, time.time(), timeout=None)
+        timestamps[key] = cache.get(key)
+
+    return max(timestamps.values(), default=time.time())
+
+
+def bump_version_receiver(sender: type[Model], **kwargs) -> None:
+    """
+    post_save / post_delete receiver bumping the version of the sender
+    """
+    bump_version(sender)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Response cache
+class CachedResponseMixin:
+    """
+    ViewSet mixin caching serialized responses of safe actions
+
+    The cache key contains the action, the host, the path, the sorted query parameters
+    and the versions of `cache_dependencies`, so a write to any dependency makes entries stale at once.
+    Responses must not depend on the requesting user. A response read from a replica shortly after
+    a write is not stored, the replica may not have the write yet.
+    """
+    cache_actions: tuple[str, ...] = ('list', 'retrieve')
+    cache_dependencies: tuple[str, ...] = ()
+
+    def get_cache_key(self, request) -> str:
+        """
+        Returns the cache key of the current request
+
+        :param request: HTTP request object
+        :return: A cache key
+        """
+        versions: dict[str, int] = get_versions(self.cache_dependencies)
+        parts: list[str] = [
+            self.__class__.__name__,
+            self.action,
+            request.get_host(),
+            request.path,
+            '&'.join(f'{key}={value}' for key, value in sorted(request.query_params.lists())),
+            ','.join(f'{label}={version}' for label, version in sorted(versions.items())),
+        ]
+        return 'response:' + hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def is_cacheable(self) -> bool:
+        """
+        False if the response was read from a replica within REPLICA_PIN_SECONDS of a write to a dependency
+        """
+        if not getattr(self, 'reads_from_replica', False):
+            return True
+        return time.time() - get_last_modified(self.cache_dependencies) >= getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+    def cached_response(self, handler, request, *args, **kwargs) -> Response:
+        """
+        Returns a cached response or calls the handler and caches its successful response
+
+        :param handler: A view action method
+        :param request: HTTP request object
+        :return: Response object
+        """
+        if not getattr(settings, 'RESPONSE_CACHE_ENABLED', True) or self.action not in self.cache_actions:
+            return handler(request, *args, **kwargs)
+
+        cache: BaseCache = get_cache()
+        key: str = self.get_cache_key(request)
+        view_name: str = f'{self.__class__.__name__}.{self.action}'
+        data = cache.get(key)
+
+        if data is not None:
+            cache_requests.inc(view=view_name, result='hit')
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        cache_requests.inc(view=view_name, result='miss')
+        response: Response = handler(request, *args, **kwargs)
+        if response.status_code == 200 and self.is_cacheable():
+            cache.set(key, response.data, timeout=getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs) -> Response:
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs) -> Response:
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    async def acached_response(self, handler, request, *args, **kwargs) -> Response:
+        """
+        Async variant of `cached_response` for async actions
+        """
+        if not getattr(settings, 'RESPONSE_CACHE_ENABLED', True) or self.action not in self.cache_actions:
+            return await handler(request, *args, **kwargs)
+
+        cache: BaseCache = get_cache()
+        key: str = await sync_to_async(self.get_cache_key)(request)
+        view_name: str = f'{self.__class__.__name__}.{self.action}'
+        data = await cache.aget(key)
+
+        if data is not None:
+            cache_requests.inc(view=view_name, result='hit')
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        cache_requests.inc(view=view_name, result='miss')
+        response: Response = await handler(request, *args, **kwargs)
+        if response.status_code == 200 and await sync_to_async(self.is_cacheable)():
+            await cache.aset(key, response.data, timeout=getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    async def alist(self, request, *args, **kwargs) -> Response:
+        return await self.acached_response(super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs) -> Response:
+        return await self.acached_response(super().aretrieve, request, *args, **kwargs)
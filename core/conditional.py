@@ -0,0 +1,153 @@
+import hashlib
+import time
+from datetime import datetime
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Model
+from django.http import HttpResponseBase
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from core.cache import get_last_modified, get_versions, is_shared_cache
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Conditional GET
+class ConditionalGetMixin:
+    """
+    ViewSet mixin adding strong ETag and Last-Modified validators to list and retrieve
+
+    Validators are computed without serializing the body: a retrieved object is described by its
+    primary key and `etag_object_fields` timestamps, a list by the version counters of
+    `etag_dependencies` (defaults to `cache_dependencies`). A matching If-None-Match or
+    If-Modified-Since is answered with 304 before the serializer runs. A list read from a replica
+    shortly after a write gets no validators, its body may predate the versions they describe.
+    Lists get no validators either unless the responses cache is shared by all processes: with a
+    per-process cache another worker keeps old versions and would answer 304 after a write.
+    """
+    etag_object_fields: tuple[str, ...] = ('updated_at',)
+    etag_dependencies: tuple[str, ...] = ()
+
+    def get_etag_dependencies(self) -> tuple[str, ...]:
+        return self.etag_dependencies or getattr(self, 'cache_dependencies', ())
+
+    def make_etag(self, request, *parts) -> str:
+        """
+        Build a strong ETag for the representation of the given parts
+
+        The host, the renderer format and the user are included because they change the body.
+
+        :param request: HTTP request object
+        :param parts: Values identifying the content
+        :return: A quoted ETag
+        """
+        values: list[str] = [
+            self.__class__.__name__,
+            request.get_host(),
+            request.get_full_path(),
+            getattr(request.accepted_renderer, 'format', ''),
+            str(request.user.pk),
+            *map(str, parts),
+        ]
+        return quote_etag(hashlib.sha256('|'.join(values).encode('utf-8')).hexdigest()[:40])
+
+    def get_list_validators(self, request) -> tuple[str, Optional[float]]:
+        """
+        Returns the ETag and the Last-Modified timestamp of the list
+
+        :param request: HTTP request object
+        :return: An ETag and a POSIX timestamp
+        """
+        dependencies: tuple[str, ...] = self.get_etag_dependencies()
+        versions: dict[str, int] = get_versions(dependencies)
+        etag: str = self.make_etag(request, 'list', *sorted(versions.items()))
+        return etag, get_last_modified(dependencies)
+
+    def get_object_validators(self, request, instance: Model) -> tuple[str, Optional[float]]:
+        """
+        Returns the ETag and the Last-Modified timestamp of a single object
+
+        :param request: HTTP request object
+        :param instance: A retrieved object
+        :return: An ETag and a POSIX timestamp
+        """
+        timestamps: list[datetime] = [
+            getattr(instance, field) for field in self.etag_object_fields if getattr(instance, field, None)
+        ]
+        etag: str = self.make_etag(request, 'retrieve', instance._meta.label, instance.pk,
+                                   *(timestamp.isoformat() for timestamp in timestamps))
+        return etag, max(timestamps).timestamp() if timestamps else None
+
+    @staticmethod
+    def get_not_modified_response(request, etag: str, last_modified: Optional[float]) -> Optional[HttpResponseBase]:
+        """
+        Returns 304 (or 412) if the request preconditions match the validators, None otherwise
+        """
+        return get_conditional_response(request, etag=etag,
+                                        last_modified=int(last_modified) if last_modified else None)
+
+    def may_lag(self, last_modified: Optional[float]) -> bool:
+        """
+        True if the response was read from a replica within REPLICA_PIN_SECONDS of the last write
+        """
+        return getattr(self, 'reads_from_replica', False) and (
+            last_modified is None or time.time() - last_modified < getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+
+    @staticmethod
+    def set_validators(response: Response, etag: str, last_modified: Optional[float]) -> Response:
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs) -> Response:
+        if not is_shared_cache():
+            return super().list(request, *args, **kwargs)
+        etag, last_modified = self.get_list_validators(request)
+        not_modified: Optional[HttpResponseBase] = self.get_not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        response: Response = super().list(request, *args, **kwargs)
+        if self.may_lag(last_modified):
+            return response
+        return self.set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs) -> Response:
+        instance: Model = self.get_object()
+        etag, last_modified = self.get_object_validators(request, instance)
+        not_modified: Optional[HttpResponseBase] = self.get_not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        # The object is already loaded and permission-checked, reuse it for the body
+        self.get_object = lambda: instance
+        return self.set_validators(super().retrieve(request, *args, **kwargs), etag, last_modified)
+
+    async def alist(self, request, *args, **kwargs) -> Response:
+        if not is_shared_cache():
+            return await super().alist(request, *args, **kwargs)
+        etag, last_modified = await sync_to_async(self.get_list_validators)(request)
+        not_modified: Optional[HttpResponseBase] = self.get_not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        response: Response = await super().alist(request, *args, **kwargs)
+        if self.may_lag(last_modified):
+            return response
+        return self.set_validators(response, etag, last_modified)
+
+    async def aretrieve(self, request, *args, **kwargs) -> Response:
+        instance: Model = await self.aget_object()
+        etag, last_modified = self.get_object_validators(request, instance)
+        not_modified: Optional[HttpResponseBase] = self.get_not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        async def get_instance() -> Model:
+            return instance
+
+        self.aget_object = get_instance
+        return self.set_validators(await super().aretrieve(request, *args, **kwargs), etag, last_modified)
@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError
+from django.db.backends.postgresql import base
+
+from core.metrics import counter, gauge, histogram
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+    import psycopg2.extras
+    from psycopg2.pool import ThreadedConnectionPool
+except ImportError as exc:
+    raise ImproperlyConfigured(f'Error loading psycopg2 module: {exc}')
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Metrics
+WAIT_BUCKETS: tuple[float, ...] = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+pool_connections = gauge('db_pool_connections', 'Connections held by the pool by database and state',
+                         labelnames=('database', 'state'))
+pool_wait = histogram('db_pool_wait_seconds', 'Time spent waiting for a free pool slot by database',
+                      labelnames=('database',), buckets=WAIT_BUCKETS)
+pool_checkouts = counter('db_pool_checkouts_total', 'Connections handed out by the pool by database',
+                         labelnames=('database',))
+pool_timeouts = counter('db_pool_timeouts_total', 'Checkouts that gave up waiting for a free slot by database',
+                        labelnames=('database',))
+pool_discarded = counter('db_pool_discarded_total', 'Pooled connections closed after a failed health check',
+                         labelnames=('database',))
+
+DEFAULT_POOL: dict = {
+    'MIN_SIZE': 1,
+    'MAX_SIZE': 10,
+    'TIMEOUT': 5,
+    'CHECK_INTERVAL': 30,
+}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Pool
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 pool that waits up to TIMEOUT seconds for a free slot
+
+    psycopg2's ThreadedConnectionPool fails at once when exhausted, so checkouts are bounded by a semaphore.
+    A connection idle for CHECK_INTERVAL seconds is pinged before it is handed out, dead ones are closed
+    until a healthy or newly opened connection comes up.
+    """
+
+    def __init__(self, alias: str, conn_params: dict, options: dict):
+        self.alias: str = alias
+        self.pid: int = os.getpid()
+        self.timeout: float = options['TIMEOUT']
+        self.max_size: int = options['MAX_SIZE']
+        self.check_interval: float = options['CHECK_INTERVAL']
+        self.pool = ThreadedConnectionPool(options['MIN_SIZE'], options['MAX_SIZE'], **conn_params)
+        self.slots = threading.BoundedSemaphore(options['MAX_SIZE'])
+        self.returned_at: dict[int, float] = {}
+
+    def getconn(self):
+        """
+        Check out a healthy connection
+
+        :return: A psycopg2 connection
+        :raises: OperationalError if no slot frees up within the timeout
+        """
+        started: float = time.perf_counter()
+        if not self.slots.acquire(timeout=self.timeout):
+            pool_timeouts.inc(database=self.alias)
+            raise OperationalError(f'Connection pool of "{self.alias}" exhausted after {self.timeout}s')
+        pool_wait.observe(time.perf_counter() - started, database=self.alias)
+
+        try:
+            connection = self.checkout_healthy()
+        except Exception:
+            self.slots.release()
+            raise
+
+        pool_checkouts.inc(database=self.alias)
+        self.observe()
+        return connection
+
+    def checkout_healthy(self):
+        """
+        Take idle connections until a healthy one comes up, closing dead ones, or open a new connection
+
+        Every idle connection may have died at once, e.g. after a database restart. A connection opened
+        by this checkout is not checked, so the loop is bounded by the number of idle connections plus one.
+
+        :return: A psycopg2 connection
+        :raises: OperationalError if no healthy connection was obtained
+        """
+        for _ in range(self.max_size + 1):
+            fresh: bool = not self.pool._pool
+            connection = self.pool.getconn()
+            if fresh or self.is_healthy(connection):
+                return connection
+            pool_discarded.inc(database=self.alias)
+            self.returned_at.pop(id(connection), None)
+            self.pool.putconn(connection, close=True)
+        raise OperationalError(f'No healthy connection in the pool of "{self.alias}"')
+
+    def putconn(self, connection, discard: bool = False) -> None:
+        """
+        Return a connection, a broken one or one left in a transaction is closed instead of reused
+
+        :param connection: A connection checked out from this pool
+        :param discard: True to close the connection, e.g. after a database error
+        """
+        try:
+            discard = discard or bool(connection.closed) \
+                or connection.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+            self.returned_at[id(connection)] = time.monotonic()
+            self.pool.putconn(connection, close=discard)
+        finally:
+            self.slots.release()
+            self.observe()
+
+    def is_healthy(self, connection) -> bool:
+        if connection.closed:
+            return False
+        if time.monotonic() - self.returned_at.get(id(connection), 0.0) < self.check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except psycopg2.Error:
+            return False
+
+    def observe(self) -> None:
+        pool_connections.set(len(self.pool._used), database=self.alias, state='in_use')
+        pool_connections.set(len(self.pool._pool), database=self.alias, state='idle')
+
+    def close(self) -> None:
+        self.pool.closeall()
+
+
+pools: dict[tuple, ConnectionPool] = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(alias: str, conn_params: dict, options: dict) -> ConnectionPool:
+    """
+    Returns the process-wide pool of the connection parameters, created on first use and after a fork
+
+    :param alias: A database alias, used in metrics
+    :param conn_params: psycopg2 connection parameters
+    :param options: Pool options
+    :return: A ConnectionPool instance
+    """
+    key: tuple = (alias, *sorted((name, str(value)) for name, value in conn_params.items()))
+    pool: Optional[ConnectionPool] = pools.get(key)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with pools_lock:
+        pool = pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            pool = pools[key] = ConnectionPool(alias, conn_params, options)
+    return pool
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Backend
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend taking connections from an in-process pool instead of opening them
+
+    Configured with a POOL dict in the database settings (MIN_SIZE, MAX_SIZE, TIMEOUT, CHECK_INTERVAL).
+    Use it with CONN_MAX_AGE = 0: closing a connection at the end of a request returns it to the pool.
+    A connection that saw a database error is closed instead of returned.
+    """
+    pool: Optional[ConnectionPool] = None
+
+    def get_pool_options(self) -> dict:
+        return {**DEFAULT_POOL, **self.settings_dict.get('POOL', {})}
+
+    def get_new_connection(self, conn_params: dict):
+        self.pool = get_pool(self.alias, conn_params, self.get_pool_options())
+        connection = self.pool.getconn()
+
+        options: dict = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self) -> None:
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection, discard=self.errors_occurred)
@@ -0,0 +1,116 @@
+import random
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Model
+from rest_framework.permissions import SAFE_METHODS
+
+from core.cache import get_cache, is_shared_cache
+from core.metrics import counter
+
+# ----------------------------------------------------------------------------------------------------------------------
+# State
+# Set for the current request by ReplicaReadsMixin, reset by ReplicaPinningMiddleware
+replica_reads: ContextVar[bool] = ContextVar('replica_reads', default=False)
+
+routed_reads = counter('db_replica_reads_total', 'Read queries routed to a replica by database',
+                       labelnames=('database',))
+
+
+def get_replicas() -> list[str]:
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def get_pin_timeout() -> int:
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+def get_pin_key(user_id: int) -> str:
+    return f'replica-pin:{user_id}'
+
+
+def pin_to_primary(user_id: int) -> None:
+    """
+    Send reads of the user to the primary for REPLICA_PIN_SECONDS, so the user sees their own writes
+
+    :param user_id: A user id
+    """
+    get_cache().set(get_pin_key(user_id), True, timeout=get_pin_timeout())
+
+
+def is_pinned(user_id: int) -> bool:
+    return get_cache().get(get_pin_key(user_id)) is not None
+
+
+def check_replica_settings() -> None:
+    """
+    Refuse replicas without a shared responses cache
+
+    Pins and the model timestamps deciding whether a response may lag are kept in that cache. With a
+    per-process one a user writing through one worker would read stale rows from a replica through another.
+
+    :raises: ImproperlyConfigured if DATABASE_REPLICAS is set and the cache is local to the process
+    """
+    if get_replicas() and not is_shared_cache():
+        raise ImproperlyConfigured('DATABASE_REPLICAS requires a shared RESPONSE_CACHE_BACKEND, such as Redis')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Router
+class ReplicaRouter:
+    """
+    Database router sending reads of opted-in requests to a random replica from DATABASE_REPLICAS
+
+    Everything else goes to the primary: writes, reads of other requests and reads inside
+    a transaction on the primary. Replicas mirror the primary and are never migrated.
+    """
+
+    def db_for_read(self, model: type[Model], **hints) -> Optional[str]:
+        replicas: list[str] = get_replicas()
+        if not replicas or not replica_reads.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+
+        alias: str = random.choice(replicas)
+        routed_reads.inc(database=alias)
+        return alias
+
+    def db_for_write(self, model: type[Model], **hints) -> Optional[str]:
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1: Model, obj2: Model, **hints) -> Optional[bool]:
+        databases: set[str] = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db: str, app_label: str, model_name: str = None, **hints) -> Optional[bool]:
+        if db in get_replicas():
+            return False
+        return None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# View mixin
+class ReplicaReadsMixin:
+    """
+    APIView mixin letting safe-method requests read from replicas
+
+    The decision is made after authentication: a user who wrote within REPLICA_PIN_SECONDS keeps
+    reading from the primary. `reads_from_replica` tells response caches that the data may lag.
+    """
+    replica_reads: bool = True
+    reads_from_replica: bool = False
+
+    def initial(self, request, *args, **kwargs) -> None:
+        super().initial(request, *args, **kwargs)
+
+        if not self.replica_reads or request.method not in SAFE_METHODS or not get_replicas():
+            return
+        if request.user.is_authenticated and is_pinned(request.user.pk):
+            return
+
+        replica_reads.set(True)
+        self.reads_from_replica = True
@@ -0,0 +1,211 @@
+import hashlib
+from io import BytesIO
+from typing import Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Model
+from PIL import Image, ImageOps
+
+from core.cache import bump_version
+from core.jobs import enqueue, job
+from core.metrics import counter
+
+images_processed = counter('images_processed_total', 'Processed image uploads by model', labelnames=('model',))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Image urls
+def build_image_url(name: Optional[str], request=None, storage=default_storage) -> Optional[str]:
+    """
+    Build an image url from a stored file name exactly like DRF ImageField represents it
+
+    :param name: A file name as stored in the database
+    :param request: HTTP request object used to make the url absolute
+    :param storage: A storage the file belongs to
+    :return: An absolute url if the request is given, a relative url otherwise, or None without a file
+    """
+    if not name:
+        return None
+
+    url: str = storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Thumbnails
+THUMBNAIL_FORMATS: dict[str, tuple[str, str]] = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+
+def get_thumbnail_sizes() -> tuple[int, ...]:
+    return tuple(getattr(settings, 'IMAGE_THUMBNAIL_SIZES', (160, 480, 960)))
+
+
+def get_thumbnail_name(content_hash: str, size: int, image_format: str) -> str:
+    """
+    Returns the storage name of a thumbnail, shared by every upload with the same content
+
+    :param content_hash: SHA-256 of the original file
+    :param size: The longest side of the thumbnail in pixels
+    :param image_format: A key of THUMBNAIL_FORMATS
+    :return: A file name relative to the storage root
+    """
+    return f'thumbnails/{content_hash[:2]}/{content_hash}/{size}.{THUMBNAIL_FORMATS[image_format][1]}'
+
+
+def get_requested_format(request) -> str:
+    """
+    Returns the thumbnail format requested by ?thumbnail_format=, WebP by default
+    """
+    requested: str = getattr(request, 'query_params', request.GET).get('thumbnail_format', '')
+    return requested if requested in THUMBNAIL_FORMATS else getattr(settings, 'IMAGE_THUMBNAIL_FORMAT', 'webp')
+
+
+def build_thumbnail_url(name: Optional[str], content_hash: Optional[str], size: int, request=None,
+                        storage=default_storage) -> Optional[str]:
+    """
+    Build the url of the smallest thumbnail not narrower than `size`, or of the original until it is processed
+
+    :param name: A file name of the original image
+    :param content_hash: SHA-256 of the original image, empty until it is processed
+    :param size: The wanted longest side in pixels
+    :param request: HTTP request object used to make the url absolute and pick the format
+    :param storage: A storage the files belong to
+    :return: An url or None without an image
+    """
+    if not name or not content_hash:
+        return build_image_url(name, request, storage)
+
+    sizes: tuple[int, ...] = get_thumbnail_sizes()
+    size = min((candidate for candidate in sizes if candidate >= size), default=max(sizes))
+    image_format: str = get_requested_format(request) if request is not None else 'webp'
+    return build_image_url(get_thumbnail_name(content_hash, size, image_format), request, storage)
+
+
+def render_thumbnail(image: Image.Image, size: int, image_format: str) -> bytes:
+    """
+    Resize an image to fit a size x size box and encode it without metadata
+
+    :param image: An opened, orientation-corrected image
+    :param size: The longest side in pixels
+    :param image_format: A key of THUMBNAIL_FORMATS
+    :return: Encoded image bytes
+    """
+    thumbnail: Image.Image = image.copy()
+    thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+    pil_format: str = THUMBNAIL_FORMATS[image_format][0]
+
+    if pil_format == 'JPEG' and thumbnail.mode not in ('RGB', 'L'):
+        thumbnail = thumbnail.convert('RGB')
+
+    buffer = BytesIO()
+    thumbnail.save(buffer, format=pil_format, quality=82, optimize=pil_format == 'JPEG')
+    return buffer.getvalue()
+
+
+def strip_metadata(image: Image.Image, source_format: str) -> bytes:
+    """
+    Re-encode an original image without EXIF (GPS position, camera serials) keeping its format
+
+    :param image: An opened, orientation-corrected image
+    :param source_format: The format of the original file
+    :return: Encoded image bytes
+    """
+    if source_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    buffer = BytesIO()
+    image.save(buffer, format=source_format, quality=95)
+    return buffer.getvalue()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Processing
+@job
+def process_image(model_label: str, pk: int, field_name: str = 'image', hash_field: str = 'image_hash') -> None:
+    """
+    Generate thumbnails for the image of a row, strip its EXIF and store its content hash
+
+    Thumbnails are named by the content hash, so duplicate uploads reuse existing files. A stripped copy
+    is saved under a new name and swapped in with the hash by one conditional UPDATE, so the row never
+    points to a missing file. The row is updated only if it still references the processed file,
+    rows that already have a hash are skipped, so a retried job does nothing.
+
+    :param model_label: A model label like 'advertisements.Advertisement'
+    :param pk: A primary key of the row
+    :param field_name: An image field name
+    :param hash_field: A field storing the content hash
+    """
+    model: type[Model] = apps.get_model(model_label)
+    row: Optional[tuple] = model.objects.filter(pk=pk).values_list(field_name, hash_field).first()
+    if row is None or not row[0] or row[1]:
+        return
+    name: str = row[0]
+
+    storage = model._meta.get_field(field_name).storage
+    with storage.open(name, 'rb') as file:
+        content: bytes = file.read()
+    content_hash: str = hashlib.sha256(content).hexdigest()
+
+    with Image.open(BytesIO(content)) as original:
+        source_format: str = original.format
+        has_metadata: bool = bool(original.getexif()) or 'exif' in original.info
+        image: Image.Image = ImageOps.exif_transpose(original)
+        image.load()
+
+    for size in get_thumbnail_sizes():
+        for image_format in THUMBNAIL_FORMATS:
+            thumbnail_name: str = get_thumbnail_name(content_hash, size, image_format)
+            if not storage.exists(thumbnail_name):
+                storage.save(thumbnail_name, ContentFile(render_thumbnail(image, size, image_format)))
+
+    stored_name: str = name
+    if has_metadata and source_format in ('JPEG', 'PNG', 'WEBP'):
+        # The storage picks a free name, the original stays in place until the row points to the copy
+        stored_name = storage.save(name, ContentFile(strip_metadata(image, source_format)))
+
+    updated: bool = bool(model.objects.filter(pk=pk, **{field_name: name})
+                         .update(**{field_name: stored_name, hash_field: content_hash}))
+    if updated:
+        bump_version(model)
+    if stored_name != name:
+        # Remove the file the row does not reference: the original or the copy of a replaced image
+        storage.delete(name if updated else stored_name)
+    images_processed.inc(model=model._meta.label_lower)
+
+
+def schedule_image_processing(instance: Model, field_name: str = 'image') -> None:
+    """
+    Queue processing of the image of a saved instance, a worker picks it up once the transaction commits
+
+    :param instance: A saved model instance
+    :param field_name: An image field name
+    """
+    enqueue(process_image, instance._meta.label, instance.pk, field_name)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Signal receivers
+def mark_new_image(sender: type[Model], instance: Model, raw: bool = False, **kwargs) -> None:
+    """
+    pre_save receiver: a newly assigned file is not committed to the storage yet
+    """
+    image = getattr(instance, 'image', None)
+    instance._image_uploaded = bool(not raw and image and not image._committed)
+    if instance._image_uploaded:
+        instance.image_hash = ''
+
+
+def process_new_image(sender: type[Model], instance: Model, raw: bool = False, **kwargs) -> None:
+    """
+    post_save receiver scheduling processing of a newly uploaded image
+    """
+    if getattr(instance, '_image_uploaded', False):
+        schedule_image_processing(instance)
@@ -0,0 +1,261 @@
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+from typing import Callable, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.metrics import counter, histogram
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Metrics
+jobs_enqueued = counter('jobs_enqueued_total', 'Enqueued jobs by name', labelnames=('name',))
+jobs_finished = counter('jobs_finished_total', 'Job attempts by name and result: done, retry or failed',
+                        labelnames=('name', 'result'))
+job_duration = histogram('job_duration_seconds', 'Run time of job attempts by name', labelnames=('name',))
+job_wait = histogram('job_wait_seconds', 'Time jobs were due before a worker took them, by name',
+                     labelnames=('name',), buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Registry
+class JobSpec(NamedTuple):
+    """
+    A registered job function with its retry policy
+    """
+    func: Callable
+    max_attempts: Optional[int]
+    retry_delay: Optional[float]
+
+
+JOBS: dict[str, JobSpec] = {}
+
+
+def get_job_name(func: Callable) -> str:
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def job(func: Optional[Callable] = None, *, max_attempts: Optional[int] = None,
+        retry_delay: Optional[float] = None) -> Callable:
+    """
+    Register a function as a job, usable as @job or @job(max_attempts=5)
+
+    Jobs may run more than once, so they must be idempotent. Arguments must be JSON-serializable.
+    Modules named `jobs` of installed apps are imported at startup, so their jobs are known to workers.
+
+    :param func: The job function
+    :param max_attempts: Attempts before the job fails, JOBS_MAX_ATTEMPTS by default
+    :param retry_delay: Seconds before the first retry, doubled on every next one, JOBS_RETRY_DELAY by default
+    :return: The function unchanged
+    """
+    def register(func: Callable) -> Callable:
+        JOBS[get_job_name(func)] = JobSpec(func, max_attempts, retry_delay)
+        return func
+
+    return register(func) if func is not None else register
+
+
+def get_spec(name: str) -> JobSpec:
+    """
+    Returns a registered job, importing the module of its function if it was not imported yet
+
+    Only functions registered with @job are returned, a name of any other callable is refused.
+
+    :param name: A job name, the dotted path of its function
+    :return: A JobSpec
+    :raises: LookupError for an unknown name
+    """
+    if name not in JOBS:
+        try:
+            import_string(name)
+        except ImportError:
+            pass
+    try:
+        return JOBS[name]
+    except KeyError:
+        raise LookupError(f'Unknown job {name}')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Enqueueing
+def enqueue(func: Callable | str, *args, delay: float = 0, **kwargs) -> Optional[Job]:
+    """
+    Queue a call of a registered job
+
+    The row is inserted in the current transaction, workers see it once it commits.
+    With JOBS_EAGER the job runs in the calling thread right after the commit instead, errors propagate.
+
+    :param func: A job function or its name
+    :param args: Positional arguments of the call
+    :param delay: Seconds to wait before the job is due
+    :param kwargs: Keyword arguments of the call
+    :return: The queued Job, None in eager mode
+    """
+    name: str = func if isinstance(func, str) else get_job_name(func)
+    spec: JobSpec = get_spec(name)
+    jobs_enqueued.inc(name=name)
+
+    if getattr(settings, 'JOBS_EAGER', False):
+        transaction.on_commit(lambda: spec.func(*args, **kwargs))
+        return None
+
+    return Job.objects.create(
+        name=name, payload={'args': list(args), 'kwargs': kwargs},
+        max_attempts=spec.max_attempts or getattr(settings, 'JOBS_MAX_ATTEMPTS', 3),
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Running
+def claim_job(worker_id: str) -> Optional[Job]:
+    """
+    Lock the next due job for a worker
+
+    A candidate is taken with a conditional UPDATE of its status, so concurrent workers never run the same
+    attempt, on SQLite too. Running jobs locked longer than JOBS_LOCK_TIMEOUT are taken over, their worker
+    is presumed dead.
+
+    :param worker_id: A name of the worker for the locked_by column
+    :return: The claimed Job or None if no job is due
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'JOBS_LOCK_TIMEOUT', 600))
+    candidates: list[tuple] = list(
+        Job.objects.filter(Q(status=Job.Statuses.QUEUED, run_at__lte=now)
+                           | Q(status=Job.Statuses.RUNNING, locked_at__lt=stale))
+        .order_by('run_at', 'id').values_list('pk', 'status', 'locked_at')[:10]
+    )
+
+    for pk, status, locked_at in candidates:
+        if Job.objects.filter(pk=pk, status=status, locked_at=locked_at).update(
+                status=Job.Statuses.RUNNING, locked_at=now, locked_by=worker_id, attempts=F('attempts') + 1):
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def release_connections() -> None:
+    """
+    Close database connections of the thread that are broken or past CONN_MAX_AGE between jobs
+
+    Skipped inside a transaction, such as a test case running jobs in its own thread.
+    """
+    if not any(connection.in_atomic_block for connection in connections.all(initialized_only=True)):
+        close_old_connections()
+
+
+def run_job(job: Job) -> bool:
+    """
+    Run a claimed job: delete it on success, queue a retry with exponential backoff on failure
+    or mark it failed after its last attempt
+
+    :param job: A Job locked by `claim_job`
+    :return: True if the job succeeded
+    """
+    job_wait.observe(max((job.locked_at - job.run_at).total_seconds(), 0), name=job.name)
+    spec: Optional[JobSpec] = None
+    started: float = time.perf_counter()
+    try:
+        spec = get_spec(job.name)
+        if job.attempts > job.max_attempts:
+            raise RuntimeError('The worker running the last attempt did not finish it')
+        spec.func(*job.payload.get('args', ()), **job.payload.get('kwargs', {}))
+    except Exception:
+        logger.exception('Job %s #%s failed, attempt %s of %s', job.name, job.pk, job.attempts, job.max_attempts)
+        retry: bool = job.attempts < job.max_attempts
+        retry_delay: float = spec.retry_delay if spec is not None and spec.retry_delay is not None \
+            else getattr(settings, 'JOBS_RETRY_DELAY', 10)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.Statuses.QUEUED if retry else Job.Statuses.FAILED,
+            run_at=timezone.now() + timedelta(seconds=retry_delay * 2 ** (job.attempts - 1)) if retry else job.run_at,
+            locked_at=None, locked_by='', last_error=traceback.format_exc()[-10000:],
+        )
+        jobs_finished.inc(name=job.name, result='retry' if retry else 'failed')
+        return False
+    else:
+        Job.objects.filter(pk=job.pk).delete()
+        jobs_finished.inc(name=job.name, result='done')
+        return True
+    finally:
+        job_duration.observe(time.perf_counter() - started, name=job.name)
+        release_connections()
+
+
+class Worker:
+    """
+    Runs queued jobs in `concurrency` threads, each polling the queue every `poll_interval` seconds when idle
+    """
+
+    def __init__(self, concurrency: int = 1, poll_interval: float = 1.0):
+        self.concurrency: int = max(concurrency, 1)
+        self.poll_interval: float = poll_interval
+        self.stopping = threading.Event()
+        self.processed: int = 0
+        self._lock = threading.Lock()
+        self.worker_id: str = f'{socket.gethostname()}:{os.getpid()}'
+
+    def stop(self) -> None:
+        """
+        Let running jobs finish and stop taking new ones
+        """
+        self.stopping.set()
+
+    def run_thread(self, index: int, once: bool) -> None:
+        worker_id: str = f'{self.worker_id}:{index}'
+        while not self.stopping.is_set():
+            try:
+                job: Optional[Job] = claim_job(worker_id)
+            finally:
+                release_connections()
+
+            if job is None:
+                if once:
+                    return
+                self.stopping.wait(self.poll_interval)
+                continue
+
+            try:
+                run_job(job)
+            except Exception:
+                logger.exception('Job %s #%s could not be finished', job.name, job.pk)
+            with self._lock:
+                self.processed += 1
+
+    def run(self, once: bool = False) -> int:
+        """
+        Process jobs until stopped
+
+        :param once: Return once no job is due instead of polling
+        :return: Number of processed jobs
+        """
+        threads: list[threading.Thread] = [
+            threading.Thread(target=self.run_thread, args=(index, once), name=f'job-worker-{index}', daemon=True)
+            for index in range(1, self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        self.run_thread(0, once)
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+        return self.processed
+
+
+def run_pending_jobs() -> int:
+    """
+    Run every due job in the calling thread
+
+    :return: Number of processed jobs
+    """
+    return Worker(concurrency=1).run(once=True)
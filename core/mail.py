@@ -0,0 +1,81 @@
+import base64
+
+from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from core.jobs import enqueue, job
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Serialization
+def dump_message(message: EmailMessage) -> dict:
+    """
+    Convert an email message into JSON-serializable data
+
+    :param message: An EmailMessage or EmailMultiAlternatives
+    :return: A dict accepted by `load_message`
+    :raises: ValueError for attachments given as MIME objects
+    """
+    attachments: list = []
+    for attachment in message.attachments:
+        if not isinstance(attachment, tuple):
+            raise ValueError('MIME attachments cannot be queued')
+        filename, content, mimetype = attachment
+        if isinstance(content, bytes):
+            content = {'base64': base64.b64encode(content).decode('ascii')}
+        attachments.append([filename, content, mimetype])
+
+    return {
+        'subject': message.subject, 'body': message.body, 'from_email': message.from_email,
+        'to': message.to, 'cc': message.cc, 'bcc': message.bcc, 'reply_to': message.reply_to,
+        'headers': message.extra_headers, 'alternatives': getattr(message, 'alternatives', []),
+        'attachments': attachments, 'content_subtype': message.content_subtype,
+    }
+
+
+def load_message(data: dict) -> EmailMultiAlternatives:
+    """
+    Rebuild an email message dumped by `dump_message`
+    """
+    message = EmailMultiAlternatives(
+        subject=data['subject'], body=data['body'], from_email=data['from_email'], to=data['to'], cc=data['cc'],
+        bcc=data['bcc'], reply_to=data['reply_to'], headers=data['headers'],
+        alternatives=[tuple(alternative) for alternative in data['alternatives']],
+    )
+    message.content_subtype = data['content_subtype']
+    for filename, content, mimetype in data['attachments']:
+        if isinstance(content, dict):
+            content = base64.b64decode(content['base64'])
+        message.attach(filename, content, mimetype)
+    return message
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Backend
+@job
+def send_queued_email(data: dict) -> None:
+    """
+    Send a queued message through JOBS_EMAIL_BACKEND
+    """
+    backend: str = getattr(settings, 'JOBS_EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+    get_connection(backend).send_messages([load_message(data)])
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    Email backend queueing every message as a job instead of talking to the mail server in the request,
+    djoser emails included
+    """
+
+    def send_messages(self, email_messages) -> int:
+        """
+        Queue the messages, one job each, so a retry never sends the others again
+
+        :param email_messages: A list of EmailMessage objects
+        :return: Number of queued messages
+        """
+        messages: list[EmailMessage] = [message for message in email_messages if message.recipients()]
+        for message in messages:
+            enqueue(send_queued_email, dump_message(message))
+        return len(messages)
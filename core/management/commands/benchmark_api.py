@@ -0,0 +1,77 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connection
+from django.test.utils import override_settings
+
+from core.benchmark import SCENARIOS, benchmark_database, compare_results, run_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway test database and benchmark every API endpoint'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--users', type=int, default=200, help='Number of users to synthesize')
+        parser.add_argument('--ads', type=int, default=5000, help='Number of advertisements to synthesize')
+        parser.add_argument('--comments', type=int, default=20000, help='Number of comments to synthesize')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the dataset')
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per scenario')
+        parser.add_argument('--scenario', action='append', choices=[scenario.name for scenario in SCENARIOS],
+                            help='Run only the given scenario, may be repeated')
+        parser.add_argument('--response-cache', action='store_true',
+                            help='Keep the response cache enabled, by default the uncached path is measured')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test database and its data')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare results with a JSON file written by --output')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative p95 growth against the baseline')
+
+    def handle(self, *args, **options) -> None:
+        verbosity: int = options['verbosity']
+        scenarios: tuple = tuple(scenario for scenario in SCENARIOS
+                                 if not options['scenario'] or scenario.name in options['scenario'])
+
+        try:
+            with override_settings(RESPONSE_CACHE_ENABLED=options['response_cache']), \
+                    benchmark_database(options['users'], options['ads'], options['comments'], options['seed'],
+                                       options['keepdb'], max(verbosity - 1, 0)):
+                results: dict[str, dict] = run_benchmark(options['iterations'], scenarios, options['warmup'])
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        self.print_results(results)
+        report: dict = {'meta': self.get_meta(options), 'results': results}
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline: dict = json.load(file)
+            regressions: list[str] = compare_results(results, baseline['results'], options['threshold'])
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    @staticmethod
+    def get_meta(options: dict) -> dict:
+        return {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'dataset': {key: options[key] for key in ('users', 'ads', 'comments', 'seed')},
+            'iterations': options['iterations'],
+            'response_cache': options['response_cache'],
+        }
+
+    def print_results(self, results: dict[str, dict]) -> None:
+        self.stdout.write(f'{"scenario":<20}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queries":>9}{"alloc KiB":>11}')
+        for name, metrics in results.items():
+            self.stdout.write(f'{name:<20}{metrics["p50_ms"]:>10.2f}{metrics["p95_ms"]:>10.2f}'
+                              f'{metrics["p99_ms"]:>10.2f}{metrics["queries"]:>9}{metrics["peak_alloc_kib"]:>11}')
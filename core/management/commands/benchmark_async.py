@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.test.utils import override_settings
+
+from core.benchmark import ASYNC_SCENARIOS, benchmark_database, run_concurrency_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway test database and compare sync and async read views under concurrent ASGI load'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--users', type=int, default=200, help='Number of users to synthesize')
+        parser.add_argument('--ads', type=int, default=5000, help='Number of advertisements to synthesize')
+        parser.add_argument('--comments', type=int, default=20000, help='Number of comments to synthesize')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the dataset')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per scenario, mode and concurrency level')
+        parser.add_argument('--concurrency', type=int, action='append',
+                            help='Concurrent requests, may be repeated, defaults to 1, 10 and 50')
+        parser.add_argument('--scenario', action='append', choices=[scenario.name for scenario in ASYNC_SCENARIOS],
+                            help='Run only the given scenario, may be repeated')
+        parser.add_argument('--response-cache', action='store_true',
+                            help='Keep the response cache enabled, by default the uncached path is measured')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test database and its data')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options) -> None:
+        scenarios: tuple = tuple(scenario for scenario in ASYNC_SCENARIOS
+                                 if not options['scenario'] or scenario.name in options['scenario'])
+        concurrency_levels: tuple[int, ...] = tuple(options['concurrency'] or (1, 10, 50))
+
+        try:
+            with override_settings(RESPONSE_CACHE_ENABLED=options['response_cache']), \
+                    benchmark_database(options['users'], options['ads'], options['comments'], options['seed'],
+                                       options['keepdb'], max(options['verbosity'] - 1, 0)):
+                results: list[dict] = run_concurrency_benchmark(options['requests'], concurrency_levels, scenarios)
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(f'{"scenario":<16}{"mode":<7}{"conc":>6}{"rps":>9}{"p50 ms":>10}{"p95 ms":>10}'
+                          f'{"p99 ms":>10}{"errors":>8}')
+        for row in results:
+            self.stdout.write(f'{row["scenario"]:<16}{row["mode"]:<7}{row["concurrency"]:>6}{row["rps"]:>9.1f}'
+                              f'{row["p50_ms"]:>10.2f}{row["p95_ms"]:>10.2f}{row["p99_ms"]:>10.2f}{row["errors"]:>8}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2, ensure_ascii=False)
@@ -0,0 +1,57 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import DEFAULT_DB_ALIAS
+from django.test.utils import override_settings
+
+from core.benchmark import ASYNC_SCENARIOS, CONNECTION_MODES, benchmark_database, run_connection_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway test database and compare closed, persistent and pooled database connections under load'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--users', type=int, default=50, help='Number of users to synthesize')
+        parser.add_argument('--ads', type=int, default=500, help='Number of advertisements to synthesize')
+        parser.add_argument('--comments', type=int, default=2000, help='Number of comments to synthesize')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the dataset')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per server and mode')
+        parser.add_argument('--concurrency', type=int, default=10, help='Concurrent requests')
+        parser.add_argument('--mode', action='append', choices=list(CONNECTION_MODES),
+                            help='Connection mode, may be repeated, defaults to close and persistent')
+        parser.add_argument('--server', action='append', choices=['wsgi', 'asgi'],
+                            help='Request handler, may be repeated, defaults to both')
+        parser.add_argument('--scenario', choices=[scenario.name for scenario in ASYNC_SCENARIOS], default='ad-list',
+                            help='Scenario to run')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test database and its data')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options) -> None:
+        scenario = next(scenario for scenario in ASYNC_SCENARIOS if scenario.name == options['scenario'])
+        modes: tuple[str, ...] = tuple(options['mode'] or ('close', 'persistent'))
+
+        try:
+            with override_settings(RESPONSE_CACHE_ENABLED=False), \
+                    benchmark_database(options['users'], options['ads'], options['comments'], options['seed'],
+                                       options['keepdb'], max(options['verbosity'] - 1, 0)):
+                results: list[dict] = run_connection_benchmark(
+                    options['requests'], options['concurrency'], modes,
+                    tuple(options['server'] or ('wsgi', 'asgi')), scenario)
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(f'{"server":<8}{"mode":<12}{"rps":>9}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+                          f'{"connects":>10}{"errors":>8}')
+        for row in results:
+            self.stdout.write(f'{row["server"]:<8}{row["mode"]:<12}{row["rps"]:>9.1f}{row["p50_ms"]:>10.2f}'
+                              f'{row["p95_ms"]:>10.2f}{row["p99_ms"]:>10.2f}{row["connects"]:>10}{row["errors"]:>8}')
+
+        if 'pool' in modes:
+            from core.db.backends.pooled_postgresql.base import pool_checkouts, pool_timeouts
+
+            self.stdout.write(f'pool checkouts: {pool_checkouts.get(database=DEFAULT_DB_ALIAS):.0f}, '
+                              f'timeouts: {pool_timeouts.get(database=DEFAULT_DB_ALIAS):.0f}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2, ensure_ascii=False)
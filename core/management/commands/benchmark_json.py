@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.test.utils import override_settings
+
+from core.benchmark import benchmark_database, run_json_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway test database and compare stdlib and orjson encoding of the ad and comment lists'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--users', type=int, default=50, help='Number of users to synthesize')
+        parser.add_argument('--ads', type=int, default=200, help='Number of advertisements to synthesize')
+        parser.add_argument('--comments', type=int, default=5000, help='Number of comments to synthesize')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the dataset')
+        parser.add_argument('--iterations', type=int, default=500, help='Timed encodes per payload and renderer')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test database and its data')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options) -> None:
+        try:
+            with override_settings(RESPONSE_CACHE_ENABLED=False), \
+                    benchmark_database(options['users'], options['ads'], options['comments'], options['seed'],
+                                       options['keepdb'], max(options['verbosity'] - 1, 0)):
+                results: dict[str, dict] = run_json_benchmark(options['iterations'])
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        if not all(metrics['orjson'] for metrics in results.values()):
+            self.stderr.write('orjson is not installed, both renderers use the stdlib encoder')
+
+        self.stdout.write(f'{"payload":<16}{"bytes":>9}{"same":>6}{"enc std":>10}{"enc fast":>10}'
+                          f'{"dec std":>10}{"dec fast":>10}')
+        for name, metrics in results.items():
+            self.stdout.write(f'{name:<16}{metrics["bytes"]:>9}{"yes" if metrics["identical"] else "NO":>6}'
+                              f'{metrics["encode_stdlib_ms"]:>10.3f}{metrics["encode_fast_ms"]:>10.3f}'
+                              f'{metrics["decode_stdlib_ms"]:>10.3f}{metrics["decode_fast_ms"]:>10.3f}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2, ensure_ascii=False)
@@ -0,0 +1,26 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from core.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs until stopped by SIGINT or SIGTERM, running jobs are finished first'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'JOBS_CONCURRENCY', 2),
+                            help='Jobs run at the same time, one thread and database connection each')
+        parser.add_argument('--poll-interval', type=float, default=getattr(settings, 'JOBS_POLL_INTERVAL', 1),
+                            help='Seconds an idle thread waits before looking for due jobs again')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due')
+
+    def handle(self, *args, **options) -> None:
+        worker = Worker(options['concurrency'], options['poll_interval'])
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: worker.stop())
+
+        self.stdout.write(f'Running jobs in {worker.concurrency} threads as {worker.worker_id}')
+        processed: int = worker.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs'))
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import DEFAULT_DB_ALIAS, OperationalError
+
+from core.seeding import DEFAULT_BATCH_SIZE, BulkCreateWriter, get_writer, load_fixtures, synthesize, \
+    wait_for_database
+
+
+class Command(BaseCommand):
+    help = 'Bulk-load JSON fixtures and/or synthesize users, advertisements and comments'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('fixtures', nargs='*', help='Paths of JSON fixture files, loaded in the given order')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to load into')
+        parser.add_argument('--wait', type=float, default=0, metavar='SECONDS',
+                            help='Poll the database for up to this many seconds before loading')
+        parser.add_argument('--method', choices=('auto', 'copy', 'bulk'), default='auto',
+                            help='COPY on PostgreSQL or bulk_create; auto picks COPY when available')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per batch and transaction')
+        parser.add_argument('--users', type=int, default=0, help='Number of users to synthesize')
+        parser.add_argument('--ads', type=int, default=0, help='Number of advertisements to synthesize')
+        parser.add_argument('--comments', type=int, default=0, help='Number of comments to synthesize')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible data')
+
+    def handle(self, *args, **options) -> None:
+        database: str = options['database']
+
+        if options['wait']:
+            try:
+                waited: float = wait_for_database(database, timeout=options['wait'])
+            except OperationalError as exc:
+                raise CommandError(f'Database is not available after {options["wait"]}s: {exc}')
+            self.stdout.write(f'Database is ready after {waited:.1f}s')
+
+        try:
+            writer: BulkCreateWriter = get_writer(database, options['method'], options['batch_size'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if options['fixtures']:
+            self.report('Loaded', load_fixtures(options['fixtures'], writer), writer)
+
+        if options['users'] or options['ads'] or options['comments']:
+            started: float = time.monotonic()
+            try:
+                created: dict[str, int] = synthesize(writer, options['users'], options['ads'], options['comments'],
+                                                     options['seed'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            self.report(f'Synthesized in {time.monotonic() - started:.1f}s', created, writer)
+
+    def report(self, title: str, counts: dict[str, int], writer: BulkCreateWriter) -> None:
+        rows: str = ', '.join(f'{label}: {count}' for label, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'{title} with {writer.name}: {rows}'))
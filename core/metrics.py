@@ -0,0 +1,158 @@
+import threading
+from bisect import bisect_left
+from typing import Iterable
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Metric types
+DEFAULT_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labelnames: tuple[str, ...], values: tuple, extra: str = '') -> str:
+    """
+    Format label values in the Prometheus text exposition format
+
+    :param labelnames: Names of the labels
+    :param values: Values of the labels
+    :param extra: An additional preformatted label, e.g. le="0.5"
+    :return: A string like {view="ads",result="hit"} or an empty string
+    """
+    pairs: list[str] = [f'{name}="{escape_label_value(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    """
+    Base in-process metric with labels, safe to update from several threads
+    """
+    type_name: str = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: tuple[str, ...] = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        """
+        Returns lines of the metric in the Prometheus text exposition format
+        """
+        lines: list[str] = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            items: list[tuple] = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Counter(Metric):
+    type_name: str = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key: tuple = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    type_name: str = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type_name: str = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key: tuple = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> list[str]:
+        lines: list[str] = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            items: list[tuple] = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative: int = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le: str = '+Inf' if bound == float('inf') else repr(bound)
+                labels: str = format_labels(self.labelnames, key, 'le="%s"' % le)
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, key)} {total}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Registry
+class Registry:
+    """
+    Process-wide collection of metrics rendered by the /metrics endpoint
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric_class: type, name: str, documentation: str, **kwargs) -> Metric:
+        """
+        Returns the metric with the given name, creating it on first use
+
+        :param metric_class: A Metric subclass
+        :param name: A metric name
+        :param documentation: A help text
+        :return: A metric instance
+        """
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_class(name, documentation, **kwargs)
+            return self._metrics[name]
+
+    def render(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            metrics: list[Metric] = [self._metrics[name] for name in sorted(self._metrics)]
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter, name, documentation, labelnames=labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge, name, documentation, labelnames=labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (),
+              buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram, name, documentation, labelnames=labelnames, buckets=buckets)
@@ -0,0 +1,316 @@
+import cProfile
+import hmac
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from contextlib import ExitStack
+from typing import Callable, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from rest_framework.permissions import SAFE_METHODS
+
+from core.db_routers import get_replicas, pin_to_primary, replica_reads
+from core.metrics import counter, histogram
+
+logger = logging.getLogger('core.profiling')
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Metrics
+QUERY_BUCKETS: tuple[float, ...] = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+request_duration = histogram('http_request_duration_seconds', 'Wall time of sampled requests by view',
+                             labelnames=('view', 'method'))
+request_db_duration = histogram('http_request_db_duration_seconds', 'Database time of sampled requests by view',
+                                labelnames=('view', 'method'))
+request_queries = histogram('http_request_queries', 'Queries per sampled request by view',
+                            labelnames=('view', 'method'), buckets=QUERY_BUCKETS)
+duplicate_queries = counter('http_request_duplicate_queries_total',
+                            'Sampled requests repeating the same SQL statement by view', labelnames=('view',))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Query recorder
+class QueryRecorder:
+    """
+    Database execute wrapper counting queries, their time and repeated statements
+    """
+
+    def __init__(self):
+        self.count: int = 0
+        self.duration: float = 0.0
+        self.statements: Counter = Counter()
+
+    def __call__(self, execute: Callable, sql: str, params, many: bool, context: dict):
+        started: float = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def get_duplicates(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        Returns statements executed at least `threshold` times, the usual shape of an N+1
+
+        Statements are compared with placeholders, so the same query with different parameters counts as a repeat.
+
+        :param threshold: Minimal number of executions
+        :return: A list of statements and their counts, most frequent first
+        """
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Middleware
+def get_view_name(request: HttpRequest) -> str:
+    """
+    Returns a low-cardinality name of the view that handled the request, e.g. AdvertisementsViewSet.list
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+
+    view_class: Optional[type] = getattr(match.func, 'cls', None)
+    actions: Optional[dict] = getattr(match.func, 'actions', None)
+    if view_class is None:
+        return match.view_name
+    if actions and request.method.lower() in actions:
+        return f'{view_class.__name__}.{actions[request.method.lower()]}'
+    return f'{view_class.__name__}.{request.method.lower()}'
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in sampling middleware recording wall time, database time and query count per view
+
+    Enabled with PROFILING_ENABLED, a PROFILING_SAMPLE_RATE share of requests is measured and
+    reported to the /metrics histograms and the `core.profiling` logger as one JSON line.
+    Statements repeated PROFILING_DUPLICATE_THRESHOLD times in a request are logged as a warning.
+    When PROFILING_CPROFILE_ENABLED is on, a request whose X-Profile header equals PROFILING_SECRET
+    is always sampled and its cProfile stats are dumped to PROFILING_CPROFILE_DIR. The header is
+    ignored without a secret, so clients cannot make the server profile them at will.
+    """
+    profile_header: str = 'HTTP_X_PROFILE'
+    sync_capable: bool = True
+    async_capable: bool = True
+
+    def __init__(self, get_response: Callable):
+        self.get_response: Callable = get_response
+        self.is_async: bool = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest):
+        if self.is_async:
+            return self.__acall__(request)
+
+        use_cprofile: Optional[bool] = self.sample(request)
+        if use_cprofile is None:
+            return self.get_response(request)
+
+        return self.profile(request, use_cprofile)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        use_cprofile: Optional[bool] = self.sample(request)
+        if use_cprofile is None:
+            return await self.get_response(request)
+
+        return await self.aprofile(request, use_cprofile)
+
+    def sample(self, request: HttpRequest) -> Optional[bool]:
+        """
+        Decide whether the request is profiled
+
+        :param request: HTTP request object
+        :return: None to skip the request, otherwise True if its cProfile stats are dumped
+        """
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            return None
+
+        use_cprofile: bool = getattr(settings, 'PROFILING_CPROFILE_ENABLED', False) and self.has_profile_secret(request)
+        if not use_cprofile and random.random() >= getattr(settings, 'PROFILING_SAMPLE_RATE', 0.01):
+            return None
+        return use_cprofile
+
+    def has_profile_secret(self, request: HttpRequest) -> bool:
+        """
+        True if the X-Profile header of the request matches a configured PROFILING_SECRET
+        """
+        secret: str = getattr(settings, 'PROFILING_SECRET', '')
+        return bool(secret) and hmac.compare_digest(request.META.get(self.profile_header, '').encode(),
+                                                    secret.encode())
+
+    def profile(self, request: HttpRequest, use_cprofile: bool) -> HttpResponse:
+        """
+        Handle the request while recording its queries and, optionally, its cProfile stats
+
+        :param request: HTTP request object
+        :param use_cprofile: True to dump cProfile stats of the request
+        :return: Response object
+        """
+        recorder = QueryRecorder()
+        profiler: Optional[cProfile.Profile] = cProfile.Profile() if use_cprofile else None
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            started: float = time.perf_counter()
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response: HttpResponse = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+            duration: float = time.perf_counter() - started
+
+        return self.report(request, response, recorder, duration, profiler)
+
+    async def aprofile(self, request: HttpRequest, use_cprofile: bool) -> HttpResponse:
+        """
+        Async variant of `profile`
+
+        Connections are per thread and the async ORM runs queries in the thread shared by the
+        request's sync_to_async calls, so the recorder is installed and removed in that thread.
+        cProfile only sees the event loop thread.
+
+        :param request: HTTP request object
+        :param use_cprofile: True to dump cProfile stats of the request
+        :return: Response object
+        """
+        recorder = QueryRecorder()
+        profiler: Optional[cProfile.Profile] = cProfile.Profile() if use_cprofile else None
+
+        await sync_to_async(self.install_recorder)(recorder)
+        started: float = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            response: HttpResponse = await self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            duration: float = time.perf_counter() - started
+            await sync_to_async(self.remove_recorder)(recorder)
+
+        return self.report(request, response, recorder, duration, profiler)
+
+    @staticmethod
+    def install_recorder(recorder: QueryRecorder) -> None:
+        for connection in connections.all():
+            connection.execute_wrappers.append(recorder)
+
+    @staticmethod
+    def remove_recorder(recorder: QueryRecorder) -> None:
+        for connection in connections.all():
+            if recorder in connection.execute_wrappers:
+                connection.execute_wrappers.remove(recorder)
+
+    def report(self, request: HttpRequest, response: HttpResponse, recorder: QueryRecorder, duration: float,
+               profiler: Optional[cProfile.Profile]) -> HttpResponse:
+        """
+        Observe the metrics of a profiled request and log it as one JSON line
+
+        :param request: HTTP request object
+        :param response: Response object
+        :param recorder: The recorder of the request queries
+        :param duration: Wall time of the request in seconds
+        :param profiler: A disabled profiler or None
+        :return: Response object
+        """
+        view: str = get_view_name(request)
+        request_duration.observe(duration, view=view, method=request.method)
+        request_db_duration.observe(recorder.duration, view=view, method=request.method)
+        request_queries.observe(recorder.count, view=view, method=request.method)
+
+        record: dict = {
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'db_ms': round(recorder.duration * 1000, 3),
+            'queries': recorder.count,
+        }
+
+        duplicates: list[tuple[str, int]] = recorder.get_duplicates(
+            getattr(settings, 'PROFILING_DUPLICATE_THRESHOLD', 3))
+        if duplicates:
+            duplicate_queries.inc(view=view)
+            record['duplicates'] = [{'sql': sql, 'count': count} for sql, count in duplicates]
+
+        if profiler is not None:
+            record['profile'] = self.dump_profile(profiler, view)
+            response['X-Profile-Dump'] = os.path.basename(record['profile'])
+
+        logger.log(logging.WARNING if duplicates else logging.INFO, json.dumps(record, ensure_ascii=False))
+        return response
+
+    @staticmethod
+    def dump_profile(profiler: cProfile.Profile, view: str) -> str:
+        """
+        Write cProfile stats of a request, readable with `python -m pstats <file>` or snakeviz
+
+        :param profiler: A disabled profiler
+        :param view: The view name used in the file name
+        :return: The path of the written file
+        """
+        directory: str = getattr(settings, 'PROFILING_CPROFILE_DIR', os.path.join(tempfile.gettempdir(), 'profiles'))
+        os.makedirs(directory, exist_ok=True)
+        path: str = os.path.join(directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{view}.prof')
+        profiler.dump_stats(path)
+        return path
+
+
+class ReplicaPinningMiddleware:
+    """
+    Scope replica reads to a request and pin the user to the primary after a successful write
+
+    Views opt in to replica reads with ReplicaReadsMixin; the flag is reset here when the request ends.
+    A user is known after DRF authentication, which sets `request.user` on the Django request.
+    """
+    sync_capable: bool = True
+    async_capable: bool = True
+
+    def __init__(self, get_response: Callable):
+        self.get_response: Callable = get_response
+        self.is_async: bool = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest):
+        if self.is_async:
+            return self.__acall__(request)
+
+        token = replica_reads.set(False)
+        try:
+            response: HttpResponse = self.get_response(request)
+        finally:
+            replica_reads.reset(token)
+        self.pin_writer(request, response)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        token = replica_reads.set(False)
+        try:
+            response: HttpResponse = await self.get_response(request)
+        finally:
+            replica_reads.reset(token)
+        await sync_to_async(self.pin_writer)(request, response)
+        return response
+
+    @staticmethod
+    def pin_writer(request: HttpRequest, response: HttpResponse) -> None:
+        if request.method in SAFE_METHODS or response.status_code >= 400 or not get_replicas():
+            return
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_to_primary(user.pk)
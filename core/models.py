@@ -0,0 +1,46 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create job model
+class Job(models.Model):
+    """
+    A queued call of a registered job function, see core.jobs
+
+    Rows are inserted in the transaction of the enqueuing code, so a job is never run for a write
+    that was rolled back. Finished jobs are deleted, failed ones are kept for inspection.
+    """
+
+    class Statuses(models.TextChoices):
+        """
+        Enumeration of job statuses
+        """
+        QUEUED = 'queued', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        FAILED = 'failed', 'Ошибка'
+
+    name = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=7, choices=Statuses.choices, default=Statuses.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        """
+        Meta information for job model
+        """
+        verbose_name: str = 'Задача'
+        verbose_name_plural: str = 'Задачи'
+        indexes: list[models.Index] = [
+            models.Index(fields=['status', 'run_at', 'id'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'Задача {self.name} ({self.get_status_display()})'
@@ -0,0 +1,421 @@
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import Model, Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from core.cache import get_cache, get_versions
+from core.metrics import counter
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Metrics
+page_counts = counter('pagination_counts_total', 'Page counts by model and source: cache, estimate or count',
+                      labelnames=('model', 'source'))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Keyset cursor
+class KeysetCursor(NamedTuple):
+    """
+    Decoded position of a keyset page: values of the ordering fields of the boundary row
+    """
+    values: tuple
+    reverse: bool
+    ordering: Optional[tuple[str, ...]] = None
+
+
+def encode_cursor(values: tuple, reverse: bool = False, ordering: Optional[tuple[str, ...]] = None) -> str:
+    """
+    Encode ordering values of a row into an opaque url-safe token
+
+    :param values: Values of the ordering fields
+    :param reverse: True if the token points to the previous page
+    :param ordering: The ordering the values belong to
+    :return: An opaque cursor token
+    """
+    payload: dict = {
+        'v': [value.isoformat() if isinstance(value, datetime) else value for value in values],
+        'r': int(reverse),
+    }
+    if ordering is not None:
+        payload['o'] = list(ordering)
+    raw: bytes = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str, fields: list) -> KeysetCursor:
+    """
+    Decode an opaque cursor token produced by `encode_cursor`
+
+    :param token: An opaque cursor token
+    :param fields: Model fields the token values belong to
+    :return: A KeysetCursor instance
+    :raises: ValueError if the token is malformed
+    """
+    try:
+        raw: bytes = urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload: dict = json.loads(raw)
+        values: list = payload['v']
+        reverse: bool = bool(payload.get('r', 0))
+        ordering: Optional[tuple[str, ...]] = tuple(payload['o']) if 'o' in payload else None
+    except (TypeError, KeyError, ValueError) as exc:
+        raise ValueError('Malformed cursor') from exc
+
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise ValueError('Malformed cursor')
+
+    try:
+        return KeysetCursor(values=tuple(field.to_python(value) for field, value in zip(fields, values)),
+                            reverse=reverse, ordering=ordering)
+    except Exception as exc:
+        raise ValueError('Malformed cursor') from exc
+
+
+def keyset_filter(ordering: tuple[str, ...], values: tuple, reverse: bool = False) -> Q:
+    """
+    Build a lexicographic "row comes after the given position" condition for the ordering
+
+    :param ordering: Ordering of the queryset, e.g. ('-created_at', '-id')
+    :param values: Values of the ordering fields of the boundary row
+    :param reverse: True to select rows before the position instead of after it
+    :return: A Q object
+    """
+    condition = Q()
+    equal: dict[str, Any] = {}
+
+    for field, value in zip(ordering, values):
+        name: str = field.lstrip('-')
+        descending: bool = field.startswith('-')
+        lookup: str = 'lt' if descending != reverse else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+
+    # Redundant inclusive bound on the leading field lets the planner use an index range scan
+    # in index order instead of merging the OR branches and sorting them
+    leading: str = ordering[0]
+    leading_lookup: str = 'lte' if leading.startswith('-') != reverse else 'gte'
+    return Q(**{f'{leading.lstrip("-")}__{leading_lookup}': values[0]}) & condition
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Counts
+class CachedCountPaginator(Paginator):
+    """
+    Django paginator caching the total count of a queryset
+
+    Counts are cached for PAGINATION_COUNT_CACHE_TIMEOUT seconds under the SQL of the query and the versions
+    of the models it reads, so a write to any of them makes the count stale at once. On PostgreSQL an unfiltered
+    table whose planner estimate reaches PAGINATION_COUNT_ESTIMATE_THRESHOLD rows is not counted, the estimate
+    from `pg_class.reltuples` is used instead: the last pages may then be empty or missing.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        timeout: int = getattr(settings, 'PAGINATION_COUNT_CACHE_TIMEOUT', 30)
+        if not isinstance(queryset, QuerySet) or timeout <= 0:
+            return super().count
+
+        label: str = queryset.model._meta.label
+        try:
+            key: str = self.get_cache_key(queryset)
+        except EmptyResultSet:
+            # A condition that can match nothing, such as an empty __in, has no SQL to key the cache by
+            return 0
+        count: Optional[int] = get_cache().get(key)
+        if count is not None:
+            page_counts.inc(model=label, source='cache')
+            return count
+
+        count = self.get_estimate(queryset)
+        if count is not None:
+            page_counts.inc(model=label, source='estimate')
+        else:
+            count = queryset.count()
+            page_counts.inc(model=label, source='count')
+
+        get_cache().set(key, count, timeout)
+        return count
+
+    @staticmethod
+    def get_cache_key(queryset: QuerySet) -> str:
+        """
+        Returns the cache key of the count: the database, the SQL with its parameters and the model versions
+
+        :param queryset: A queryset to count
+        :return: A cache key
+        :raises: EmptyResultSet if the queryset cannot match any row
+        """
+        tables: dict[str, type[Model]] = {model._meta.db_table: model for model in apps.get_models()}
+        models: set[type[Model]] = {queryset.model} | {
+            tables[join.table_name] for join in queryset.query.alias_map.values() if join.table_name in tables
+        }
+        versions: dict[str, int] = get_versions(models)
+        sql, params = queryset.query.sql_with_params()
+        digest: str = hashlib.md5(f'{queryset.db}:{sql}:{params!r}'.encode('utf-8')).hexdigest()
+        return f'page-count:{digest}:' + ':'.join(f'{versions[label]}' for label in sorted(versions))
+
+    @staticmethod
+    def get_estimate(queryset: QuerySet) -> Optional[int]:
+        """
+        Returns the planner row estimate of an unfiltered PostgreSQL table, None below the threshold or elsewhere
+
+        :param queryset: A queryset to count
+        :return: A number of rows or None
+        """
+        query = queryset.query
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or query.where or query.distinct or query.combinator \
+                or query.group_by or query.low_mark or query.high_mark is not None:
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                           [connection.ops.quote_name(queryset.model._meta.db_table)])
+            row: Optional[tuple] = cursor.fetchone()
+
+        threshold: int = getattr(settings, 'PAGINATION_COUNT_ESTIMATE_THRESHOLD', 100000)
+        if row is None or row[0] < max(threshold, 0):
+            return None
+        return int(row[0])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Paginators
+class KeysetPageNumberPagination(PageNumberPagination):
+    """
+    Page number paginator with an opt-in keyset (cursor) mode
+
+    Without the cursor parameter it behaves exactly like PageNumberPagination.
+    When the cursor parameter is present (an empty value requests the first page),
+    rows are fetched with a `WHERE (ordering) < (cursor)` condition instead of
+    COUNT(*) + OFFSET, so every page costs the same regardless of its depth.
+    The ordering is taken from the queryset, `ordering` is used for an unordered one. Other orderings than
+    non-null model fields ending with a unique one are rejected with 400. A cursor is only valid for
+    the ordering it was issued for. Page number mode caches its counts, see CachedCountPaginator.
+    """
+    django_paginator_class: type[Paginator] = CachedCountPaginator
+    cursor_query_param: str = 'cursor'
+    cursor_query_description: str = 'Opaque cursor token. Pass an empty value to start keyset pagination.'
+    invalid_cursor_message: str = 'Invalid cursor'
+    unsupported_ordering_message: str = 'Cursor pagination does not support this ordering'
+    ordering: tuple[str, ...] = ('-created_at', '-id')
+
+    use_cursor: bool = False
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None) -> Optional[list]:
+        """
+        Paginate a queryset either by page number or by keyset cursor
+
+        :param queryset: A queryset to paginate
+        :param request: HTTP request object
+        :param view: The view the paginator belongs to
+        :return: A list of objects of the current page
+        """
+        self.use_cursor = self.cursor_query_param in request.query_params
+
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        keyset: Optional[QuerySet] = self.get_keyset_queryset(queryset, request, view)
+        if keyset is None:
+            return None
+        return self.set_keyset_page(list(keyset))
+
+    async def apaginate_queryset(self, queryset: QuerySet, request, view=None) -> Optional[list]:
+        """
+        Async variant of `paginate_queryset` fetching rows with the async ORM
+
+        :param queryset: A queryset to paginate
+        :param request: HTTP request object
+        :param view: The view the paginator belongs to
+        :return: A list of objects of the current page
+        """
+        self.use_cursor = self.cursor_query_param in request.query_params
+
+        if self.use_cursor:
+            keyset: Optional[QuerySet] = self.get_keyset_queryset(queryset, request, view)
+            if keyset is None:
+                return None
+            return self.set_keyset_page([row async for row in keyset])
+
+        page_size: Optional[int] = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator: Paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await sync_to_async(getattr)(paginator, 'count')
+        page_number = self.get_page_number(request, paginator)
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [row async for row in self.page.object_list]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+
+        self.request = request
+        return list(self.page)
+
+    def get_keyset_queryset(self, queryset: QuerySet, request, view=None) -> Optional[QuerySet]:
+        """
+        Returns the queryset of the requested keyset page with one extra row telling if there are more
+
+        :param queryset: A queryset to paginate
+        :param request: HTTP request object
+        :param view: The view the paginator belongs to
+        :return: A sliced queryset or None if pagination is disabled
+        :raises: NotFound if the cursor is malformed, ValidationError if the ordering is not supported
+        """
+        self.request = request
+        self.keyset_page_size: Optional[int] = self.get_page_size(request)
+        if not self.keyset_page_size:
+            return None
+
+        self.keyset_ordering: tuple[str, ...] = self.get_ordering(request, queryset, view)
+        fields: list = [queryset.model._meta.get_field(field.lstrip('-')) for field in self.keyset_ordering]
+        token: str = request.query_params.get(self.cursor_query_param, '')
+
+        try:
+            self.keyset_cursor: Optional[KeysetCursor] = decode_cursor(token, fields) if token else None
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if self.keyset_cursor is not None and (self.keyset_cursor.ordering or self.ordering) != self.keyset_ordering:
+            raise NotFound(self.invalid_cursor_message)
+
+        ordering: tuple[str, ...] = self.keyset_ordering
+        reverse: bool = self.keyset_cursor is not None and self.keyset_cursor.reverse
+        if reverse:
+            queryset = queryset.order_by(*[field[1:] if field.startswith('-') else f'-{field}' for field in ordering])
+        else:
+            queryset = queryset.order_by(*ordering)
+
+        if self.keyset_cursor is not None:
+            queryset = queryset.filter(keyset_filter(ordering, self.keyset_cursor.values, reverse=reverse))
+
+        return queryset[:self.keyset_page_size + 1]
+
+    def set_keyset_page(self, results: list) -> list:
+        """
+        Trim the extra row fetched by `get_keyset_queryset` and remember the page boundaries for links
+
+        :param results: Rows of the keyset queryset
+        :return: A list of objects of the current page
+        """
+        cursor: Optional[KeysetCursor] = self.keyset_cursor
+        reverse: bool = cursor is not None and cursor.reverse
+        has_more: bool = len(results) > self.keyset_page_size
+        results = results[:self.keyset_page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page_rows: list[tuple] = [
+            tuple(row[field.lstrip('-')] if isinstance(row, dict) else getattr(row, field.lstrip('-'))
+                  for field in self.keyset_ordering)
+            for row in (results[0], results[-1])
+        ] if results else []
+
+        return results
+
+    def get_ordering(self, request, queryset: QuerySet, view=None) -> tuple[str, ...]:
+        """
+        Returns the ordering used in keyset mode
+
+        The queryset ordering is used when every term is a non-null model field and the last one is unique,
+        e.g. ('price', 'id') set by an ordering filter, an unordered queryset uses `ordering`. Orderings by
+        annotations such as a search rank or by nullable fields cannot be expressed as a keyset condition,
+        they are rejected rather than silently replaced with another order.
+
+        :param request: HTTP request object
+        :param queryset: A queryset to paginate
+        :param view: The view the paginator belongs to
+        :return: A tuple of ordering fields ending with a unique field
+        :raises: ValidationError if the queryset ordering cannot be paginated by a cursor
+        """
+        ordering: tuple = tuple(queryset.query.order_by)
+        if not ordering:
+            return self.ordering
+
+        fields: list = []
+        if all(isinstance(term, str) for term in ordering):
+            try:
+                fields = [queryset.model._meta.get_field(term.lstrip('-')) for term in ordering]
+            except FieldDoesNotExist:
+                fields = []
+
+        if not fields or any(field.null or field.is_relation for field in fields) or not fields[-1].unique:
+            raise ValidationError({self.cursor_query_param: [self.unsupported_ordering_message]})
+        return ordering
+
+    def get_cursor_link(self, values: tuple, reverse: bool) -> str:
+        """
+        Returns an absolute url pointing to the page next to the given position
+
+        :param values: Values of the ordering fields of the boundary row
+        :param reverse: True for the previous page link
+        :return: An absolute url
+        """
+        url: str = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        token: str = encode_cursor(values, reverse=reverse,
+                                   ordering=None if self.keyset_ordering == self.ordering else self.keyset_ordering)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next or not self.page_rows:
+            return None
+        return self.get_cursor_link(self.page_rows[-1], reverse=False)
+
+    def get_previous_link(self) -> Optional[str]:
+        if not self.use_cursor:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_rows:
+            return None
+        return self.get_cursor_link(self.page_rows[0], reverse=True)
+
+    def get_paginated_response(self, data) -> Response:
+        """
+        Returns the page response, without the total count in keyset mode
+        """
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_schema_operation_parameters(self, view) -> list[dict]:
+        parameters: list[dict] = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': self.cursor_query_description,
+            'schema': {
+                'type': 'string',
+            },
+        })
+        return parameters
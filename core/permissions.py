@@ -0,0 +1,132 @@
+from typing import Optional
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import FileField, Model, QuerySet
+from django.db.models.signals import post_save
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+from rest_framework.serializers import Serializer
+from rest_framework.validators import UniqueForDateValidator, UniqueTogetherValidator, UniqueValidator
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Permissions
+class QuerysetPermission(BasePermission):
+    """
+    Object permission that can also be expressed as a queryset filter
+
+    `filter_queryset` must keep exactly the objects `has_object_permission` allows,
+    so a write can check the permission in its WHERE clause.
+    """
+
+    def filter_queryset(self, request, queryset: QuerySet, view) -> QuerySet:
+        raise NotImplementedError('.filter_queryset() must be overridden.')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# View mixin
+class ScopedUpdateMixin:
+    """
+    ModelViewSet mixin running updates as a single `UPDATE ... WHERE <lookup> AND <permission filter>`
+
+    The object is loaded only once, after the write, to render the response. When no row is updated,
+    `get_object` tells a missing object (404) from a forbidden one (403), and it does so before validation
+    errors too, like the regular update. Updates of files, serializers whose validation needs the instance,
+    and views whose object permissions cannot be expressed as filters go through the regular update.
+    post_save is sent for the reloaded object with `update_fields`, pre_save is not: receivers that must see
+    the object before the write need the regular update.
+    """
+
+    def get_update_queryset(self) -> QuerySet:
+        """
+        Returns the queryset updates are scoped by, without the joins of read-only annotations,
+        which would turn the UPDATE into `WHERE id IN (SELECT ...)`
+        """
+        return self.get_queryset()
+
+    def get_scoped_queryset(self) -> Optional[QuerySet]:
+        """
+        Returns the queryset of the requested object filtered by every object permission, None if one cannot be
+
+        :return: A queryset of at most one row, or None
+        """
+        queryset: QuerySet = self.filter_queryset(self.get_update_queryset())
+        lookup_url_kwarg: str = self.lookup_url_kwarg or self.lookup_field
+        queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+
+        for permission in self.get_permissions():
+            if isinstance(permission, QuerysetPermission):
+                queryset = permission.filter_queryset(self.request, queryset, self)
+            elif type(permission).has_object_permission is not BasePermission.has_object_permission:
+                return None
+        return queryset
+
+    def get_update_fields(self, model: type[Model], validated_data: dict) -> Optional[dict]:
+        """
+        Returns the column values of an in-place update, None if the data needs `save()`
+
+        :param model: The model of the view
+        :param validated_data: Validated data of the serializer
+        :return: A dict of field names and values including auto_now fields, or None
+        """
+        fields: dict = {}
+        for name, value in validated_data.items():
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.many_to_many or isinstance(field, FileField):
+                return None
+            fields[name] = value
+
+        now = timezone.now()
+        fields.update({
+            field.attname: now for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)
+        })
+        return fields
+
+    @staticmethod
+    def needs_instance(serializer: Serializer) -> bool:
+        """
+        True if validation may depend on the updated object, so it cannot run before the object is loaded
+
+        Unique validators exclude the instance from their lookup, `validate` and `validate_<field>`
+        methods may read `self.instance` to compare old and new values.
+
+        :param serializer: A serializer bound to the request data
+        :return: True if the serializer must be validated with the instance
+        """
+        unique_validators: tuple[type, ...] = (UniqueValidator, UniqueTogetherValidator, UniqueForDateValidator)
+        if type(serializer).validate is not Serializer.validate \
+                or any(isinstance(validator, unique_validators) for validator in serializer.validators):
+            return True
+        return any(
+            hasattr(serializer, f'validate_{name}')
+            or any(isinstance(validator, unique_validators) for validator in field.validators)
+            for name, field in serializer.fields.items()
+        )
+
+    def update(self, request, *args, **kwargs) -> Response:
+        partial: bool = kwargs.pop('partial', False)
+        serializer = self.get_serializer(data=request.data, partial=partial)
+        if self.needs_instance(serializer):
+            return super().update(request, *args, partial=partial, **kwargs)
+        if not serializer.is_valid():
+            self.get_object()
+            raise ValidationError(serializer.errors)
+
+        queryset: Optional[QuerySet] = self.get_scoped_queryset()
+        fields: Optional[dict] = self.get_update_fields(queryset.model, serializer.validated_data) \
+            if queryset is not None else None
+        if fields is None:
+            return super().update(request, *args, partial=partial, **kwargs)
+
+        if fields and not queryset.update(**fields):
+            self.get_object()
+
+        instance: Model = self.get_object()
+        post_save.send(sender=queryset.model, instance=instance, created=False, update_fields=frozenset(fields),
+                       raw=False, using=queryset.db)
+        return Response(self.get_serializer(instance).data)
@@ -0,0 +1,47 @@
+from typing import Optional
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Renderers
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson when it is installed, the output is byte-identical to DRF's
+
+    Types orjson does not know natively, datetimes included, go through DRF's encoder. Indented output,
+    non-default UNICODE_JSON, COMPACT_JSON or STRICT_JSON settings and data orjson refuses, such as
+    integers above 64 bits, are rendered by the stdlib encoder. Floats differ from it: NaN and Infinity
+    are rendered as null instead of raising, and values below 1e-4 or from 1e16 are written in another
+    notation of the same number. The API has no float fields.
+    """
+    options: int = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS \
+        if orjson is not None else 0
+
+    def render(self, data, accepted_media_type: Optional[str] = None, renderer_context: Optional[dict] = None) -> bytes:
+        """
+        Render `data` into JSON
+
+        :param data: Serialized data
+        :param accepted_media_type: The accepted media type, may have an indent parameter
+        :param renderer_context: Renderer context, may have an indent
+        :return: A bytestring
+        """
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact or not self.strict \
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret: bytes = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Escaped like DRF does, so the output stays a strict javascript subset
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
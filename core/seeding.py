@@ -0,0 +1,339 @@
+import csv
+import io
+import math
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+from typing import Iterable, Iterator, Optional
+
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.core import serializers
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.models import Max, Model
+from django.utils import timezone
+
+from advertisements.counters import recount_comment_counters
+from core.cache import bump_version
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Defaults
+DEFAULT_BATCH_SIZE: int = 5000
+DEFAULT_PASSWORD: str = 'password'
+SEED_MODELS: tuple[str, ...] = ('users.User', 'advertisements.Advertisement', 'advertisements.Comment')
+
+FIRST_NAMES: tuple[str, ...] = ('Иван', 'Петр', 'Анна', 'Мария', 'Сергей', 'Ольга', 'Алексей', 'Елена', 'Дмитрий',
+                                'Наталья', 'Андрей', 'Татьяна')
+LAST_NAMES: tuple[str, ...] = ('Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов',
+                               'Михайлов', 'Новиков', 'Федоров', 'Морозов')
+ITEMS: tuple[str, ...] = ('Компьютер', 'Ноутбук', 'Телефон', 'Шкаф', 'Стол', 'Диван', 'Велосипед', 'Холодильник',
+                          'Телевизор', 'Кресло', 'Куртка', 'Коляска', 'Гитара', 'Фотоаппарат', 'Самокат')
+QUALIFIERS: tuple[str, ...] = ('недорого', 'почти новый', 'в хорошем состоянии', 'срочно', 'б/у', 'с доставкой',
+                               'торг уместен', 'в упаковке')
+SENTENCES: tuple[str, ...] = ('Продаю в связи с переездом.', 'Покупал в прошлом году, пользовался бережно.',
+                              'Самовывоз из центра города.', 'Возможна доставка по договоренности.',
+                              'Все вопросы по телефону.', 'Есть чек и гарантия.', 'Без дефектов и царапин.')
+COMMENTS: tuple[str, ...] = ('Отличное предложение!', 'Еще актуально?', 'Торг возможен?', 'Можно посмотреть вечером?',
+                             'Спасибо, все понравилось.', 'Продавец быстро отвечает, рекомендую.')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Database readiness
+def wait_for_database(using: str = DEFAULT_DB_ALIAS, timeout: float = 30.0, interval: float = 0.5) -> float:
+    """
+    Poll the database until a connection succeeds instead of sleeping a fixed time
+
+    :param using: A database alias
+    :param timeout: Seconds to wait before giving up
+    :param interval: Seconds between attempts
+    :return: Seconds spent waiting
+    :raises: OperationalError if the database is still unavailable after the timeout
+    """
+    connection = connections[using]
+    started: float = time.monotonic()
+
+    while True:
+        try:
+            connection.ensure_connection()
+            return time.monotonic() - started
+        except OperationalError:
+            if time.monotonic() - started >= timeout:
+                raise
+            connection.close()
+            time.sleep(interval)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Writers
+@contextmanager
+def raw_timestamps(model: type[Model]) -> Iterator[None]:
+    """
+    Keep explicitly set values of auto_now / auto_now_add fields during bulk_create
+    """
+    fields: list = [field for field in model._meta.concrete_fields
+                    if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    flags: list[tuple[bool, bool]] = [(field.auto_now, field.auto_now_add) for field in fields]
+    try:
+        for field in fields:
+            field.auto_now = field.auto_now_add = False
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, flags):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class BulkCreateWriter:
+    """
+    Writes model instances with bulk_create, one transaction per batch
+    """
+    name: str = 'bulk'
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.using: str = using
+        self.batch_size: int = batch_size
+
+    def write_batch(self, model: type[Model], objects: list[Model]) -> None:
+        with raw_timestamps(model):
+            model.objects.using(self.using).bulk_create(objects, batch_size=self.batch_size)
+
+    def write(self, model: type[Model], objects: Iterable[Model]) -> int:
+        """
+        Insert objects in batches
+
+        :param model: A model class
+        :param objects: Instances with primary keys set
+        :return: Number of inserted rows
+        """
+        total: int = 0
+        iterator: Iterator[Model] = iter(objects)
+        while batch := list(islice(iterator, self.batch_size)):
+            with transaction.atomic(using=self.using):
+                self.write_batch(model, batch)
+            total += len(batch)
+        return total
+
+
+class CopyWriter(BulkCreateWriter):
+    """
+    Writes model instances with PostgreSQL COPY FROM STDIN, which skips per-row INSERT parsing
+    """
+    name: str = 'copy'
+
+    def write_batch(self, model: type[Model], objects: list[Model]) -> None:
+        connection = connections[self.using]
+        fields: list = model._meta.concrete_fields
+        quote = connection.ops.quote_name
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        for obj in objects:
+            writer.writerow(self.format_value(field.get_db_prep_save(getattr(obj, field.attname), connection))
+                            for field in fields)
+
+        buffer.seek(0)
+        columns: str = ', '.join(quote(field.column) for field in fields)
+        statement: str = f"COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        with connection.cursor() as cursor:
+            cursor.copy_expert(statement, buffer)
+
+    @staticmethod
+    def format_value(value) -> object:
+        if value is None:
+            return '\\N'
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+
+def get_writer(using: str = DEFAULT_DB_ALIAS, method: str = 'auto',
+               batch_size: int = DEFAULT_BATCH_SIZE) -> BulkCreateWriter:
+    """
+    Returns a writer for the database: COPY on PostgreSQL, bulk_create elsewhere
+
+    :param using: A database alias
+    :param method: 'auto', 'copy' or 'bulk'
+    :param batch_size: Rows per batch and transaction
+    :return: A writer instance
+    :raises: ValueError if COPY is requested for a database that does not support it
+    """
+    is_postgres: bool = connections[using].vendor == 'postgresql'
+    if method == 'copy' and not is_postgres:
+        raise ValueError('COPY is only supported on PostgreSQL')
+    if method == 'copy' or (method == 'auto' and is_postgres):
+        return CopyWriter(using, batch_size)
+    return BulkCreateWriter(using, batch_size)
+
+
+def finish_seeding(models: Iterable[type[Model]], using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Move primary key sequences past the inserted ids, recount comment counters and invalidate cached responses
+
+    :param models: Models rows were written to
+    :param using: A database alias
+    """
+    models = list(models)
+    connection = connections[using]
+    statements: list[str] = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    if any(model._meta.label == 'advertisements.Comment' for model in models):
+        recount_comment_counters(using=using)
+    for model in models:
+        bump_version(model)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Fixtures
+def load_fixtures(paths: Iterable[str], writer: BulkCreateWriter) -> dict[str, int]:
+    """
+    Load Django JSON fixtures with bulk writes instead of saving one row at a time
+
+    Objects are written grouped by model in the order the models first appear.
+
+    :param paths: Paths of fixture files
+    :param writer: A writer instance
+    :return: A dict of model labels and numbers of loaded rows
+    """
+    loaded: dict[str, int] = {}
+    models: list[type[Model]] = []
+
+    for path in paths:
+        with open(path, encoding='utf-8') as file:
+            objects: dict[type[Model], list[Model]] = {}
+            for deserialized in serializers.deserialize('json', file, using=writer.using):
+                objects.setdefault(type(deserialized.object), []).append(deserialized.object)
+
+        for model, instances in objects.items():
+            loaded[model._meta.label] = loaded.get(model._meta.label, 0) + writer.write(model, instances)
+            if model not in models:
+                models.append(model)
+
+    finish_seeding(models, writer.using)
+    return loaded
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Synthetic data
+class ZipfSampler:
+    """
+    Samples ids so that the k-th most popular one is drawn proportionally to 1 / k ** exponent
+    """
+
+    def __init__(self, first_id: int, count: int, rng: random.Random, exponent: float = 1.1):
+        self.first_id: int = first_id
+        self.rng: random.Random = rng
+        self.population: range = range(first_id, first_id + count)
+        self.cum_weights: list[float] = list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+    def sample(self, k: int) -> list[int]:
+        return self.rng.choices(self.population, cum_weights=self.cum_weights, k=k)
+
+
+def get_next_id(model: type[Model], using: str) -> int:
+    return (model.objects.using(using).aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def generate_users(count: int, first_id: int, rng: random.Random, now: datetime) -> Iterator[Model]:
+    """
+    Generate users sharing one password hash, hashing it per user would dominate the run time
+    """
+    User = apps.get_model('users', 'User')
+    password: str = make_password(DEFAULT_PASSWORD)
+
+    for pk in range(first_id, first_id + count):
+        yield User(pk=pk, email=f'user{pk}@example.com', password=password, first_name=rng.choice(FIRST_NAMES),
+                   last_name=rng.choice(LAST_NAMES), phone=f'+7921{pk % 10 ** 7:07d}', role=User.Roles.USER,
+                   is_active=True, updated_at=now)
+
+
+def generate_advertisements(count: int, first_id: int, authors: ZipfSampler, rng: random.Random, now: datetime,
+                            created: array, days: int = 365) -> Iterator[Model]:
+    """
+    Generate ads with Zipf-distributed authors, log-normal prices and uniformly spread creation times
+
+    Creation timestamps are appended to `created` so comments can be dated after their ads.
+    """
+    Advertisement = apps.get_model('advertisements', 'Advertisement')
+    batch: int = 10000
+
+    for start in range(first_id, first_id + count, batch):
+        size: int = min(batch, first_id + count - start)
+        for pk, author_id in zip(range(start, start + size), authors.sample(size)):
+            created_at: datetime = now - timedelta(seconds=rng.uniform(0, days * 86400))
+            created.append(created_at.timestamp())
+            yield Advertisement(
+                pk=pk, author_id=author_id, title=f'{rng.choice(ITEMS)} {rng.choice(QUALIFIERS)}',
+                price=max(1, round(rng.lognormvariate(math.log(5000), 1.2))),
+                description=' '.join(rng.sample(SENTENCES, rng.randint(1, 3))) if rng.random() > 0.1 else None,
+                created_at=created_at, updated_at=created_at)
+
+
+def generate_comments(count: int, first_id: int, ads: ZipfSampler, authors: ZipfSampler, rng: random.Random,
+                      now: datetime, created: array) -> Iterator[Model]:
+    """
+    Generate comments concentrated on popular ads, each dated between its ad and now
+    """
+    Comment = apps.get_model('advertisements', 'Comment')
+    batch: int = 10000
+    now_timestamp: float = now.timestamp()
+
+    for start in range(first_id, first_id + count, batch):
+        size: int = min(batch, first_id + count - start)
+        for pk, ad_id, author_id in zip(range(start, start + size), ads.sample(size), authors.sample(size)):
+            ad_created: float = created[ad_id - ads.first_id]
+            created_at: datetime = datetime.fromtimestamp(rng.uniform(ad_created, now_timestamp), tz=now.tzinfo)
+            yield Comment(pk=pk, ad_id=ad_id, author_id=author_id, text=rng.choice(COMMENTS),
+                          created_at=created_at, updated_at=created_at)
+
+
+def synthesize(writer: BulkCreateWriter, users: int = 0, ads: int = 0, comments: int = 0,
+               seed: Optional[int] = None) -> dict[str, int]:
+    """
+    Generate a reproducible dataset of users, advertisements and comments
+
+    New rows get ids after the existing ones. Ads and comments are only generated over the
+    rows created in the same run, so `ads` requires `users` and `comments` requires `ads`.
+
+    :param writer: A writer instance
+    :param users: Number of users to create
+    :param ads: Number of advertisements to create
+    :param comments: Number of comments to create
+    :param seed: A random seed, the same seed produces the same data
+    :return: A dict of model labels and numbers of created rows
+    :raises: ValueError if dependent rows are requested without their parents
+    """
+    if (ads and not users) or (comments and not ads):
+        raise ValueError('Ads require users and comments require ads')
+
+    models: list[type[Model]] = [apps.get_model(label) for label in SEED_MODELS]
+    User, Advertisement, Comment = models
+    rng = random.Random(seed)
+    now: datetime = timezone.now()
+    created: dict[str, int] = {}
+
+    first_user: int = get_next_id(User, writer.using)
+    created[User._meta.label] = writer.write(User, generate_users(users, first_user, rng, now))
+    if not ads:
+        finish_seeding(models[:1], writer.using)
+        return created
+
+    first_ad: int = get_next_id(Advertisement, writer.using)
+    timestamps = array('d')
+    author_sampler = ZipfSampler(first_user, users, rng)
+    created[Advertisement._meta.label] = writer.write(
+        Advertisement, generate_advertisements(ads, first_ad, author_sampler, rng, now, timestamps))
+
+    if comments:
+        first_comment: int = get_next_id(Comment, writer.using)
+        created[Comment._meta.label] = writer.write(
+            Comment, generate_comments(comments, first_comment, ZipfSampler(first_ad, ads, rng, exponent=0.9),
+                                       author_sampler, rng, now, timestamps))
+
+    finish_seeding(models if comments else models[:2], writer.using)
+    return created
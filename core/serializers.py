@@ -0,0 +1,130 @@
+from operator import itemgetter
+from typing import Any, Callable, Optional
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import QuerySet
+from rest_framework import serializers
+from rest_framework.utils.serializer_helpers import ReturnList
+
+# Fields whose representation of a database value is the value itself
+PASSTHROUGH_FIELDS: tuple[type, ...] = (serializers.ReadOnlyField, serializers.IntegerField, serializers.CharField)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Values serializers
+class ValuesSerializer:
+    """
+    Read-only list serializer building representations straight from `.values()` rows
+
+    Fields, their order and their representation are taken from `serializer_class`. Getters are compiled
+    once per class: a plain field reads its source column, converted by the field only when the conversion
+    is not a no-op, a SerializerMethodField calls the method of the same name of this class with the row.
+    The output equals `serializer_class(objects, many=True).data`, without binding fields per object.
+    """
+    serializer_class: Optional[type[serializers.ModelSerializer]] = None
+    # Columns read by method fields
+    extra_columns: tuple[str, ...] = ()
+
+    compiled: dict[type, tuple[list, tuple[str, ...]]] = {}
+
+    def __init__(self, instance=None, many: bool = True, context: Optional[dict] = None):
+        self.instance = instance
+        self.context: dict = context or {}
+
+    @classmethod
+    def compile(cls) -> tuple[list, tuple[str, ...]]:
+        """
+        Returns the field getters and the columns to select, built on first use
+
+        :return: A list of (name, getter, method name) and a tuple of column names
+        :raises: ImproperlyConfigured for fields that cannot be read from a row
+        """
+        if cls in cls.compiled:
+            return cls.compiled[cls]
+
+        fields: list = []
+        columns: list[str] = []
+        for name, field in cls.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                if not hasattr(cls, field.method_name):
+                    raise ImproperlyConfigured(f'{cls.__name__} must define {field.method_name}(row)')
+                fields.append((name, None, field.method_name))
+                continue
+            if field.source == '*' or isinstance(field, (serializers.BaseSerializer, serializers.RelatedField)):
+                raise ImproperlyConfigured(f'{cls.__name__} cannot read the field {name} from a row')
+
+            column: str = field.source.replace('.', '__')
+            columns.append(column)
+            fields.append((name, cls.get_column_getter(column, field), None))
+
+        cls.compiled[cls] = fields, tuple(dict.fromkeys([*columns, *cls.extra_columns]))
+        return cls.compiled[cls]
+
+    @staticmethod
+    def get_column_getter(column: str, field: serializers.Field) -> Callable[[dict], Any]:
+        if isinstance(field, PASSTHROUGH_FIELDS):
+            return itemgetter(column)
+
+        to_representation: Callable = field.to_representation
+
+        def getter(row: dict) -> Any:
+            value = row[column]
+            return None if value is None else to_representation(value)
+        return getter
+
+    @classmethod
+    def prepare(cls, queryset: QuerySet) -> QuerySet:
+        """
+        Select the columns of the serializer and of the queryset ordering, so keyset pagination can read them
+
+        :param queryset: A filtered and ordered queryset
+        :return: A queryset of dicts
+        """
+        columns: tuple[str, ...] = cls.compile()[1]
+        ordering: list[str] = []
+        for term in queryset.query.order_by:
+            if isinstance(term, str) and term.lstrip('-') != 'pk':
+                try:
+                    queryset.model._meta.get_field(term.lstrip('-'))
+                    ordering.append(term.lstrip('-'))
+                except FieldDoesNotExist:
+                    pass
+        return queryset.values(*dict.fromkeys([*columns, *ordering]))
+
+    @property
+    def data(self) -> ReturnList:
+        getters: list[tuple[str, Callable[[dict], Any]]] = [
+            (name, getter or getattr(self, method_name)) for name, getter, method_name in self.compile()[0]
+        ]
+        return ReturnList([{name: getter(row) for name, getter in getters} for row in self.instance],
+                          serializer=self)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# View mixin
+class ValuesSerializerMixin:
+    """
+    GenericAPIView mixin serializing the listed actions with a ValuesSerializer
+
+    The queryset is turned into `.values()` rows after filtering, so filters and ordering still work on models.
+    `get_serializer_class` keeps the ModelSerializer for schemas, forms and the other actions.
+    """
+    values_serializers: dict[str, type[ValuesSerializer]] = {}
+
+    def get_values_serializer_class(self) -> Optional[type[ValuesSerializer]]:
+        return self.values_serializers.get(getattr(self, 'action', 'list'))
+
+    def filter_queryset(self, queryset: QuerySet) -> QuerySet:
+        queryset = super().filter_queryset(queryset)
+        values_serializer: Optional[type[ValuesSerializer]] = self.get_values_serializer_class()
+        if values_serializer is not None:
+            queryset = values_serializer.prepare(queryset)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        values_serializer: Optional[type[ValuesSerializer]] = self.get_values_serializer_class()
+        if values_serializer is None or not kwargs.get('many'):
+            return super().get_serializer(*args, **kwargs)
+        return values_serializer(*args, context=self.get_serializer_context(), **kwargs)
@@ -0,0 +1,433 @@
+import hashlib
+import importlib
+import io
+import json
+import os
+import tempfile
+from importlib.util import find_spec
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections, transaction
+from django.db.models import F
+from django.http import HttpRequest, HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from advertisements.models import Advertisement, Comment
+from core.benchmark import SCENARIOS, compare_results, connection_mode, run_benchmark, run_connection_benchmark, \
+    run_json_benchmark
+from core.db_routers import check_replica_settings, replica_reads, routed_reads
+from core.images import THUMBNAIL_FORMATS, get_thumbnail_name, get_thumbnail_sizes, process_image, strip_metadata
+from core.jobs import enqueue, job, run_pending_jobs
+from core.middleware import ProfilingMiddleware
+from core.models import Job
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+from core.seeding import get_writer, synthesize
+from users.models import User
+
+CALLS: list = []
+
+
+@job(max_attempts=2, retry_delay=0)
+def record_call(value, fail: bool = False) -> None:
+    CALLS.append(value)
+    if fail:
+        raise ValueError(value)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Seeding tests
+class SeedingTest(TestCase):
+    """
+    Synthesized data keeps generated timestamps and leaves sequences past the explicit ids
+    """
+
+    def test_synthesize(self):
+        created: dict[str, int] = synthesize(get_writer(), users=5, ads=50, comments=100, seed=1)
+
+        self.assertEqual(created, {'users.User': 5, 'advertisements.Advertisement': 50,
+                                   'advertisements.Comment': 100})
+        self.assertGreater(Advertisement.objects.values('created_at').distinct().count(), 1)
+        self.assertFalse(Comment.objects.filter(created_at__lt=F('ad__created_at')).exists())
+
+        ad: Advertisement = Advertisement.objects.create(author=User.objects.first(), title='Стол', price=1)
+        self.assertEqual(ad.pk, Advertisement.objects.order_by('-pk').values_list('pk', flat=True)[1] + 1)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Benchmark tests
+class BenchmarkTest(TestCase):
+    """
+    Every scenario succeeds on seeded data, regressions are detected against a baseline
+    and connection modes apply to new connections only inside their block
+    """
+
+    def test_run_and_compare(self):
+        synthesize(get_writer(), users=3, ads=10, comments=10, seed=1)
+        results: dict[str, dict] = run_benchmark(iterations=2, warmup=0, allocation_samples=1)
+
+        self.assertEqual(list(results), [scenario.name for scenario in SCENARIOS])
+        self.assertEqual(compare_results(results, results, threshold=0), [])
+
+        slower: dict[str, dict] = {'ad-list': {**results['ad-list'], 'queries': results['ad-list']['queries'] + 1}}
+        self.assertEqual(len(compare_results(slower, results, threshold=0)), 1)
+
+    def test_connection_mode(self):
+        saved: dict = dict(connections.settings['default'])
+        with connection_mode('persistent'):
+            self.assertEqual(connections.settings['default']['CONN_MAX_AGE'], 600)
+        self.assertEqual(connections.settings['default'], saved)
+
+        with self.assertRaises(RuntimeError):
+            run_connection_benchmark(requests=1, concurrency=1, modes=('pool',))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# JSON renderer and parser tests
+class FastJSONTest(TestCase):
+    """
+    The orjson-backed renderer and parser produce the same bytes and values as DRF's stdlib ones
+    """
+
+    def test_identical_rendering(self):
+        synthesize(get_writer(), users=3, ads=10, comments=30, seed=1)
+        results: dict[str, dict] = run_json_benchmark(iterations=1)
+        self.assertTrue(all(metrics['identical'] for metrics in results.values()), results)
+
+        client = APIClient()
+        client.force_authenticate(User.objects.first())
+        profile = client.get('/api/users/me/').data
+        data: dict = {'profile': profile, 'created_at': timezone.now(), 'title': gettext_lazy('Объявление'),
+                      'text': 'строка\u2028абзац\u2029', 1: None, 'big': 2 ** 70}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+    def test_parsing(self):
+        for body in (b'{"price": 12345678901234567890123, "title": "\\u0421\\u0442\\u043e\\u043b"}', b'[1, 2.5]'):
+            self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+
+        for body in (b'{"price": NaN}', b'[1,'):
+            errors: list[str] = []
+            for parser in (FastJSONParser(), JSONParser()):
+                with self.assertRaises(ParseError) as context:
+                    parser.parse(io.BytesIO(body))
+                errors.append(str(context.exception))
+            self.assertEqual(errors[0], errors[1])
+
+        with mock.patch('core.parsers.orjson', None):
+            self.assertEqual(FastJSONParser().parse(io.BytesIO(b'{"a": 1}')), {'a': 1})
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Metrics view tests
+@override_settings(METRICS_TOKEN='secret')
+class MetricsViewTest(TestCase):
+    """
+    Metrics are shown to the scraper with METRICS_TOKEN and to staff users only
+    """
+
+    def test_access(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+        user: User = User.objects.create_user(
+            email='user@skypro.ru', first_name='Иван', last_name='Иванов', phone='+79217777777', password='pass')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+        User.objects.filter(pk=user.pk).update(role=User.Roles.ADMIN)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Profiling middleware tests
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0, PROFILING_DUPLICATE_THRESHOLD=2,
+                   RESPONSE_CACHE_ENABLED=False)
+class ProfilingMiddlewareTest(TestCase):
+    """
+    Sampled requests are logged with their view, query count and repeated statements
+    """
+
+    def test_records_queries_and_duplicates(self):
+        synthesize(get_writer(), users=1, ads=3, seed=1)
+
+        with self.assertLogs('core.profiling', level='INFO') as logs, \
+                mock.patch('advertisements.serializers.AdvertisementListValuesSerializer.get_image',
+                           lambda serializer, row: Advertisement.objects.get(pk=row['id']).title):
+            self.client.get('/api/ads/')
+
+        record: dict = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'AdvertisementsViewSet.list')
+        self.assertEqual(record['queries'], 5)
+        self.assertEqual(record['duplicates'][0]['count'], 3)
+        self.assertEqual(logs.records[0].levelname, 'WARNING')
+
+    @override_settings(PROFILING_SAMPLE_RATE=0.0, PROFILING_CPROFILE_ENABLED=True, PROFILING_SECRET='secret')
+    def test_cprofile_header(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(PROFILING_CPROFILE_DIR=directory):
+            response = self.client.get('/api/ads/', HTTP_X_PROFILE='secret')
+            self.assertTrue(os.path.exists(os.path.join(directory, response['X-Profile-Dump'])))
+
+            self.assertNotIn('X-Profile-Dump', self.client.get('/api/ads/'))
+            self.assertNotIn('X-Profile-Dump', self.client.get('/api/ads/', HTTP_X_PROFILE='1'))
+            with self.settings(PROFILING_SECRET=''):
+                self.assertNotIn('X-Profile-Dump', self.client.get('/api/ads/', HTTP_X_PROFILE=''))
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_async_requests(self):
+        async def get_response(request: HttpRequest) -> HttpResponse:
+            count: int = await User.objects.acount()
+            return HttpResponse(str(count + await Advertisement.objects.acount()))
+
+        with self.assertLogs('core.profiling', level='INFO') as logs:
+            response = async_to_sync(ProfilingMiddleware(get_response))(RequestFactory().get('/api/ads/'))
+
+        self.assertEqual(response.content, b'0')
+        self.assertEqual(json.loads(logs.records[0].getMessage())['queries'], 2)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Replica routing tests
+@override_settings(DATABASE_REPLICAS=['default'], REPLICA_PIN_SECONDS=60, RESPONSE_CACHE_ENABLED=False,
+                   RESPONSE_CACHE_SHARED=True)
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Opted-in reads go to replicas until the user writes, responses read right after a write are not cached
+
+    The default database stands in for the replica; TestCase would keep every read on the primary
+    because of its surrounding transaction.
+    """
+
+    def setUp(self):
+        synthesize(get_writer(), users=1, ads=3, seed=1)
+        self.client = APIClient()
+
+    def count_replica_reads(self, method: str, url: str, **kwargs) -> int:
+        before: float = routed_reads.get(database='default')
+        response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400, response.content)
+        self.assertFalse(replica_reads.get())
+        return int(routed_reads.get(database='default') - before)
+
+    def test_read_your_writes(self):
+        self.assertGreater(self.count_replica_reads('get', '/api/ads/'), 0)
+
+        self.client.force_authenticate(User.objects.latest('pk'))
+        self.assertGreater(self.count_replica_reads('get', '/api/users/'), 0)
+        self.assertEqual(self.count_replica_reads('post', '/api/ads/', data={'title': 'Стол', 'price': 1}), 0)
+        self.assertEqual(self.count_replica_reads('get', '/api/ads/'), 0)
+
+        self.client.force_authenticate(None)
+        self.assertGreater(self.count_replica_reads('get', '/api/ads/'), 0)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    def test_lagging_responses_not_cached(self):
+        self.assertEqual(self.client.get('/api/ads/')['X-Cache'], 'MISS')
+        response = self.client.get('/api/ads/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertNotIn('ETag', response)
+
+        with self.settings(REPLICA_PIN_SECONDS=0):
+            self.client.get('/api/ads/')
+            self.assertEqual(self.client.get('/api/ads/')['X-Cache'], 'HIT')
+
+    def test_shared_cache_required(self):
+        check_replica_settings()
+        with self.settings(RESPONSE_CACHE_SHARED=False), self.assertRaises(ImproperlyConfigured):
+            check_replica_settings()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Job tests
+@override_settings(JOBS_EAGER=False)
+class JobTest(TestCase):
+    """
+    Jobs are queued with the enqueuing transaction, retried with backoff and kept when they fail
+    """
+
+    def setUp(self):
+        CALLS.clear()
+
+    def test_run_and_retry(self):
+        enqueue(record_call, 'ok')
+        enqueue(record_call, 'bad', fail=True)
+        enqueue(record_call, 'later', delay=60)
+
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(run_pending_jobs(), 3)
+        self.assertEqual(CALLS, ['ok', 'bad', 'bad'])
+        failed: Job = Job.objects.get(status=Job.Statuses.FAILED)
+        self.assertEqual((failed.attempts, failed.payload), (2, {'args': ['bad'], 'kwargs': {'fail': True}}))
+        self.assertIn('ValueError: bad', failed.last_error)
+        self.assertEqual(Job.objects.filter(status=Job.Statuses.QUEUED).count(), 1)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(enqueue(record_call, 'now'))
+        self.assertEqual(CALLS, ['now'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_rolled_back_and_unknown(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            enqueue(record_call, 'lost')
+            raise ValueError()
+        self.assertFalse(Job.objects.exists())
+
+        with self.assertRaises(LookupError):
+            enqueue('os.system', 'ls')
+
+    @override_settings(EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+                       JOBS_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_queued_email(self):
+        message = mail.EmailMultiAlternatives('Тема', 'Текст', 'market@skypro.ru', ['user@skypro.ru'])
+        message.attach_alternative('<p>Текст</p>', 'text/html')
+        message.attach('data.bin', b'\x00\xff', 'application/octet-stream')
+        self.assertEqual(message.send(), 1)
+        self.assertEqual(mail.outbox, [])
+
+        run_pending_jobs()
+        sent = mail.outbox[0]
+        self.assertEqual((sent.subject, sent.to, sent.alternatives, sent.attachments),
+                         ('Тема', ['user@skypro.ru'], [('<p>Текст</p>', 'text/html')],
+                          [('data.bin', b'\x00\xff', 'application/octet-stream')]))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Image processing tests
+@override_settings(JOBS_EAGER=False, RESPONSE_CACHE_ENABLED=False)
+class ImageProcessingTest(TestCase):
+    """
+    Uploaded images get content-addressed thumbnails, lose their EXIF and record their hash
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media_root = self.settings(MEDIA_ROOT=directory.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.user: User = User.objects.create_user(
+            email='user@skypro.ru', first_name='Иван', last_name='Иванов', phone='+79217777777', password='pass')
+
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(buffer, format='JPEG', exif=exif)
+        self.content: bytes = buffer.getvalue()
+
+    def upload(self) -> Advertisement:
+        return Advertisement.objects.create(author=self.user, title='Стол', price=1,
+                                            image=SimpleUploadedFile('photo.jpg', self.content, 'image/jpeg'))
+
+    def test_process_upload(self):
+        ad: Advertisement = self.upload()
+        uploaded_name: str = ad.image.name
+        self.assertEqual(run_pending_jobs(), 1)
+
+        ad.refresh_from_db()
+        content_hash: str = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(ad.image_hash, content_hash)
+        for size in get_thumbnail_sizes():
+            for image_format in THUMBNAIL_FORMATS:
+                self.assertTrue(default_storage.exists(get_thumbnail_name(content_hash, size, image_format)))
+
+        self.assertNotEqual(ad.image.name, uploaded_name)
+        self.assertFalse(default_storage.exists(uploaded_name))
+        with default_storage.open(ad.image.name) as file, Image.open(file) as image:
+            self.assertEqual(dict(image.getexif()), {})
+
+        duplicate: Advertisement = self.upload()
+        with mock.patch.object(FileSystemStorage, 'save', autospec=True, side_effect=FileSystemStorage.save) as save:
+            run_pending_jobs()
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.image_hash, content_hash)
+        saved: list[str] = [call.args[1] for call in save.call_args_list]
+        self.assertEqual([name for name in saved if name.startswith('thumbnails/')], [])
+
+    def test_retry_and_replaced_image(self):
+        ad: Advertisement = self.upload()
+        process_image('advertisements.Advertisement', ad.pk)
+        ad.refresh_from_db()
+        processed_name: str = ad.image.name
+
+        process_image('advertisements.Advertisement', ad.pk)
+        ad.refresh_from_db()
+        self.assertEqual(ad.image.name, processed_name)
+        self.assertTrue(default_storage.exists(processed_name))
+
+        def replace_image(image: Image.Image, source_format: str) -> bytes:
+            Advertisement.objects.filter(pk=replaced.pk).update(image='advertisements/other.jpg')
+            return strip_metadata(image, source_format)
+
+        replaced: Advertisement = self.upload()
+        with mock.patch('core.images.strip_metadata', side_effect=replace_image):
+            process_image('advertisements.Advertisement', replaced.pk)
+        replaced.refresh_from_db()
+        self.assertEqual((replaced.image.name, replaced.image_hash), ('advertisements/other.jpg', ''))
+        self.assertEqual(len(default_storage.listdir('advertisements')[1]), 2)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Connection pool tests
+class FakeConnection:
+    def __init__(self, closed: int = 0):
+        self.closed: int = closed
+        self.info = SimpleNamespace(transaction_status=0)
+
+
+class FakeThreadedPool:
+    """
+    Stand-in for psycopg2's ThreadedConnectionPool handing out FakeConnection objects
+    """
+
+    def __init__(self, minconn: int, maxconn: int, **kwargs):
+        self._pool: list[FakeConnection] = []
+        self._used: dict = {}
+        self.closed: list[FakeConnection] = []
+
+    def getconn(self) -> FakeConnection:
+        connection: FakeConnection = self._pool.pop() if self._pool else FakeConnection()
+        self._used[id(connection)] = connection
+        return connection
+
+    def putconn(self, connection: FakeConnection, close: bool = False) -> None:
+        self._used.pop(id(connection))
+        (self.closed if close else self._pool).append(connection)
+
+
+@skipUnless(find_spec('psycopg2'), 'psycopg2 is not installed')
+class ConnectionPoolTest(TestCase):
+
+    def setUp(self):
+        pooled = importlib.import_module('core.db.backends.pooled_postgresql.base')
+        with mock.patch.object(pooled, 'ThreadedConnectionPool', FakeThreadedPool):
+            self.pool = pooled.ConnectionPool('default', {}, {**pooled.DEFAULT_POOL, 'MAX_SIZE': 2})
+
+    def test_dead_connections_replaced(self):
+        dead: list[FakeConnection] = [FakeConnection(closed=1), FakeConnection(closed=1)]
+        self.pool.pool._pool.extend(dead)
+
+        connection = self.pool.getconn()
+        self.assertNotIn(connection, dead)
+        self.assertEqual(connection.closed, 0)
+        self.assertEqual(self.pool.pool.closed, dead[::-1])
+        self.assertEqual(self.pool.pool._pool, [])
+
+        self.pool.putconn(connection)
+        self.assertIs(self.pool.getconn(), connection)
@@ -0,0 +1,35 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, HttpResponseForbidden
+
+from core.metrics import REGISTRY
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Metrics view
+def has_metrics_access(request: HttpRequest) -> bool:
+    """
+    Returns True for a request bearing METRICS_TOKEN or made by a staff user
+
+    :param request: HTTP request object
+    :return: True if the metrics may be shown
+    """
+    token: str = getattr(settings, 'METRICS_TOKEN', '')
+    if token and hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', '').encode(),
+                                     f'Bearer {token}'.encode()):
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_authenticated and user.is_staff
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Expose in-process metrics in the Prometheus text format to the scraper and staff users
+
+    :param request: HTTP request object
+    :return: HttpResponse with all registered metrics, 403 without access
+    """
+    if not has_metrics_access(request):
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,33 +1,28 @@
 import os
-import time
+import subprocess
+import sys
 
 from Coursework_6_PD12.settings import BASE_DIR
 
-# ----------------------------------------------------------------------------------------------------------------------
-# Create and run container
-os.system(f"docker run --name coursework_6_postgres "
-          f"-e POSTGRES_USER={os.environ.get('DB_USER')} "
-          f"-e POSTGRES_PASSWORD={os.environ.get('DB_PASSWORD')} "
-          f"-p {os.environ.get('DB_PORT')}:{os.environ.get('DB_PORT')} "
-          f"-d postgres")
+FIXTURES: list[str] = ['fixtures/users.json', 'fixtures/ad.json', 'fixtures/comments.json']
+
+
+def manage(*args: str) -> None:
+    subprocess.run([sys.executable, 'manage.py', *args], cwd=BASE_DIR, check=True)
 
-time.sleep(3)
 
 # ----------------------------------------------------------------------------------------------------------------------
-# Migrate database
-os.system(f"cd {BASE_DIR} && python manage.py makemigrations users")
-time.sleep(1)
-os.system(f"cd {BASE_DIR} && python manage.py makemigrations advertisements")
-time.sleep(1)
-os.system(f"cd {BASE_DIR} && python manage.py migrate")
-time.sleep(3)
+# Create and run container
+subprocess.run(['docker', 'run', '--name', 'coursework_6_postgres',
+                '-e', f"POSTGRES_USER={os.environ.get('DB_USER')}",
+                '-e', f"POSTGRES_PASSWORD={os.environ.get('DB_PASSWORD')}",
+                '-p', f"{os.environ.get('DB_PORT')}:{os.environ.get('DB_PORT')}",
+                '-d', 'postgres'], check=True)
 
 # ----------------------------------------------------------------------------------------------------------------------
-# Fill database
-os.system(
-    f"cd {BASE_DIR} "
-    f"&& python manage.py loaddata fixtures/users.json "
-    f"&& python manage.py loaddata fixtures/ad.json "
-    f"&& python manage.py loaddata fixtures/comments.json")
+# Wait for the database, migrate and fill it
+manage('seed_database', '--wait', '60')
+manage('migrate')
+manage('seed_database', *FIXTURES)
 
 print("Finished")
@@ -1,7 +1,16 @@
 from django.contrib import admin
 
+from core.admin import ListPerformanceAdmin
 from users.models import User
 
+
 # ----------------------------------------------------------------------------------------------------------------------
 # Register models
-admin.site.register(User)
+@admin.register(User)
+class UserAdmin(ListPerformanceAdmin):
+    """
+    Users are searched by the exact email, which has a unique index
+    """
+    list_display: tuple[str, ...] = ('id', 'email', 'first_name', 'last_name', 'role', 'is_active')
+    list_filter: tuple[str, ...] = ('role', 'is_active')
+    search_fields: tuple[str, ...] = ('email__exact',)
@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self) -> None:
+        """
+        Connect user signals keeping cached token versions and user rows of the JWT fast path fresh
+        """
+        from users.authentication import forget_deleted_user, refresh_cached_user
+        from users.models import User
+
+        post_save.connect(refresh_cached_user, sender=User, dispatch_uid='users.refresh_cached_user')
+        post_delete.connect(forget_deleted_user, sender=User, dispatch_uid='users.forget_deleted_user')
@@ -0,0 +1,228 @@
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import BaseCache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, Token
+
+from core.cache import get_cache, is_shared_cache
+from users.models import User
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Token claims
+ROLE_CLAIM: str = 'role'
+ACTIVE_CLAIM: str = 'active'
+VERSION_CLAIM: str = 'ver'
+
+
+def get_claims_timeout() -> int:
+    return getattr(settings, 'JWT_CLAIMS_CACHE_TIMEOUT', 60)
+
+
+def get_version_key(user_id: int) -> str:
+    return f'auth-token-version:{user_id}'
+
+
+def get_user_key(user_id: int, version: int) -> str:
+    return f'auth-user:{user_id}:{version}'
+
+
+def get_token_version(user_id: int) -> Optional[int]:
+    """
+    Returns the current token version of a user from the cache, loading it on a miss
+
+    :param user_id: A user id
+    :return: The token version or None if the user does not exist
+    """
+    cache: BaseCache = get_cache()
+    version: Optional[int] = cache.get(get_version_key(user_id))
+    if version is None:
+        version = User.objects.filter(pk=user_id).values_list('token_version', flat=True).first()
+        if version is not None:
+            cache.set(get_version_key(user_id), version, timeout=get_claims_timeout())
+    return version
+
+
+def get_full_user(user_id: int, version: int) -> User:
+    """
+    Returns the User row for a claims user, cached for a short time per token version
+
+    The row is cached only in a shared cache: refresh_cached_user drops it in the saving process alone,
+    so a per-process copy would outlive profile changes made by other workers.
+
+    :param user_id: A user id
+    :param version: The token version of the claims
+    :return: A User instance
+    :raises: AuthenticationFailed if the user no longer exists
+    """
+    shared: bool = is_shared_cache()
+    cache: BaseCache = get_cache()
+    key: str = get_user_key(user_id, version)
+    user: Optional[User] = cache.get(key) if shared else None
+    if user is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if shared:
+            cache.set(key, user, timeout=get_claims_timeout())
+    return user
+
+
+def refresh_cached_user(sender: type[User], instance: User, **kwargs) -> None:
+    """
+    post_save receiver dropping the cached row and publishing the current token version
+    """
+    cache: BaseCache = get_cache()
+    cache.delete(get_user_key(instance.pk, instance.token_version))
+    cache.set(get_version_key(instance.pk), instance.token_version, timeout=get_claims_timeout())
+
+
+def forget_deleted_user(sender: type[User], instance: User, **kwargs) -> None:
+    """
+    post_delete receiver making tokens of a deleted user invalid at once
+    """
+    get_cache().delete_many([get_version_key(instance.pk), get_user_key(instance.pk, instance.token_version)])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Claims user
+class ClaimsUser:
+    """
+    Authenticated user built from signed token claims without a database query
+
+    Id, role and activity come from the token, so permission checks do not touch the database.
+    Any other attribute is read from the full User row, loaded on first access and cached when the cache is shared.
+    """
+    is_authenticated: bool = True
+    is_anonymous: bool = False
+
+    def __init__(self, user_id: int, role: str, is_active: bool, token_version: int):
+        self.id: int = user_id
+        self.pk: int = user_id
+        self.role: str = role
+        self.is_active: bool = is_active
+        self.token_version: int = token_version
+        self._user: Optional[User] = None
+
+    def __str__(self) -> str:
+        return str(self.get_full_user())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (ClaimsUser, User)):
+            return self.pk == other.pk
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.pk)
+
+    def __getattr__(self, name: str):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.get_full_user(), name)
+
+    def get_full_user(self) -> User:
+        """
+        Returns the full User row, loaded once per request
+        """
+        if self._user is None:
+            self._user = get_full_user(self.pk, self.token_version)
+        return self._user
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == User.Roles.ADMIN
+
+    @property
+    def is_user(self) -> bool:
+        return self.role == User.Roles.USER
+
+    @property
+    def is_superuser(self) -> bool:
+        return self.is_admin
+
+    @property
+    def is_staff(self) -> bool:
+        return self.is_admin
+
+    def has_perm(self, perm, obj=None) -> bool:
+        return self.is_admin
+
+    def has_module_perms(self, app_label) -> bool:
+        return self.is_admin
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Authentication
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication returning a ClaimsUser instead of loading the User row on every request
+
+    A token is rejected when its version claim is older than the user's current token version,
+    which is bumped on password, role or activity changes. Versions are cached for
+    JWT_CLAIMS_CACHE_TIMEOUT seconds, so with a per-process cache a revocation reaches other
+    processes within that time. Tokens issued without the claims fall back to a database lookup.
+    """
+
+    def get_user(self, validated_token: Token):
+        if VERSION_CLAIM not in validated_token or ROLE_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        try:
+            user_id: int = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        if not validated_token.get(ACTIVE_CLAIM, False):
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+        version: Optional[int] = get_token_version(user_id)
+        if version is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if validated_token[VERSION_CLAIM] != version:
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+
+        return ClaimsUser(user_id, validated_token[ROLE_CLAIM], True, version)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Token serializers
+def set_user_claims(token: Token, role: str, is_active: bool, version: int) -> Token:
+    token[ROLE_CLAIM] = role
+    token[ACTIVE_CLAIM] = is_active
+    token[VERSION_CLAIM] = version
+    return token
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Issues a token pair carrying the role, activity and token version of the user
+    """
+
+    @classmethod
+    def get_token(cls, user: User) -> RefreshToken:
+        return set_user_claims(super().get_token(user), user.role, user.is_active, user.token_version)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refreshes an access token after checking the refresh token against the current user state
+
+    Refresh is rare, so the user row is read from the database and the new access token gets current claims.
+    """
+
+    def validate(self, attrs: dict) -> dict:
+        refresh = RefreshToken(attrs['refresh'])
+        state: Optional[dict] = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM]) \
+            .values('role', 'is_active', 'token_version').first()
+
+        if state is None or not state['is_active']:
+            raise AuthenticationFailed('User not found or inactive', code='user_inactive')
+        if refresh.get(VERSION_CLAIM, state['token_version']) != state['token_version']:
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+
+        set_user_claims(refresh, state['role'], state['is_active'], state['token_version'])
+        attrs['refresh'] = str(refresh)
+        return super().validate(attrs)
@@ -0,0 +1,18 @@
+from core.jobs import job
+from users.models import User
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Jobs
+@job
+def delete_user(user_id: int) -> None:
+    """
+    Delete a deactivated user with their advertisements and comments
+
+    Skipped if the user has been activated again or is already deleted.
+
+    :param user_id: The user id
+    """
+    user: User = User.objects.filter(pk=user_id, is_active=False).first()
+    if user is not None:
+        user.delete()
@@ -80,10 +80,16 @@ class User(AbstractBaseUser):
     email = models.EmailField(unique=True, max_length=254)
     first_name = models.CharField(max_length=64)
     image = models.ImageField(upload_to='avatars/', null=True)
+    image_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
     is_active = models.BooleanField(default=True)
     last_name = models.CharField(max_length=64)
     phone = PhoneNumberField(max_length=128)
     role = models.CharField(max_length=5, choices=Roles.choices, default=Roles.USER)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Changing any of these fields revokes issued tokens
+    CREDENTIAL_FIELDS: tuple[str, ...] = ('password', 'role', 'is_active')
 
     class Meta:
         """
@@ -101,6 +107,35 @@ class User(AbstractBaseUser):
 
     objects = UserManager()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user._loaded_credentials = user.get_credentials()
+        return user
+
+    def get_credentials(self) -> dict:
+        """
+        Returns loaded values of the credential fields, deferred fields are skipped
+        """
+        return {field: self.__dict__[field] for field in self.CREDENTIAL_FIELDS if field in self.__dict__}
+
+    def save(self, *args, **kwargs) -> None:
+        """
+        Save the user, bumping the token version when a credential field has changed since loading
+        """
+        update_fields = kwargs.get('update_fields')
+        saved: dict = {field: value for field, value in self.get_credentials().items()
+                       if update_fields is None or field in update_fields}
+        loaded: dict = getattr(self, '_loaded_credentials', {})
+
+        if any(field in loaded and loaded[field] != value for field, value in saved.items()):
+            self.token_version += 1
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'token_version'}
+
+        super().save(*args, **kwargs)
+        self._loaded_credentials = {**loaded, **saved}
+
     @property
     def is_admin(self) -> bool:
         """
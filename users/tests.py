@@ -1,3 +1,102 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from advertisements.models import Advertisement
+from core.cache import get_cache
+from core.jobs import run_pending_jobs
+from users.authentication import get_full_user, get_user_key
+from users.models import User
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# JWT authentication tests
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class StatelessJWTAuthenticationTest(APITestCase):
+    """
+    Access tokens authenticate without a user query and are revoked by credential changes
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='owner@skypro.ru', first_name='Иван', last_name='Иванов', phone='+79217777777', password='pass')
+        response = self.client.post('/api/token/', {'email': 'owner@skypro.ru', 'password': 'pass'}, format='json')
+        self.access, self.refresh = response.data['access'], response.data['refresh']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def test_no_user_query(self):
+        self.client.get('/api/ads/me/')
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/ads/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in context if '"users_user"' in query['sql']])
+
+    def test_profile_reads_full_user(self):
+        response = self.client.get('/api/users/me/')
+        self.assertEqual((response.status_code, response.data['email']), (200, 'owner@skypro.ru'))
+
+    def test_password_change_revokes_tokens(self):
+        response = self.client.post('/api/users/set_password/',
+                                    {'current_password': 'pass', 'new_password': 'Xy7#kLp92q'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(self.client.get('/api/ads/me/').status_code, 401)
+        self.assertEqual(self.client.post('/api/refresh/', {'refresh': self.refresh}, format='json').status_code, 401)
+
+    @override_settings(JOBS_EAGER=False)
+    def test_delete_in_background(self):
+        Advertisement.objects.create(author=self.user, title='Стол', price=1)
+        response = self.client.delete('/api/users/me/', {'current_password': 'pass'}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/ads/me/').status_code, 401)
+        self.assertTrue(Advertisement.objects.filter(author=self.user).exists())
+
+        self.assertEqual(run_pending_jobs(), 1)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(Advertisement.objects.filter(author_id=self.user.pk).exists())
+
+    def test_profile_update_keeps_tokens(self):
+        self.assertEqual(self.client.patch('/api/users/me/', {'first_name': 'Семен'}, format='json').status_code, 200)
+        self.assertEqual(self.client.get('/api/users/me/').data['first_name'], 'Семен')
+        self.assertEqual(self.client.post('/api/refresh/', {'refresh': self.refresh}, format='json').status_code, 200)
+
+    @override_settings(RESPONSE_CACHE_SHARED=False)
+    def test_no_row_cache_in_process_cache(self):
+        self.client.get('/api/users/me/')
+        self.assertIsNone(get_cache().get(get_user_key(self.user.pk, self.user.token_version)))
+
+        # Another worker changes the profile, this process gets no post_save signal
+        User.objects.filter(pk=self.user.pk).update(first_name='Петр')
+        self.assertEqual(self.client.get('/api/users/me/').data['first_name'], 'Петр')
+        self.assertEqual(get_full_user(self.user.pk, self.user.token_version).first_name, 'Петр')
+
+    @override_settings(RESPONSE_CACHE_SHARED=True)
+    def test_profile_read_from_database(self):
+        self.assertEqual(get_full_user(self.user.pk, self.user.token_version).first_name, 'Иван')
+        User.objects.filter(pk=self.user.pk).update(first_name='Петр')
+        self.assertEqual(self.client.get('/api/users/me/').data['first_name'], 'Петр')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Admin tests
+@override_settings(PAGINATION_COUNT_CACHE_TIMEOUT=0)
+class UserAdminTest(APITestCase):
+    """
+    The user changelist runs a fixed number of queries and searches by the exact email
+    """
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email='admin@skypro.ru', first_name='Иван', last_name='Иванов', phone='+79217777777', password='pass')
+        for index in range(10):
+            User.objects.create_user(email=f'user{index}@skypro.ru', first_name='Петр', last_name='Петров',
+                                     phone='+79218888888', password='pass')
+        self.client.force_login(self.admin)
+
+    def test_changelist(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/admin/users/user/?q=user3@skypro.ru')
+        self.assertEqual((response.status_code, len(context)), (200, 4))
+        self.assertEqual([user.email for user in response.context['cl'].result_list], ['user3@skypro.ru'])
@@ -2,6 +2,7 @@ from django.urls import include, path
 from rest_framework.routers import SimpleRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from users.authentication import ClaimsTokenObtainPairSerializer, ClaimsTokenRefreshSerializer
 from users.views import MyUserViewSet
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -13,6 +14,6 @@ users_router.register(r'users', MyUserViewSet)
 # Create user and token urls
 urlpatterns = [
     path('', include(users_router.urls)),
-    path('token/', TokenObtainPairView.as_view()),
-    path('refresh/', TokenRefreshView.as_view()),
+    path('token/', TokenObtainPairView.as_view(serializer_class=ClaimsTokenObtainPairSerializer)),
+    path('refresh/', TokenRefreshView.as_view(serializer_class=ClaimsTokenRefreshSerializer)),
 ]
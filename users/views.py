@@ -1,11 +1,19 @@
+from django.db import transaction
 from django.db.models import QuerySet
 from djoser.views import UserViewSet
 from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiResponse
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
 
+from core.conditional import ConditionalGetMixin
+from core.db_routers import ReplicaReadsMixin
+from core.jobs import enqueue
+from core.pagination import CachedCountPaginator
+from users.authentication import ClaimsUser
+from users.jobs import delete_user
 from users.models import User
 from users.serializers import UserPasswordChangeSerializer, UserSerializer, UserCreateSerializer
 
@@ -14,6 +22,7 @@ from users.serializers import UserPasswordChangeSerializer, UserSerializer, User
 # Custom paginator
 class Paginator(PageNumberPagination):
     page_size: int = 3
+    django_paginator_class: type = CachedCountPaginator
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -67,10 +76,37 @@ class Paginator(PageNumberPagination):
         }
     ),
 )
-class MyUserViewSet(UserViewSet):
+class MyUserViewSet(ReplicaReadsMixin, ConditionalGetMixin, UserViewSet):
     pagination_class = Paginator
     queryset: QuerySet = User.objects.all().order_by('email')
     http_method_names: list[str] = ['get', 'post', 'patch', 'delete']
+    etag_dependencies: tuple[str, ...] = ('users.User',)
+
+    def initial(self, request, *args, **kwargs) -> None:
+        """
+        Replace the claims-based user with the User row for writes, which save or compare the current user
+        """
+        super().initial(request, *args, **kwargs)
+        if request.method not in SAFE_METHODS and isinstance(request.user, ClaimsUser):
+            request.user = User.objects.get(pk=request.user.pk)
+
+    def get_instance(self) -> User:
+        """
+        Read the profile for `me` from the database, so it never shows a cached row or the claims of the token
+        """
+        if isinstance(self.request.user, ClaimsUser):
+            return self.get_queryset().get(pk=self.request.user.pk)
+        return self.request.user
+
+    def perform_destroy(self, instance: User) -> None:
+        """
+        Deactivate the user at once, which revokes their tokens, and delete the row with its advertisements
+        and comments in a background job
+        """
+        with transaction.atomic():
+            instance.is_active = False
+            instance.save(update_fields=['is_active'])
+            enqueue(delete_user, instance.pk)
 
     @extend_schema(summary='Смена пароля', description='Маршрут для смены пароля',
                    request=UserPasswordChangeSerializer,